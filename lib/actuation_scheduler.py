@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Планировщик перезапусков feeder с учетом их стоимости.
+
+Новые веса доходят до выдачи только после перезапуска feeder, а пока он идет,
+очередь пуста. Стоимость перезапуска - измеренный простой очереди (секунды).
+Выигрыш - расхождение распределения слотов в shared memory с целевым за
+интервал до следующей итерации (доля слотов × секунды). Перезапуск делается,
+только если выигрыш больше стоимости. Веса в БД обновляются каждую итерацию,
+так что мелкие изменения копятся, пока не окупят перезапуск. Шаг контроллера
+считается от весов, с которыми работает feeder (effective_weights), а не от
+отложенных весов в БД, поэтому отложенные шаги не складываются. Перезапуски не
+чаще min_restart_interval и не больше бюджета в час.
+"""
+import time
+from collections import Counter, deque
+
+DEFAULT_MIN_RESTART_INTERVAL = 30
+DEFAULT_MIN_CHANGE_THRESHOLD = 0.1
+DEFAULT_MAX_RESTARTS_PER_HOUR = 20
+# Простой очереди до первого измерения, с
+DEFAULT_RESTART_DOWNTIME = 3.0
+# Цена секунды простоя в секундах ошибки распределения (пустая очередь = ошибка 1.0)
+DEFAULT_DOWNTIME_COST = 1.0
+DOWNTIME_SMOOTHING = 0.3
+BUDGET_WINDOW = 3600
+
+DECISION_RESTART = "restart"
+DECISION_UNCHANGED = "unchanged"
+DECISION_COALESCE = "coalesce"
+DECISION_NOT_WORTH = "not_worth"
+DECISION_MIN_INTERVAL = "min_interval"
+DECISION_BUDGET = "budget"
+
+
+def _shares(values):
+    total = float(sum(values.values()))
+    if total <= 0:
+        return {}
+    return {name: value / total for name, value in values.items()}
+
+
+def share_distance(current, target):
+    """Доля слотов (весов), которую нужно перераспределить: 0.5 * sum|a - b| по долям."""
+    a, b = _shares(current), _shares(target)
+    return 0.5 * sum(abs(a.get(name, 0.0) - b.get(name, 0.0)) for name in set(a) | set(b))
+
+
+def max_relative_change(current, target):
+    """Наибольшее относительное изменение веса приложения."""
+    changes = [abs(weight - current[name]) / current[name]
+               for name, weight in target.items() if current.get(name, 0) > 0]
+    return max(changes) if changes else 0.0
+
+
+def restart_downtime(timings):
+    """Секунды без слотов по таймингам apply_feeder_weights: остановка + запуск до первого слота."""
+    stop = timings.get("stop_seconds") or 0.0
+    start = timings.get("first_fill_seconds")
+    if start is None:
+        start = timings.get("start_seconds")
+    if start is None:
+        return timings.get("wall_seconds", timings.get("total_seconds"))
+    return stop + start
+
+
+class RestartScheduler:
+    """decide() -> решение о перезапуске; record_restart() после перезапуска."""
+
+    def __init__(self, min_restart_interval=DEFAULT_MIN_RESTART_INTERVAL,
+                 min_change_threshold=DEFAULT_MIN_CHANGE_THRESHOLD,
+                 max_restarts_per_hour=DEFAULT_MAX_RESTARTS_PER_HOUR,
+                 downtime=DEFAULT_RESTART_DOWNTIME, downtime_cost=DEFAULT_DOWNTIME_COST,
+                 clock=time.monotonic):
+        self.min_restart_interval = min_restart_interval
+        self.min_change_threshold = min_change_threshold
+        self.max_restarts_per_hour = max_restarts_per_hour
+        self.downtime = downtime
+        self.downtime_cost = downtime_cost
+        self._clock = clock
+        # Веса, с которыми feeder перезапущен последний раз (None - берутся из shared memory)
+        self.applied_weights = None
+        self.history = deque()
+        self.last_restart = None
+        self.pending_iterations = 0
+        self.restarts = 0
+        self.failed_restarts = 0
+        self.queue_empty_seconds = 0.0
+        self.decisions = Counter()
+
+    def decide(self, target_weights, horizon, slot_prediction=None, applied_weights=None):
+        """Решение для target_weights; horizon - секунды до следующей итерации.
+
+        slot_prediction (predict_feeder_slots) дает расхождение по слотам, без него
+        сравниваются доли весов. applied_weights - веса в shared memory, если
+        планировщик еще не перезапускал feeder.
+        """
+        now = self._clock()
+        while self.history and now - self.history[0] >= BUDGET_WINDOW:
+            self.history.popleft()
+
+        applied = self.applied_weights if self.applied_weights is not None else (applied_weights or {})
+        if slot_prediction is not None:
+            distance = share_distance(slot_prediction["current_slots"], slot_prediction["new_slots"])
+        else:
+            distance = share_distance(applied, target_weights) if applied else 1.0
+        max_change = max_relative_change(applied, target_weights) if applied else float("inf")
+        benefit = distance * horizon
+        cost = self.downtime_cost * self.downtime
+
+        if (slot_prediction is not None and slot_prediction["unchanged"]) or distance == 0:
+            decision = DECISION_UNCHANGED
+        elif max_change < self.min_change_threshold:
+            decision = DECISION_COALESCE
+        elif benefit <= cost:
+            decision = DECISION_NOT_WORTH
+        elif self.last_restart is not None and now - self.last_restart < self.min_restart_interval:
+            decision = DECISION_MIN_INTERVAL
+        elif len(self.history) >= self.max_restarts_per_hour:
+            decision = DECISION_BUDGET
+        else:
+            decision = DECISION_RESTART
+
+        if decision == DECISION_UNCHANGED:
+            self.pending_iterations = 0
+        elif decision != DECISION_RESTART:
+            self.pending_iterations += 1
+        self.decisions[decision] += 1
+        return {
+            "decision": decision,
+            "restart": decision == DECISION_RESTART,
+            "distance": distance,
+            "max_change": max_change if max_change != float("inf") else None,
+            "benefit": benefit,
+            "cost": cost,
+            "downtime_estimate": self.downtime,
+            "pending_iterations": self.pending_iterations,
+            "restarts_last_hour": len(self.history),
+        }
+
+    def effective_weights(self, db_weights, feeder_weights=None):
+        """Веса, с которыми работает feeder.
+
+        После перезапуска планировщиком - примененные, иначе feeder_weights из
+        shared memory; приложения без данных берутся из db_weights.
+        """
+        applied = self.applied_weights if self.applied_weights is not None else feeder_weights
+        if not applied:
+            return dict(db_weights)
+        return {name: applied.get(name, weight) for name, weight in db_weights.items()}
+
+    def record_restart(self, weights, timings=None, success=True):
+        """Учесть перезапуск; timings - из apply_feeder_weights. Возвращает простой, с.
+
+        При неудаче веса в feeder неизвестны: applied_weights сбрасывается, и
+        decide() сравнивает с весами в shared memory. Простой и бюджет учитываются всегда.
+        """
+        now = self._clock()
+        self.history.append(now)
+        self.last_restart = now
+        if success:
+            self.applied_weights = dict(weights)
+            self.pending_iterations = 0
+            self.restarts += 1
+        else:
+            self.applied_weights = None
+            self.failed_restarts += 1
+        downtime = restart_downtime(timings) if timings else None
+        if downtime is not None:
+            self.queue_empty_seconds += downtime
+            self.downtime += DOWNTIME_SMOOTHING * (downtime - self.downtime)
+        return downtime
+
+    def to_checkpoint(self, wall_now=None):
+        """Состояние для чекпоинта; моменты перезапусков переводятся в UNIX-время."""
+        now, wall_now = self._clock(), time.time() if wall_now is None else wall_now
+        to_wall = lambda moment: wall_now - (now - moment)
+        return {
+            "applied_weights": self.applied_weights,
+            "restart_times": [to_wall(moment) for moment in self.history],
+            "last_restart": to_wall(self.last_restart) if self.last_restart is not None else None,
+            "downtime": self.downtime,
+        }
+
+    def restore(self, data, wall_now=None):
+        """Восстановить бюджет перезапусков, последний перезапуск и оценку простоя из to_checkpoint()."""
+        now, wall_now = self._clock(), time.time() if wall_now is None else wall_now
+        to_clock = lambda moment: now - (wall_now - moment)
+        if data.get("applied_weights") is not None:
+            self.applied_weights = dict(data["applied_weights"])
+        self.history = deque(to_clock(moment) for moment in data.get("restart_times", [])
+                             if wall_now - moment < BUDGET_WINDOW)
+        if data.get("last_restart") is not None:
+            self.last_restart = to_clock(data["last_restart"])
+        if data.get("downtime") is not None:
+            self.downtime = data["downtime"]
+
+    def totals(self):
+        """Итог для снимка: перезапуски, простой очереди и решения по причинам."""
+        return {
+            "restarts": self.restarts,
+            "failed_restarts": self.failed_restarts,
+            "queue_empty_seconds": self.queue_empty_seconds,
+            "downtime_estimate": self.downtime,
+            "decisions": dict(self.decisions),
+        }
+
+
+def describe_decision(decision):
+    """Строка лога о решении планировщика."""
+    return (f"Перезапуск feeder: {decision['decision']} (расхождение слотов {decision['distance']*100:.1f}%, "
+            f"выигрыш {decision['benefit']:.1f} против стоимости {decision['cost']:.1f}, "
+            f"отложено итераций {decision['pending_iterations']}, "
+            f"перезапусков за час {decision['restarts_last_hour']})")
+
+
+def describe_actuation_totals(scheduler):
+    """Итог за цикл: перезапуски, простой очереди и отложенные изменения по причинам."""
+    decisions = ", ".join(f"{reason} {count}" for reason, count in sorted(scheduler.decisions.items())) or "нет"
+    return (f"Перезапусков feeder: {scheduler.restarts} (неудачных {scheduler.failed_restarts}), "
+            f"очередь пуста {scheduler.queue_empty_seconds:.1f} с; решения: {decisions}")
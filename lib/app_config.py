@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Приложения проекта BOINC, которыми управляет балансировщик.
+
+Модуль без зависимостей: его импортируют и модули БД, и чтение очереди
+feeder (сэмплер, show_feeder_queue), которым не нужен pymysql.
+"""
+
+APPS = [
+    {"name": "fast_task", "resultsdir": "/results/fast_task", "weight": 1.0},
+    {"name": "medium_task", "resultsdir": "/results/medium_task", "weight": 1.0},
+    {"name": "random_task", "resultsdir": "/results/random_task", "weight": 1.0},
+    {"name": "long_task", "resultsdir": "/results/long_task", "weight": 1.0}
+]
+# Приложения, веса которых балансируются (остальные приложения проекта не трогаются)
+BALANCED_APPS = tuple(app["name"] for app in APPS)
+# Список для SQL: name IN (BALANCED_APPS_SQL)
+BALANCED_APPS_SQL = ", ".join(f"'{name}'" for name in BALANCED_APPS)
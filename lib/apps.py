@@ -1,18 +1,15 @@
 #!/usr/bin/env python3
 import os
 import sys
-from lib.utils import run_command, check_file_exists, PROJECT_HOME, CONTAINER_NAME
-
-APPS = [
-    {"name": "fast_task", "resultsdir": "/results/fast_task", "weight": 1.0},
-    {"name": "medium_task", "resultsdir": "/results/medium_task", "weight": 1.0},
-    {"name": "random_task", "resultsdir": "/results/random_task", "weight": 1.0},
-    {"name": "long_task", "resultsdir": "/results/long_task", "weight": 1.0}
-]
+from lib.utils import run_command, check_file_exists, project_home, CONTAINER_NAME
+from lib.db import query, query_value, execute, execute_transaction
+from lib.credit_summary import install_credit_summary
+from lib.indexes import ensure_indexes
+from lib.app_config import APPS, BALANCED_APPS_SQL
 
 
 def create_app(app_name, resultsdir, weight=1.0):
-    run_cmd = lambda cmd, check=True: run_command(f"cd {PROJECT_HOME} && {cmd}", check=check)
+    run_cmd = lambda cmd, check=True: run_command(f"cd {project_home()} && {cmd}", check=check)
     
     run_cmd(f"mkdir -p apps/{app_name}/1.0/x86_64-pc-linux-gnu", check=False)
     
@@ -44,16 +41,16 @@ chmod +x bin/{app_name}_assimilator && chown boincadm:boincadm bin/{app_name}_as
     
     run_cmd("bin/xadd > /dev/null 2>&1", check=False)
     
-    run_cmd(f"""mysql -u root -ppassword boincserver -e "UPDATE app SET weight = {weight} WHERE name = '{app_name}';" """, check=False)
+    execute("UPDATE app SET weight = %s WHERE name = %s", (weight, app_name))
     return True
 
 
 def setup_daemons():
     apps_list = " ".join([app['name'] for app in APPS])
-    run_cmd = lambda cmd, check=True: run_command(f"cd {PROJECT_HOME} && {cmd}", check=check)
+    run_cmd = lambda cmd, check=True: run_command(f"cd {project_home()} && {cmd}", check=check)
     
     run_cmd(f"""mkdir -p ../bin && for app in {apps_list}; do
-        ln -sf {PROJECT_HOME}/bin/${{app}}_assimilator ../bin/${{app}}_assimilator
+        ln -sf {project_home()}/bin/${{app}}_assimilator ../bin/${{app}}_assimilator
     done""", check=False)
     
     results_dirs = " ".join([app['resultsdir'] for app in APPS])
@@ -95,6 +92,13 @@ def setup_daemons():
         sed -i '/<\\/boinc>/i\\    <debug_send/>' config.xml
     fi""", check=False)
     
+    _, indexes_ok = ensure_indexes(verbose=False)
+    if not indexes_ok:
+        print("⚠ Предупреждение: не все индексы для запросов статистики созданы", file=sys.stderr)
+    
+    if not install_credit_summary():
+        print("⚠ Предупреждение: сводка app_credit_summary не установлена, статистика будет считаться по result", file=sys.stderr)
+    
     run_cmd("bin/stop && sleep 2 && bin/start", check=False)
 
 
@@ -106,7 +110,7 @@ def install_app_binary(app_name, binary_path, version_num="100"):
         print(f"  ⚠ Предупреждение: бинарный файл не найден: {binary_path}", file=sys.stderr)
         return False
     
-    run_cmd = lambda cmd, check=True: run_command(f"cd {PROJECT_HOME} && {cmd}", check=check)
+    run_cmd = lambda cmd, check=True: run_command(f"cd {project_home()} && {cmd}", check=check)
     
     cmd = f"mkdir -p {platform_dir} && cp {binary_path} {platform_dir}/{binary_name} && chmod +x {platform_dir}/{binary_name}"
     if not run_cmd(cmd, check=False):
@@ -135,49 +139,40 @@ EOF"""
 
 
 def update_versions():
-    run_cmd = lambda cmd, check=True: run_command(f"cd {PROJECT_HOME} && {cmd}", check=check)
+    run_cmd = lambda cmd, check=True: run_command(f"cd {project_home()} && {cmd}", check=check)
     run_cmd("yes | bin/update_versions > /dev/null 2>&1", check=False)
     
-    import subprocess
     for app in APPS:
         app_name = app['name']
         version_num = 100
-        query = f"SELECT av.id FROM app_version av JOIN app a ON av.appid = a.id WHERE a.name = '{app_name}' AND av.version_num = {version_num} AND av.deprecated = 0 LIMIT 1"
-        check_cmd = f"cd {PROJECT_HOME} && mysql -u root -ppassword boincserver -N -e \"{query}\""
-        stdout, success = run_command(check_cmd, check=False, capture_output=True)
-        if not (stdout and stdout.strip().isdigit()):
+        app_version_id = query_value(
+            "SELECT av.id FROM app_version av JOIN app a ON av.appid = a.id "
+            "WHERE a.name = %s AND av.version_num = %s AND av.deprecated = 0 LIMIT 1",
+            (app_name, version_num)
+        )
+        if app_version_id is None:
             print(f"✗ {app_name}: версия не найдена в БД!", file=sys.stderr)
 
 
+WEIGHTS_SQL = f"""
+SELECT name, weight 
+FROM app 
+WHERE name IN ({BALANCED_APPS_SQL}) 
+    AND deprecated = 0
+ORDER BY name;
+"""
+
+
+def weights_from_rows(rows):
+    return {app_name: float(weight) for app_name, weight in rows}
+
+
 def get_current_weights():
-    query = """
-    SELECT name, weight 
-    FROM app 
-    WHERE name IN ('fast_task', 'medium_task', 'long_task', 'random_task') 
-        AND deprecated = 0
-    ORDER BY name;
-    """
-    
-    cmd = f"cd {PROJECT_HOME} && mysql -u root -ppassword boincserver -N -e \"{query}\""
-    stdout, success = run_command(cmd, check=False, capture_output=False)
-    print(stdout)
-    if not success or not stdout:
+    rows, success = query(WEIGHTS_SQL)
+    if not success or not rows:
         return {}
     
-    weights = {}
-    for line in stdout.strip().split('\n'):
-        if not line.strip():
-            continue
-        parts = line.split('\t')
-        if len(parts) >= 2:
-            app_name = parts[0].strip()
-            try:
-                weight = float(parts[1].strip())
-                weights[app_name] = weight
-            except (ValueError, IndexError):
-                continue
-    
-    return weights
+    return weights_from_rows(rows)
 
 
 def update_weights(new_weights):
@@ -185,19 +180,12 @@ def update_weights(new_weights):
     if not new_weights:
         return False
     
-    update_statements = []
-    for app_name, weight in new_weights.items():
-        update_statements.append(
-            "UPDATE app SET weight = {} WHERE name = '{}';".format(weight, app_name)
-        )
-    
-    sql = "START TRANSACTION;\n" + "\n".join(update_statements) + "\nCOMMIT;"
-    
-    mysql_cmd = f"""bash -c "mysql -u root -ppassword boincserver << 'EOFSQL'
-{sql}
-EOFSQL" """
+    statements = [
+        ("UPDATE app SET weight = %s WHERE name = %s", (weight, app_name))
+        for app_name, weight in new_weights.items()
+    ]
     
-    _, success = run_command(f"cd {PROJECT_HOME} && {mysql_cmd}", check=False)
+    _, success = execute_transaction(statements)
     return success
 
 
@@ -208,14 +196,14 @@ def create_all_apps():
     
     setup_daemons()
     
-    run_cmd = lambda cmd, check=True: run_command(f"cd {PROJECT_HOME} && {cmd}", check=check)
+    run_cmd = lambda cmd, check=True: run_command(f"cd {project_home()} && {cmd}", check=check)
     for app in APPS:
         run_cmd(f"cd templates && [ ! -f {app['name']}_out ] && cp boinc2docker_out {app['name']}_out", check=False)
     
     binaries_installed = True
     for app in APPS:
         app_name = app['name']
-        binary_path = os.path.join(PROJECT_HOME, "dist_bin", f"{app_name}_bin")
+        binary_path = os.path.join(project_home(), "dist_bin", f"{app_name}_bin")
         if not install_app_binary(app_name, binary_path, "100"):
             binaries_installed = False
     
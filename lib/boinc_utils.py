@@ -5,50 +5,140 @@
 """
 import sys
 import time
-from lib.utils import run_command, PROJECT_HOME
+from lib.utils import run_command, project_home
 from lib.daemons import start_all_daemons
+from lib.feeder_queue import get_feeder_queue_snapshot
+from lib.feeder_supervisor import feeder_supervisor_running, reload_feeder, FEEDER_STOP_TIMEOUT
+
+# Способ применения новых весов: перезапуск feeder снаружи или через супервизор в контейнере
+FEEDER_ACTUATION_RESTART = "restart"
+FEEDER_ACTUATION_RELOAD = "reload"
+
+# Опрос при перезапуске feeder: выход старого процесса и готовность shared memory нового
+FEEDER_POLL_INTERVAL = 0.05
+FEEDER_READY_TIMEOUT = 10
+# Сколько после ready ждать первого заполненного слота
+FEEDER_FILL_TIMEOUT = 3
 
 
 def trigger_feeder_update():
-    run_command(f"touch {PROJECT_HOME}/reread_db", check=False)
+    run_command(f"touch {project_home()}/reread_db", check=False)
+
+
+def wait_feeder_ready(since, timeout=FEEDER_READY_TIMEOUT, fill_timeout=FEEDER_FILL_TIMEOUT):
+    """Ждать, пока сегмент feeder станет ready и в нем появится первое задание.
+
+    Возвращает (секунд от since до ready, секунд от since до первого заполненного
+    слота или None, если заданий не появилось за fill_timeout после ready).
+    """
+    deadline = time.time() + timeout
+    ready_seconds = None
+    fill_deadline = None
+    while True:
+        snapshot = get_feeder_queue_snapshot(max_age=0)
+        now = time.time()
+        if snapshot is not None:
+            if ready_seconds is None:
+                ready_seconds = now - since
+                fill_deadline = now + fill_timeout
+            if snapshot.occupied_slots > 0:
+                return ready_seconds, now - since
+        if ready_seconds is None and now >= deadline:
+            return None, None
+        if fill_deadline is not None and now >= fill_deadline:
+            return ready_seconds, None
+        time.sleep(FEEDER_POLL_INTERVAL)
+
+
+def feeder_running_args():
+    """Аргументы запущенного feeder ("-d 3 ...") или None, если feeder не найден."""
+    stdout, success = run_command("ps -eo args | grep '[f]eeder -d' | head -1", check=False, capture_output=True)
+    if not success or "-d" not in stdout:
+        return None
+    return stdout[stdout.index("-d"):].strip()
 
 
-def restart_feeder():
+def restart_feeder(feeder_args=None):
     """Перезапустить feeder для пересчета распределения слотов.
     
     ВАЖНО: После обновления весов нужно перезапустить feeder,
     так как weighted_interleave (распределение слотов) вызывается
     только при старте и не пересчитывается после reread_db.
     
-    Используем SIGHUP для корректной остановки feeder, затем запускаем заново.
-    """
-    # Находим PID процесса feeder (точное совпадение команды)
-    cmd = "ps aux | grep '[f]eeder -d' | awk '{print $2}'"
-    stdout, success = run_command(cmd, check=False, capture_output=True)
+    Используем SIGHUP для корректной остановки feeder, ждем выхода процесса
+    и сразу запускаем новый, затем ждем готовности shared memory вместо
+    фиксированных пауз. Если feeder работает под супервизором, перезапуск
+    делегируется ему, иначе второй feeder работал бы параллельно с feeder супервизора.
     
-    if success and stdout:
-        pid = stdout.strip().split('\n')[0].strip()
-        if pid and pid.isdigit():
-            # Отправляем SIGHUP для корректной остановки feeder
-            run_command(f"kill -HUP {pid}", check=False)
-            time.sleep(2)
-            
-            # Запускаем feeder заново
-            run_command(f"cd {PROJECT_HOME} && nohup bin/feeder -d 3 --allapps --priority_order --sleep_interval 1 > logs/feeder.log 2>&1 &", check=False)
-            time.sleep(3)
-            
-            # Проверяем, что feeder запустился
-            cmd_check = "ps aux | grep '[f]eeder -d' | wc -l"
-            stdout_check, success_check = run_command(cmd_check, check=False, capture_output=True)
-            
-            if success_check and stdout_check and int(stdout_check.strip()) > 0:
-                return True
-            else:
-                print("⚠ Feeder не запустился после перезапуска", file=sys.stderr)
-                return False
+    Новый feeder запускается с аргументами старого, если не задан feeder_args
+    (так режим без --allapps для актуатора приоритетов переживает перезапуск).
     
-    print("⚠ Процесс feeder не найден", file=sys.stderr)
-    return False
+    Возвращает ({"stop_seconds", "start_seconds", "first_fill_seconds", "total_seconds"}, успех);
+    first_fill_seconds = None, если слоты не заполнились (например, нет неотправленных заданий).
+    """
+    started = time.time()
+    if feeder_supervisor_running():
+        timings, success = reload_feeder(feeder_args=feeder_args)
+        if not success:
+            return timings, False
+        stop_seconds = timings.get("stop_seconds")
+    else:
+        polls = max(int(FEEDER_STOP_TIMEOUT / FEEDER_POLL_INTERVAL), 1)
+        args = f"ARGS='{feeder_args}'; " if feeder_args else "ARGS=$(ps -o args= -p $PID | sed 's/^[^ ]* //'); "
+        # Одна команда в контейнере: SIGHUP, ожидание исчезновения pid, запуск нового feeder
+        cmd = (
+            f"cd {project_home()} && "
+            "PID=$(ps aux | grep '[f]eeder -d' | awk '{print $2}' | head -1) && [ -n \"$PID\" ] || exit 2; "
+            f"{args}"
+            "T0=$(date +%s.%N); kill -HUP $PID; "
+            f"for i in $(seq 1 {polls}); do ps -o stat= -p $PID | grep -qv '^Z' || break; sleep {FEEDER_POLL_INTERVAL}; done; "
+            "ps -o stat= -p $PID | grep -qv '^Z' && kill -9 $PID && sleep 0.1; "
+            "T1=$(date +%s.%N); "
+            "nohup bin/feeder $ARGS > logs/feeder.log 2>&1 & "
+            "echo \"$T0 $T1\""
+        )
+        stdout, success = run_command(cmd, check=False, capture_output=True)
+        if not success:
+            print("⚠ Процесс feeder не найден", file=sys.stderr)
+            return {}, False
+        try:
+            stop_at, stopped_at = (float(v) for v in stdout.split()[-2:])
+            stop_seconds = stopped_at - stop_at
+        except ValueError:
+            stop_seconds = None
+
+    launched = time.time()
+    ready_seconds, fill_seconds = wait_feeder_ready(launched)
+    timings = {
+        "stop_seconds": stop_seconds,
+        "start_seconds": ready_seconds,
+        "first_fill_seconds": fill_seconds,
+        "total_seconds": time.time() - started,
+    }
+    if ready_seconds is None:
+        print("⚠ Feeder не запустился после перезапуска", file=sys.stderr)
+        return timings, False
+    return timings, True
+
+
+def apply_feeder_weights(actuation=FEEDER_ACTUATION_RESTART):
+    """Заставить feeder пересчитать распределение слотов после update_weights.
+
+    reload - перезапуск супервизором в контейнере без проверки демонов,
+    restart - restart_feeder и перезапуск упавших демонов.
+    Без супервизора reload откатывается на restart.
+    Возвращает ({"actuation", "wall_seconds", ...тайминги restart_feeder}, успех).
+    """
+    started = time.time()
+    if actuation == FEEDER_ACTUATION_RELOAD:
+        if feeder_supervisor_running():
+            timings, success = restart_feeder()
+            return dict(timings, actuation=FEEDER_ACTUATION_RELOAD, wall_seconds=time.time() - started), success
+        print("⚠ Супервизор feeder не запущен, веса применяются перезапуском feeder", file=sys.stderr)
+
+    timings, success = restart_feeder()
+    ensure_daemons_running()
+    return dict(timings, actuation=FEEDER_ACTUATION_RESTART, wall_seconds=time.time() - started), success
 
 
 def ensure_daemons_running():
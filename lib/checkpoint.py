@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Чекпоинты состояния контроллера для теплого перезапуска балансировщика.
+
+Цикл сохраняет после каждой итерации интеграл и прошлую ошибку по приложениям,
+записанные в БД веса, веса в shared memory feeder и время последнего
+применения весов. При запуске состояние восстанавливается, только если мир не
+изменился без балансировщика: веса в БД и в feeder совпадают с записанными,
+набор приложений тот же, а чекпоинт не старше max_age. Иначе контроллер
+стартует с нуля.
+
+Файл пишется атомарно: временный файл в том же каталоге, fsync, os.replace.
+Падение во время записи оставляет прежний чекпоинт целым.
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+from pathlib import Path
+
+CHECKPOINT_VERSION = 1
+DEFAULT_CHECKPOINT_DIR = Path(__file__).parent.parent.absolute() / "data" / "checkpoints"
+# Чекпоинт старше этого возраста не восстанавливается, с
+DEFAULT_CHECKPOINT_MAX_AGE = 3600
+WEIGHT_TOLERANCE = 1e-6
+
+REASON_MISSING = "нет чекпоинта"
+REASON_UNREADABLE = "чекпоинт не читается"
+REASON_VERSION = "другая версия или контроллер"
+REASON_STALE = "чекпоинт устарел"
+REASON_APPS = "изменился набор приложений"
+REASON_DB_WEIGHTS = "веса в БД изменены вне балансировщика"
+REASON_FEEDER_WEIGHTS = "веса в feeder изменены вне балансировщика"
+
+
+def default_checkpoint_path(controller):
+    return DEFAULT_CHECKPOINT_DIR / f"{controller}.json"
+
+
+def save_checkpoint(path, data):
+    """Атомарно записать data в path (JSON). Возвращает успех."""
+    path = Path(path)
+    tmp_name = None
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+        tmp_name = None
+        # Переименование долговечно только после fsync каталога
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        return True
+    except (OSError, TypeError, ValueError) as e:
+        print(f"⚠ Не удалось сохранить чекпоинт {path}: {e}", file=sys.stderr)
+        return False
+    finally:
+        if tmp_name is not None:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+
+
+def load_checkpoint(path):
+    """(данные, причина): данные чекпоинта или None и причина, почему его нет."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None, REASON_MISSING
+    except (OSError, ValueError) as e:
+        print(f"⚠ Ошибка чтения чекпоинта {path}: {e}", file=sys.stderr)
+        return None, REASON_UNREADABLE
+    if not isinstance(data, dict) or not isinstance(data.get("apps"), dict):
+        return None, REASON_UNREADABLE
+    return data, None
+
+
+def _weights_match(expected, actual, tolerance):
+    if set(expected) != set(actual):
+        return False
+    return all(abs(actual[name] - weight) <= tolerance * max(abs(weight), 1.0) for name, weight in expected.items())
+
+
+def check_checkpoint(data, controller, db_weights, feeder_weights=None, max_age=DEFAULT_CHECKPOINT_MAX_AGE,
+                     tolerance=WEIGHT_TOLERANCE, now=None):
+    """Причина отбросить чекпоинт или None, если его можно восстановить.
+
+    db_weights - текущие веса в БД {app: weight}; feeder_weights - веса в shared
+    memory feeder (None - не проверять: feeder не запущен или актуатор приоритетов).
+    """
+    now = time.time() if now is None else now
+    if data.get("version") != CHECKPOINT_VERSION or data.get("controller") != controller:
+        return REASON_VERSION
+    saved_at = data.get("saved_at")
+    if not isinstance(saved_at, (int, float)) or not 0 <= now - saved_at <= max_age:
+        return REASON_STALE
+    apps = data["apps"]
+    if set(apps) != set(db_weights):
+        return REASON_APPS
+    saved_db = {name: app.get("weight") for name, app in apps.items()}
+    if None in saved_db.values() or not _weights_match(saved_db, db_weights, tolerance):
+        return REASON_DB_WEIGHTS
+    if feeder_weights is not None:
+        saved_feeder = {name: app.get("feeder_weight") for name, app in apps.items()
+                        if app.get("feeder_weight") is not None}
+        present = {name: feeder_weights[name] for name in saved_feeder if name in feeder_weights}
+        if saved_feeder and not _weights_match(saved_feeder, present, tolerance):
+            return REASON_FEEDER_WEIGHTS
+    return None
+
+
+def checkpoint_age(data, now=None):
+    """Возраст чекпоинта, с."""
+    return (time.time() if now is None else now) - data["saved_at"]
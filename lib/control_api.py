@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Локальный HTTP API работающего балансировщика (режим --serve).
+
+Цикл балансировки читает настройки из BalancerControl в начале итерации и
+публикует туда статус после нее. HTTP-сервер в отдельном потоке только
+копирует опубликованное под коротким lock. Поэтому запрос статуса отвечает
+сразу, даже когда итерация ждет restart_feeder или медленный запрос статистики.
+
+    curl -s localhost:8787/status
+    curl -s -X POST localhost:8787/settings -d '{"kp": 0.8, "interval": 30}'
+    curl -s -X POST localhost:8787/settings -d '{"targets": {"long_task": 0.4}}'
+    curl -s -X POST localhost:8787/settings -d '{"targets": {"groups": [{"share": 0.5, "apps": ["fast_task"]}]}}'
+    curl -s -X POST localhost:8787/pause
+    curl -s -X POST localhost:8787/resume
+
+Gains и targets применяются со следующей итерации, interval - со следующего
+ожидания. Pause прерывает ожидание сразу, resume сразу будит приостановленный
+цикл; запросы, не меняющие paused, расписание не сбивают.
+"""
+import copy
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .targets import TargetModel
+
+DEFAULT_CONTROL_HOST = "127.0.0.1"
+DEFAULT_CONTROL_PORT = 8787
+MAX_BODY_BYTES = 65536
+
+STATE_STARTING = "starting"
+STATE_RUNNING = "running"
+STATE_WAITING = "waiting"
+STATE_PAUSED = "paused"
+STATE_STOPPED = "stopped"
+
+# Настройки, смена которых прерывает ожидание следующей итерации
+WAKE_SETTINGS = ("paused",)
+
+
+def _number(value, minimum=0.0, maximum=None):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None, "ожидается число"
+    if value < minimum or (maximum is not None and value > maximum):
+        return None, f"допустимо от {minimum}" + (f" до {maximum}" if maximum is not None else "")
+    return float(value), None
+
+
+def _interval(value):
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        return None, "ожидается целое число секунд >= 0"
+    return value, None
+
+
+def _flag(value):
+    if not isinstance(value, bool):
+        return None, "ожидается true/false"
+    return value, None
+
+
+def _targets(value):
+    """Спецификация lib.targets ({app: доля}, apps/groups/schedule) или null - поровну."""
+    if value is None:
+        return None, None
+    try:
+        return TargetModel(value).spec, None
+    except (ValueError, TypeError, AttributeError) as e:
+        return None, str(e)
+
+
+SETTING_CHECKS = {
+    "kp": _number,
+    "ki": _number,
+    "kd": _number,
+    "smoothing": lambda value: _number(value, 0.0, 1.0),
+    "interval": _interval,
+    "paused": _flag,
+    "targets": _targets,
+}
+
+
+class BalancerControl:
+    """Настройки цикла, изменяемые через API, и последний опубликованный статус."""
+
+    def __init__(self, settings):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._settings = dict(settings)
+        self._settings.setdefault("paused", False)
+        self._status = {"state": STATE_STARTING, "started_at": time.time()}
+
+    def settings(self):
+        with self._lock:
+            return copy.deepcopy(self._settings)
+
+    def update(self, changes):
+        """Применить {настройка: значение}. Возвращает (настройки, ошибки); при ошибках ничего не меняется."""
+        if not isinstance(changes, dict):
+            return self.settings(), {"body": "ожидается JSON-объект"}
+        validated = {}
+        errors = {}
+        for key, value in changes.items():
+            if key not in self._settings or key not in SETTING_CHECKS:
+                errors[key] = "неизвестная настройка"
+                continue
+            value, error = SETTING_CHECKS[key](value)
+            if error:
+                errors[key] = error
+            else:
+                validated[key] = value
+        if errors:
+            return self.settings(), errors
+        with self._lock:
+            # Повторный resume работающего цикла не должен сбивать его расписание
+            wake = any(key in validated and validated[key] != self._settings[key] for key in WAKE_SETTINGS)
+            self._settings.update(validated)
+        if wake:
+            self._wake.set()
+        return self.settings(), {}
+
+    def publish(self, **fields):
+        """Обновить статус; значения копируются, чтобы цикл мог дальше менять свои словари."""
+        fields = copy.deepcopy(fields)
+        with self._lock:
+            self._status.update(fields)
+            self._status["updated_at"] = time.time()
+
+    def status(self):
+        with self._lock:
+            status = copy.deepcopy(self._status)
+            status["settings"] = copy.deepcopy(self._settings)
+        return status
+
+    def wait(self, timeout):
+        """Ждать timeout секунд или до pause/resume. True - ожидание прервано."""
+        woken = self._wake.wait(timeout)
+        self._wake.clear()
+        return woken
+
+    def wait_unless_paused(self, timeout):
+        """Ждать timeout секунд; прерывается только паузой цикла. True - цикл поставлен на паузу."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if self.wait(remaining) and self.settings()["paused"]:
+                return True
+
+
+def _make_handler(control):
+    class ControlHandler(BaseHTTPRequestHandler):
+        def _reply(self, code, payload):
+            body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            if length <= 0:
+                return {}
+            if length > MAX_BODY_BYTES:
+                raise ValueError("слишком большое тело запроса")
+            return json.loads(self.rfile.read(length).decode("utf-8"))
+
+        def do_GET(self):
+            if self.path == "/status":
+                self._reply(200, control.status())
+            elif self.path == "/settings":
+                self._reply(200, control.settings())
+            else:
+                self._reply(404, {"error": f"неизвестный путь {self.path}"})
+
+        def do_POST(self):
+            if self.path == "/pause":
+                changes = {"paused": True}
+            elif self.path == "/resume":
+                changes = {"paused": False}
+            elif self.path == "/settings":
+                try:
+                    changes = self._body()
+                except ValueError as e:
+                    self._reply(400, {"error": f"некорректный JSON: {e}"})
+                    return
+            else:
+                self._reply(404, {"error": f"неизвестный путь {self.path}"})
+                return
+            settings, errors = control.update(changes)
+            if errors:
+                self._reply(400, {"errors": errors, "settings": settings})
+            else:
+                logging.getLogger().info(f"API: изменены настройки {json.dumps(changes, ensure_ascii=False)}")
+                self._reply(200, settings)
+
+        def log_message(self, format, *args):
+            logging.getLogger(__name__).debug(format, *args)
+
+    return ControlHandler
+
+
+class ControlServer:
+    """ThreadingHTTPServer с BalancerControl в фоновом потоке (только localhost по умолчанию)."""
+
+    def __init__(self, control, host=DEFAULT_CONTROL_HOST, port=DEFAULT_CONTROL_PORT):
+        self.control = control
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """Запустить сервер. Возвращает успех (порт может быть занят)."""
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), _make_handler(self.control))
+        except OSError as e:
+            logging.getLogger().error(f"✗ Не удалось открыть API на {self.host}:{self.port}: {e}")
+            return False
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="control-api", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
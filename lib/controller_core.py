@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Векторное ядро контроллеров весов (PID и пропорциональный балансировщик) на NumPy.
+
+Приложения - позиции в массивах, выровненных по одному порядку apps: кредиты,
+счетчики, веса, интегральная и предыдущая ошибки, маски заморозки. Один шаг -
+несколько операций над массивами вместо циклов по словарям, поэтому ядро
+годится для сотен приложений и тысяч шагов в секунду (симуляция, подбор
+коэффициентов).
+
+Результаты побитно совпадают с прежними циклами по словарям: поэлементные
+операции идут в том же порядке, а суммы считаются последовательно (np.cumsum,
+как builtin sum) в порядке ключей исходных словарей - он передается индексами
+order; нули, подставленные вместо отсутствующих элементов, сумму не меняют.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+STATUS_OK = "ok"
+STATUS_NO_CREDIT = "no_credit"
+STATUS_PARTIAL_CREDIT = "partial_credit"
+STATUS_ZERO_TOTAL = "zero_total"
+
+CREDIT_STATUS_WARNINGS = {
+    STATUS_NO_CREDIT: "  ⚠ Нет завершенных задач с ненулевым кредитом ни у одного приложения, веса не изменяются",
+    STATUS_PARTIAL_CREDIT: "  ⚠ Не у всех приложений есть завершенные задачи с ненулевым кредитом, веса не изменяются",
+    STATUS_ZERO_TOTAL: "  ⚠ Нет данных о кредитах, веса не изменяются",
+}
+
+# Статистика кредитов, выровненная по apps; stats_order - индексы приложений
+# в порядке ключей credit_stats (отсутствующие в credit_stats - нули)
+AppArrays = namedtuple("AppArrays", [
+    "apps",
+    "completed_credit",
+    "completed_count",
+    "avg_credit",
+    "in_progress_count",
+    "stats_order",
+])
+
+PIDStep = namedtuple("PIDStep", ["status", "weights", "integral_error", "prev_error", "frozen"])
+
+
+def app_arrays(credit_stats, apps=None):
+    """AppArrays из {app: stats} (get_credit_statistics); apps по умолчанию - ключи credit_stats."""
+    apps = list(credit_stats) if apps is None else list(apps)
+    index = {app: i for i, app in enumerate(apps)}
+    columns = {key: np.zeros(len(apps), dtype=np.float64)
+               for key in ("completed_credit", "completed_count", "avg_credit", "in_progress_count")}
+    for app_name in apps:
+        stats = credit_stats.get(app_name)
+        if not stats:
+            continue
+        i = index[app_name]
+        for key, column in columns.items():
+            column[i] = stats.get(key, 0)
+    stats_order = np.array([index[app] for app in credit_stats if app in index], dtype=np.int64)
+    return AppArrays(apps=apps, stats_order=stats_order, **columns)
+
+
+def aligned(values, apps, default=0.0):
+    """np.ndarray значений {app: value} в порядке apps и индексы ключей values в этом порядке."""
+    index = {app: i for i, app in enumerate(apps)}
+    array = np.array([values.get(app, default) for app in apps], dtype=np.float64)
+    order = np.array([index[app] for app in values if app in index], dtype=np.int64)
+    return array, order
+
+
+def seq_sum(values, order=None):
+    """Сумма слева направо, как builtin sum; order - индексы слагаемых в нужном порядке."""
+    if order is not None:
+        values = values[order]
+    if values.size == 0:
+        return 0.0
+    return float(np.cumsum(values)[-1])
+
+
+def global_avg_credit(arrays):
+    """Средний кредит завершенной задачи по всем приложениям (0, если задач нет)."""
+    total_count = seq_sum(arrays.completed_count, arrays.stats_order)
+    if total_count <= 0:
+        return 0.0
+    return seq_sum(arrays.completed_credit, arrays.stats_order) / total_count
+
+
+def effective_avg_credit(arrays, global_avg=None):
+    """avg_credit по приложениям: свой, completed/count или глобальный, если своего нет."""
+    if global_avg is None:
+        global_avg = global_avg_credit(arrays)
+    unknown = arrays.avg_credit == 0
+    own = unknown & (arrays.completed_count > 0) & (arrays.completed_credit > 0)
+    per_task = np.divide(arrays.completed_credit, arrays.completed_count,
+                         out=np.zeros_like(arrays.completed_credit), where=own)
+    return np.where(own, per_task, np.where(unknown, global_avg, arrays.avg_credit))
+
+
+def total_credits(arrays, global_avg=None):
+    """Завершенный кредит + ожидаемый от задач в работе, по приложениям."""
+    return arrays.completed_credit + effective_avg_credit(arrays, global_avg) * arrays.in_progress_count
+
+
+def credit_status(completed_credit, credits, credit_order=None):
+    """(статус, сумма кредитов): ранние выходы контроллеров до расчета весов."""
+    has_credit = completed_credit > 0
+    if not has_credit.any():
+        return STATUS_NO_CREDIT, 0.0
+    if not has_credit.all():
+        return STATUS_PARTIAL_CREDIT, 0.0
+    total_credit = seq_sum(credits, credit_order)
+    if total_credit == 0:
+        return STATUS_ZERO_TOTAL, total_credit
+    return STATUS_OK, total_credit
+
+
+def target_share_array(targets, apps):
+    """Целевые доли в порядке apps из {app: доля}; None или пустой словарь - поровну.
+
+    Приложения без заданной доли делят поровну остаток до 1; если заданные доли
+    в сумме не меньше 1, они нормируются, а остальным достается 0.
+    """
+    apps = list(apps)
+    if not targets or not apps:
+        return None
+    shares, _ = aligned(targets, apps, default=np.nan)
+    given = ~np.isnan(shares)
+    assigned = float(shares[given].sum())
+    missing = int((~given).sum())
+    if assigned >= 1.0 or missing == 0:
+        shares = np.where(given, shares, 0.0)
+        total = shares.sum()
+        return shares / total if total > 0 else None
+    return np.where(given, shares, (1.0 - assigned) / missing)
+
+
+def _shares(credits, total_credit):
+    if total_credit > 0:
+        return credits / total_credit
+    return np.zeros_like(credits)
+
+
+def pid_step(credits, weights, integral_error, prev_error, completed_credit, dt, kp, ki, kd,
+             saturated=None, starved=None, full=None, credit_order=None, weight_order=None,
+             min_weight=0.001, max_weight=1000.0, max_step_change=1, integral_limit=1.0,
+             target_share=None):
+    """Один шаг PID по массивам, выровненным по приложениям.
+
+    weights - текущие веса (1.0 для приложений без веса), weight_order - индексы
+    приложений с весом в порядке исходного словаря (для суммы весов; пустой - сумма 1.0).
+    saturated/starved/full - булевы маски очереди feeder. target_share - целевые
+    доли (target_share_array), None - поровну. Возвращает PIDStep;
+    при статусе не STATUS_OK веса и состояние не меняются.
+    """
+    frozen = np.zeros(credits.size, dtype=bool)
+    status, total_credit = credit_status(completed_credit, credits, credit_order)
+    if status != STATUS_OK:
+        return PIDStep(status, weights, integral_error, prev_error, frozen)
+
+    if target_share is None:
+        target_share = 1.0 / credits.size
+    error = target_share - _shares(credits, total_credit)
+
+    ie = np.clip(integral_error + error * dt, -integral_limit, integral_limit)
+    if dt > 0:
+        de = (error - prev_error) / dt
+    else:
+        de = np.zeros_like(error)
+    factor = 1.0 + (kp * error + ki * ie + kd * de)
+
+    # Правила заморозки применяются по очереди к уже измененному factor
+    if saturated is not None:
+        hold = saturated & (factor > 1.0)
+        factor, frozen = np.where(hold, 1.0, factor), frozen | hold
+        if saturated.any():
+            hold = ~saturated & (factor < 1.0)
+            factor, frozen = np.where(hold, 1.0, factor), frozen | hold
+    if starved is not None:
+        hold = starved & (factor < 1.0)
+        factor, frozen = np.where(hold, 1.0, factor), frozen | hold
+    if full is not None:
+        hold = full & (factor > 1.0)
+        factor, frozen = np.where(hold, 1.0, factor), frozen | hold
+
+    factor = np.clip(factor, 1.0 - max_step_change, 1.0 + max_step_change)
+    raw = np.clip(weights * factor, min_weight, max_weight)
+
+    total_raw = seq_sum(np.where(frozen, 0.0, raw))
+    if weight_order is not None and weight_order.size == 0:
+        total_current = 1.0
+    else:
+        total_current = seq_sum(weights, weight_order)
+    frozen_sum = seq_sum(np.where(frozen, weights, 0.0))
+
+    if total_raw > 0 and total_current > frozen_sum:
+        raw = np.clip(raw / total_raw * (total_current - frozen_sum), min_weight, max_weight)
+    new_weights = np.where(frozen, weights, raw)
+    return PIDStep(STATUS_OK, new_weights, ie, error, frozen)
+
+
+def ratio_step(credits, weights, completed_credit, smoothing=0.3, credit_order=None,
+               min_weight=0.01, max_weight=100.0, target_share=None):
+    """Шаг пропорционального балансировщика: вес * (целевая доля / доля), сглаженный.
+
+    target_share - как в pid_step. Возвращает (статус, веса); при статусе не STATUS_OK веса не меняются.
+    """
+    status, total_credit = credit_status(completed_credit, credits, credit_order)
+    if status != STATUS_OK:
+        return status, weights
+
+    if target_share is None:
+        target_share = 1.0 / credits.size
+    shares = _shares(credits, total_credit)
+    positive = shares > 0
+    ratio = np.divide(target_share, shares, out=np.ones_like(shares), where=positive)
+    new_weights = np.where(positive, weights * ratio, weights)
+    new_weights = np.clip(new_weights, min_weight, max_weight)
+    smoothed = smoothing * weights + (1 - smoothing) * new_weights
+    return status, np.clip(smoothed, min_weight, max_weight)
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Инкрементальная агрегация кредитов по приложениям.
+
+Вместо полного JOIN app × workunit × result на каждой итерации держим в памяти
+накопленные суммы по приложениям и читаем только результаты, у которых
+mod_time сдвинулся за сохраненный водяной знак (или id больше известного).
+"""
+import sys
+import time
+import threading
+from collections import Counter
+
+from .db import query_multi
+from .utils import project_key
+
+RESULT_SERVER_STATE_UNSENT = 2
+RESULT_SERVER_STATE_IN_PROGRESS = 4
+RESULT_SERVER_STATE_OVER = 5
+RESULT_OUTCOME_SUCCESS = 1
+VALIDATE_STATE_INIT = 0
+
+# Запас по mod_time: строка могла получить mod_time до нашего чтения, а закоммититься после
+MOD_TIME_OVERLAP = 30
+# Периодическая полная пересинхронизация страхует от строк, закоммиченных не по порядку id
+RESYNC_INTERVAL = 3600
+
+_APPS_SQL = """
+SELECT id, name FROM app
+WHERE name IN ('fast_task', 'medium_task', 'long_task', 'random_task')
+    AND deprecated = 0
+ORDER BY name
+"""
+
+# Результат считается окончательным, когда он OVER и либо неуспешен,
+# либо уже прошел валидацию (granted_credit больше не изменится)
+_FINAL_CONDITION = (
+    "server_state = 5 AND (outcome <> 1 OR validate_state <> 0)"
+)
+
+_RESULT_COLUMNS = (
+    "id, appid, server_state, outcome, validate_state, granted_credit, received_time"
+)
+
+
+def _contribution(server_state, outcome, granted_credit):
+    """Вклад результата в (unsent, in_progress, completed, credit, credited)."""
+    if server_state == RESULT_SERVER_STATE_UNSENT:
+        return (1, 0, 0, 0.0, 0)
+    if server_state == RESULT_SERVER_STATE_IN_PROGRESS:
+        return (0, 1, 0, 0.0, 0)
+    if server_state == RESULT_SERVER_STATE_OVER and outcome == RESULT_OUTCOME_SUCCESS:
+        credit = float(granted_credit or 0.0)
+        return (0, 0, 1, credit, 1 if credit > 0 else 0)
+    return (0, 0, 0, 0.0, 0)
+
+
+def _is_final(server_state, outcome, validate_state):
+    return server_state == RESULT_SERVER_STATE_OVER and (
+        outcome != RESULT_OUTCOME_SUCCESS or validate_state != VALIDATE_STATE_INIT
+    )
+
+
+class IncrementalCreditAggregator:
+    """Накопленные суммы по кредитам с водяным знаком по result.id/mod_time.
+
+    В памяти хранятся только неокончательные результаты (в очереди, в работе,
+    ожидающие валидации), поэтому объем состояния не растет с историей.
+    """
+
+    def __init__(self, resync_interval=RESYNC_INTERVAL, history_seconds=0):
+        self.resync_interval = resync_interval
+        # Сколько секунд истории кредитов отдавать событиями при первой загрузке (для CreditRateSensor)
+        self.history_seconds = history_seconds
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.app_ids = {}
+        self.app_names = []
+        self._unsent = []
+        self._in_progress = []
+        self._completed = []
+        self._credit = []
+        self._credited = []
+        self._pending = {}
+        self.max_result_id = 0
+        self.watermark = None
+        self.bootstrapped_at = None
+        self.last_refresh = None
+
+    @property
+    def bootstrapped(self):
+        return self.watermark is not None
+
+    def _apply_contribution(self, idx, contribution, sign):
+        unsent, in_progress, completed, credit, credited = contribution
+        self._unsent[idx] += sign * unsent
+        self._in_progress[idx] += sign * in_progress
+        self._completed[idx] += sign * completed
+        self._credit[idx] += sign * credit
+        self._credited[idx] += sign * credited
+
+    def bootstrap_statements(self, include_history=False):
+        history = []
+        if include_history and self.history_seconds:
+            since = f"UNIX_TIMESTAMP(NOW()) - {int(self.history_seconds)}"
+            history = [f"""
+            SELECT appid, granted_credit, received_time FROM result
+            WHERE mod_time >= FROM_UNIXTIME({since})
+                AND server_state = 5 AND outcome = 1 AND granted_credit > 0
+                AND received_time >= {since}
+            """]
+        return [
+            "START TRANSACTION WITH CONSISTENT SNAPSHOT",
+            "SELECT UNIX_TIMESTAMP(NOW()), COALESCE(MAX(id), 0) FROM result",
+            _APPS_SQL,
+            f"""
+            SELECT appid,
+                COUNT(CASE WHEN outcome = 1 THEN 1 END),
+                COALESCE(SUM(CASE WHEN outcome = 1 THEN granted_credit ELSE 0 END), 0),
+                COUNT(CASE WHEN outcome = 1 AND granted_credit > 0 THEN 1 END)
+            FROM result
+            WHERE {_FINAL_CONDITION}
+            GROUP BY appid
+            """,
+            f"SELECT {_RESULT_COLUMNS} FROM result WHERE NOT ({_FINAL_CONDITION})",
+        ] + history + [
+            "COMMIT",
+        ]
+
+    def apply_bootstrap(self, results):
+        """Загрузить начальное состояние. Возвращает сводку (с событиями истории, если она запрошена)."""
+        header_rs, apps_rs, final_rs, pending_rs = results[:4]
+        self._reset()
+        for idx, (app_id, app_name) in enumerate(apps_rs):
+            self.app_ids[app_id] = idx
+            self.app_names.append(app_name)
+        napps = len(self.app_names)
+        self._unsent = [0] * napps
+        self._in_progress = [0] * napps
+        self._completed = [0] * napps
+        self._credit = [0.0] * napps
+        self._credited = [0] * napps
+
+        for app_id, completed, credit, credited in final_rs:
+            idx = self.app_ids.get(app_id)
+            if idx is None:
+                continue
+            self._apply_contribution(idx, (0, 0, completed, float(credit), credited), 1)
+
+        for row in pending_rs:
+            result_id, app_id, server_state, outcome, validate_state, granted_credit, _ = row
+            idx = self.app_ids.get(app_id)
+            if idx is None:
+                continue
+            contribution = _contribution(server_state, outcome, granted_credit)
+            self._apply_contribution(idx, contribution, 1)
+            self._pending[result_id] = (idx, server_state, contribution)
+
+        credit_events = []
+        for history_rs in results[4:]:
+            for app_id, granted_credit, received_time in history_rs:
+                idx = self.app_ids.get(app_id)
+                if idx is not None:
+                    credit_events.append((self.app_names[idx], float(granted_credit), received_time))
+
+        server_now, max_id = header_rs.rows[0]
+        self.watermark = int(server_now)
+        self.max_result_id = int(max_id)
+        self.bootstrapped_at = time.time()
+        return {
+            "rows": len(pending_rs),
+            "bootstrap": True,
+            "history": len(results) > 4,
+            "credit_events": credit_events,
+        }
+
+    def delta_statements(self):
+        since = self.watermark - MOD_TIME_OVERLAP
+        return [
+            "SELECT UNIX_TIMESTAMP(NOW()), COALESCE(MAX(id), 0) FROM result",
+            f"""
+            SELECT {_RESULT_COLUMNS} FROM result WHERE mod_time >= FROM_UNIXTIME({int(since)})
+            UNION
+            SELECT {_RESULT_COLUMNS} FROM result WHERE id > {int(self.max_result_id)}
+            """,
+        ]
+
+    def apply_delta(self, results):
+        """Применить прочитанные изменения. Возвращает сводку по переходам и новым кредитам."""
+        with self._lock:
+            return self._apply_delta(results)
+
+    def _apply_delta(self, results):
+        header_rs, rows_rs = results
+        server_now, server_max_id = header_rs.rows[0]
+        if int(server_max_id) < self.max_result_id:
+            # БД пересоздана (pipeline с docker compose down -v) - состояние недействительно
+            self._reset()
+            return {"rows": 0, "reset": True}
+
+        transitions = Counter()
+        new_credit = {}
+        credit_events = []
+        max_id = self.max_result_id
+        seen = set()
+
+        for row in rows_rs:
+            result_id, app_id, server_state, outcome, validate_state, granted_credit, received_time = row
+            idx = self.app_ids.get(app_id)
+            if idx is None or result_id in seen:
+                continue
+            seen.add(result_id)
+            previous = self._pending.get(result_id)
+            if previous is None and result_id <= self.max_result_id:
+                # Уже учтен как окончательный
+                continue
+            if result_id > max_id:
+                max_id = result_id
+
+            contribution = _contribution(server_state, outcome, granted_credit)
+            if previous is not None:
+                _, previous_state, previous_contribution = previous
+                if previous_contribution != contribution:
+                    self._apply_contribution(idx, previous_contribution, -1)
+                    self._apply_contribution(idx, contribution, 1)
+                if previous_state != server_state:
+                    transitions[(previous_state, server_state)] += 1
+                credit_delta = contribution[3] - previous_contribution[3]
+            else:
+                self._apply_contribution(idx, contribution, 1)
+                transitions[(None, server_state)] += 1
+                credit_delta = contribution[3]
+
+            if credit_delta:
+                app_name = self.app_names[idx]
+                new_credit[app_name] = new_credit.get(app_name, 0.0) + credit_delta
+                credit_events.append((app_name, credit_delta, received_time))
+
+            if _is_final(server_state, outcome, validate_state):
+                self._pending.pop(result_id, None)
+            else:
+                self._pending[result_id] = (idx, server_state, contribution)
+
+        self.max_result_id = max_id
+        self.watermark = int(server_now)
+        self.last_refresh = time.time()
+        return {
+            "rows": len(rows_rs),
+            "transitions": transitions,
+            "new_credit": new_credit,
+            "credit_events": credit_events,
+        }
+
+    def needs_bootstrap(self):
+        if not self.bootstrapped:
+            return True
+        if self.resync_interval and time.time() - self.bootstrapped_at >= self.resync_interval:
+            return True
+        return False
+
+    def refresh(self):
+        """Подтянуть изменения из БД. Возвращает (сводка, success)."""
+        with self._lock:
+            if self.needs_bootstrap():
+                credit_events = []
+                if self.bootstrapped:
+                    # Плановая пересинхронизация: сначала забираем накопленные изменения,
+                    # чтобы события кредитов между итерациями не потерялись
+                    results, success = query_multi(self.delta_statements())
+                    if success and len(results) == 2:
+                        credit_events = self.apply_delta(results).get("credit_events", [])
+
+                include_history = not self.bootstrapped
+                statements = self.bootstrap_statements(include_history=include_history)
+                expected = 5 if include_history and self.history_seconds else 4
+                results, success = query_multi(statements)
+                if not success or len(results) != expected:
+                    print("✗ Не удалось загрузить начальное состояние кредитов", file=sys.stderr)
+                    return {}, False
+                summary = self.apply_bootstrap(results)
+                summary["credit_events"] = credit_events + summary["credit_events"]
+                return summary, True
+
+            results, success = query_multi(self.delta_statements())
+            if not success or len(results) != 2:
+                return {}, False
+            summary = self.apply_delta(results)
+            if summary.get("reset"):
+                return self.refresh()
+            return summary, True
+
+    def stats(self):
+        """Текущее состояние в формате get_credit_statistics."""
+        with self._lock:
+            stats = {}
+            for idx, app_name in enumerate(self.app_names):
+                completed_credit = self._credit[idx]
+                completed_count = self._completed[idx]
+                credited_count = self._credited[idx]
+                avg_credit = completed_credit / credited_count if credited_count > 0 else 0.0
+                stats[app_name] = {
+                    'completed_credit': completed_credit,
+                    'completed_count': completed_count,
+                    'avg_credit': avg_credit,
+                    'in_progress_count': self._in_progress[idx],
+                    'unsent_count': self._unsent[idx],
+                }
+            return dict(sorted(stats.items()))
+
+    @property
+    def pending_count(self):
+        return len(self._pending)
+
+
+# Агрегатор на проект (lib.utils.use_project)
+_shared_aggregators = {}
+_shared_lock = threading.Lock()
+
+
+def get_incremental_credit_statistics():
+    """Статистика по кредитам через общий инкрементальный агрегатор процесса."""
+    with _shared_lock:
+        aggregator = _shared_aggregators.get(project_key())
+        if aggregator is None:
+            aggregator = _shared_aggregators[project_key()] = IncrementalCreditAggregator()
+    _, success = aggregator.refresh()
+    if not success:
+        return {}
+    return aggregator.stats()
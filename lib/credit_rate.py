@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Скорость начисления кредитов (кредит/сек) по приложениям в скользящих окнах.
+
+Накопленные суммы за часы работы делают новый дисбаланс малой долей от общего
+кредита, поэтому контроллер может брать на вход скорость за последние минуты.
+События (app, кредит, received_time) приходят из IncrementalCreditAggregator
+и раскладываются по временным корзинам; окна считаются суммированием корзин.
+"""
+import threading
+
+DEFAULT_WINDOWS = (60, 300, 900)
+BUCKET_SECONDS = 5
+
+
+class CreditRateSensor:
+    """Скользящие окна скорости кредитов на корзинах фиксированной длины."""
+
+    def __init__(self, windows=DEFAULT_WINDOWS, bucket_seconds=BUCKET_SECONDS):
+        if not windows:
+            raise ValueError("Нужно хотя бы одно окно")
+        self.windows = tuple(sorted(int(w) for w in windows))
+        self.bucket_seconds = bucket_seconds
+        self.max_window = self.windows[-1]
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._buckets = {}
+        self.started_at = None
+        self.last_update = None
+
+    def add_event(self, app_name, credit, received_time, now):
+        """Учесть начисление кредита; received_time вне [now - max_window, now] прижимается к now или отбрасывается."""
+        if not received_time or received_time > now:
+            received_time = now
+        if received_time < now - self.max_window - self.bucket_seconds:
+            return
+        idx = int(received_time // self.bucket_seconds)
+        bucket = self._buckets.setdefault(idx, {})
+        bucket[app_name] = bucket.get(app_name, 0.0) + credit
+
+    def _prune(self, now):
+        oldest = int((now - self.max_window) // self.bucket_seconds)
+        for idx in [idx for idx in self._buckets if idx < oldest]:
+            del self._buckets[idx]
+
+    def observe(self, summary, now):
+        """Принять сводку refresh/apply_delta агрегатора (серверное время now)."""
+        with self._lock:
+            if summary.get("history"):
+                # Первая загрузка агрегатора (или БД пересоздана) - история уже покрывает окна
+                self.reset()
+                self.started_at = now - self.max_window
+            elif self.started_at is None:
+                self.started_at = now
+            for app_name, credit, received_time in summary.get("credit_events", ()):
+                self.add_event(app_name, credit, received_time, now)
+            self._prune(now)
+            self.last_update = now
+
+    def rates(self, window, now=None):
+        """{app: кредит/сек} за последние window секунд.
+
+        Пока наблюдений меньше окна, делим на фактически покрытый интервал.
+        Граничная корзина учитывается пропорционально попавшей в окно части.
+        """
+        with self._lock:
+            if now is None:
+                now = self.last_update
+            if now is None or self.started_at is None:
+                return {}
+            span = min(window, now - self.started_at)
+            if span <= 0:
+                return {}
+            start = now - span
+            first = int(start // self.bucket_seconds)
+            totals = {}
+            for idx, credits in self._buckets.items():
+                if idx < first:
+                    continue
+                fraction = 1.0
+                if idx == first:
+                    fraction = ((idx + 1) * self.bucket_seconds - start) / self.bucket_seconds
+                for app_name, credit in credits.items():
+                    totals[app_name] = totals.get(app_name, 0.0) + credit * fraction
+            return {app_name: total / span for app_name, total in sorted(totals.items())}
+
+    def all_rates(self, now=None):
+        """{окно: {app: кредит/сек}} по всем настроенным окнам."""
+        return {window: self.rates(window, now) for window in self.windows}
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Материализованная сводка по кредитам приложений в самой БД.
+
+Таблица app_credit_summary хранит по строке на приложение и поддерживается
+триггерами на result, поэтому статистика читается за O(приложений) строк
+вместо агрегации всей таблицы result.
+"""
+import sys
+import time
+import threading
+
+import pymysql
+
+from .db import get_pool, query_value
+from .utils import project_key
+
+SUMMARY_TABLE = "app_credit_summary"
+SUMMARY_TRIGGERS = (
+    "app_credit_summary_ai",
+    "app_credit_summary_au",
+    "app_credit_summary_ad",
+)
+# Как часто перепроверять наличие сводки (БД может быть пересоздана pipeline)
+SUMMARY_CHECK_INTERVAL = 60
+
+_SUMMARY_COLUMNS = (
+    "completed_credit", "completed_count", "credited_count", "in_progress_count", "unsent_count"
+)
+
+CREATE_SUMMARY_TABLE_SQL = f"""
+CREATE TABLE IF NOT EXISTS {SUMMARY_TABLE} (
+    appid INTEGER NOT NULL PRIMARY KEY,
+    completed_credit DOUBLE NOT NULL DEFAULT 0,
+    completed_count INTEGER NOT NULL DEFAULT 0,
+    credited_count INTEGER NOT NULL DEFAULT 0,
+    in_progress_count INTEGER NOT NULL DEFAULT 0,
+    unsent_count INTEGER NOT NULL DEFAULT 0
+) ENGINE=InnoDB
+"""
+
+
+def _contribution(row, sign):
+    """Выражения вклада строки result (NEW/OLD) в колонки сводки."""
+    done = f"{row}.server_state = 5 AND {row}.outcome = 1"
+    return (
+        f"{sign}IF({done}, {row}.granted_credit, 0)",
+        f"{sign}IF({done}, 1, 0)",
+        f"{sign}IF({done} AND {row}.granted_credit > 0, 1, 0)",
+        f"{sign}IF({row}.server_state = 4, 1, 0)",
+        f"{sign}IF({row}.server_state = 2, 1, 0)",
+    )
+
+
+def _upsert(row, sign=""):
+    values = ", ".join(_contribution(row, sign))
+    updates = ", ".join(f"{col} = {col} + VALUES({col})" for col in _SUMMARY_COLUMNS)
+    return (
+        f"INSERT INTO {SUMMARY_TABLE} (appid, {', '.join(_SUMMARY_COLUMNS)}) "
+        f"VALUES ({row}.appid, {values}) "
+        f"ON DUPLICATE KEY UPDATE {updates}"
+    )
+
+
+# Переходы, не меняющие вклад (обновление mod_time, hostid и т.п.), таблицу не трогают
+_CHANGED_CONDITION = (
+    "NOT (OLD.appid <=> NEW.appid) OR NOT (OLD.server_state <=> NEW.server_state) "
+    "OR NOT (OLD.outcome <=> NEW.outcome) OR NOT (OLD.granted_credit <=> NEW.granted_credit)"
+)
+
+CREATE_TRIGGER_SQL = [
+    f"""
+    CREATE TRIGGER {SUMMARY_TRIGGERS[0]} AFTER INSERT ON result FOR EACH ROW
+    {_upsert("NEW")}
+    """,
+    f"""
+    CREATE TRIGGER {SUMMARY_TRIGGERS[1]} AFTER UPDATE ON result FOR EACH ROW
+    BEGIN
+        IF {_CHANGED_CONDITION} THEN
+            {_upsert("OLD", "-")};
+            {_upsert("NEW")};
+        END IF;
+    END
+    """,
+    f"""
+    CREATE TRIGGER {SUMMARY_TRIGGERS[2]} AFTER DELETE ON result FOR EACH ROW
+    {_upsert("OLD", "-")}
+    """,
+]
+
+BACKFILL_SQL = f"""
+INSERT INTO {SUMMARY_TABLE} (appid, {', '.join(_SUMMARY_COLUMNS)})
+SELECT
+    appid,
+    COALESCE(SUM(CASE WHEN server_state = 5 AND outcome = 1 THEN granted_credit ELSE 0 END), 0),
+    COUNT(CASE WHEN server_state = 5 AND outcome = 1 THEN 1 END),
+    COUNT(CASE WHEN server_state = 5 AND outcome = 1 AND granted_credit > 0 THEN 1 END),
+    COUNT(CASE WHEN server_state = 4 THEN 1 END),
+    COUNT(CASE WHEN server_state = 2 THEN 1 END)
+FROM result
+GROUP BY appid
+"""
+
+# Те же колонки, что и в CREDIT_STATISTICS_SQL, чтобы разбирать строки одной функцией
+SUMMARY_STATISTICS_SQL = f"""
+SELECT
+    a.name as app_name,
+    COALESCE(s.completed_credit, 0) as completed_credit,
+    COALESCE(s.completed_count, 0) as completed_count,
+    CASE WHEN s.credited_count > 0 THEN s.completed_credit / s.credited_count ELSE 0 END as avg_credit,
+    COALESCE(s.in_progress_count, 0) as in_progress_count,
+    COALESCE(s.unsent_count, 0) as unsent_count
+FROM app a
+LEFT JOIN {SUMMARY_TABLE} s ON s.appid = a.id
+WHERE a.name IN ('fast_task', 'medium_task', 'long_task', 'random_task')
+    AND a.deprecated = 0
+ORDER BY a.name;
+"""
+
+_INSTALLED_SQL = (
+    "SELECT COUNT(*) FROM information_schema.TRIGGERS "
+    "WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME IN (%s, %s, %s)"
+)
+
+
+def install_credit_summary():
+    """Создать таблицу сводки, триггеры на result и заполнить сводку по существующим результатам.
+
+    Триггеры пересоздаются и сводка пересчитывается под блокировкой result,
+    чтобы ни один переход между бэкфиллом и включением триггеров не потерялся.
+    Повторный вызов безопасен. Возвращает True при успехе.
+    """
+    try:
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(CREATE_SUMMARY_TABLE_SQL)
+                cursor.execute(f"LOCK TABLES result WRITE, {SUMMARY_TABLE} WRITE")
+                try:
+                    for trigger in SUMMARY_TRIGGERS:
+                        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+                    for sql in CREATE_TRIGGER_SQL:
+                        cursor.execute(sql)
+                    cursor.execute(f"DELETE FROM {SUMMARY_TABLE}")
+                    cursor.execute(BACKFILL_SQL)
+                finally:
+                    cursor.execute("UNLOCK TABLES")
+    except pymysql.MySQLError as e:
+        print(f"✗ Ошибка установки {SUMMARY_TABLE}: {e}", file=sys.stderr)
+        return False
+
+    _mark_installed(True)
+    return True
+
+
+def backfill_credit_summary():
+    """Пересчитать сводку по таблице result (для проектов, где триггеры уже стоят)."""
+    try:
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"LOCK TABLES result READ, {SUMMARY_TABLE} WRITE")
+                try:
+                    cursor.execute(f"DELETE FROM {SUMMARY_TABLE}")
+                    rowcount = cursor.execute(BACKFILL_SQL)
+                finally:
+                    cursor.execute("UNLOCK TABLES")
+    except pymysql.MySQLError as e:
+        print(f"✗ Ошибка пересчета {SUMMARY_TABLE}: {e}", file=sys.stderr)
+        return 0, False
+    return rowcount, True
+
+
+# {проект: (установлена ли сводка, время проверки)}
+_installed = {}
+_installed_lock = threading.Lock()
+
+
+def _mark_installed(value):
+    with _installed_lock:
+        _installed[project_key()] = (value, time.monotonic())
+
+
+def credit_summary_installed():
+    """Есть ли в БД сводка со всеми триггерами (результат кэшируется на SUMMARY_CHECK_INTERVAL)."""
+    with _installed_lock:
+        cached = _installed.get(project_key())
+        if cached is not None and time.monotonic() - cached[1] < SUMMARY_CHECK_INTERVAL:
+            return cached[0]
+    count = query_value(_INSTALLED_SQL, SUMMARY_TRIGGERS)
+    installed = count is not None and int(count) == len(SUMMARY_TRIGGERS)
+    _mark_installed(installed)
+    return installed
+
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Пул долгоживущих соединений с MySQL проекта BOINC.
+
+Вместо запуска `docker exec ... mysql` на каждый запрос держим несколько
+открытых соединений к сервису mysql, который docker-compose публикует на 3306.
+"""
+import os
+import sys
+import queue
+import threading
+from array import array
+from contextlib import contextmanager
+
+import pymysql
+from pymysql.constants import CLIENT, FIELD_TYPE
+from pymysql.converters import conversions
+
+from .utils import load_env_file, current_project
+
+_env = load_env_file()
+
+DB_CONFIG = {
+    "host": os.environ.get("MYSQL_HOST", _env.get("MYSQL_HOST", "127.0.0.1")),
+    "port": int(os.environ.get("MYSQL_PORT", _env.get("MYSQL_PORT", "3306"))),
+    "user": os.environ.get("MYSQL_USER", _env.get("MYSQL_USER", "root")),
+    "password": os.environ.get("MYSQL_PASSWORD", _env.get("MYSQL_PASSWORD", "password")),
+    "database": os.environ.get("MYSQL_DATABASE", _env.get("MYSQL_DATABASE", "boincserver")),
+}
+
+POOL_SIZE = 4
+CONNECT_TIMEOUT = 5
+# Сколько ждать свободного соединения пула, с (дольше - скорее всего утечка соединения)
+ACQUIRE_TIMEOUT = 30
+
+# DECIMAL (SUM/AVG по кредитам) сразу отдаем как float, чтобы не тащить Decimal в расчеты
+_conversions = dict(conversions)
+_conversions[FIELD_TYPE.DECIMAL] = float
+_conversions[FIELD_TYPE.NEWDECIMAL] = float
+
+
+def create_connection(**overrides):
+    """Открыть новое соединение с параметрами DB_CONFIG (с возможностью переопределения)."""
+    params = dict(DB_CONFIG)
+    params.update(overrides)
+    return pymysql.connect(
+        conv=_conversions,
+        connect_timeout=CONNECT_TIMEOUT,
+        client_flag=CLIENT.MULTI_STATEMENTS,
+        autocommit=True,
+        charset="utf8mb4",
+        **params
+    )
+
+
+class ConnectionPool:
+    """Потокобезопасный пул соединений фиксированного размера."""
+
+    def __init__(self, size=POOL_SIZE, acquire_timeout=ACQUIRE_TIMEOUT, **overrides):
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.overrides = overrides
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    return create_connection(**self.overrides)
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            try:
+                conn = self._idle.get(timeout=self.acquire_timeout)
+            except queue.Empty:
+                # Вызывающие обрабатывают MySQLError и возвращают (значение, False)
+                raise pymysql.OperationalError(
+                    2013, f"нет свободного соединения в пуле ({self.size}) за {self.acquire_timeout} с")
+        # Соединение могло быть закрыто сервером (wait_timeout) - переподключаемся
+        try:
+            conn.ping(reconnect=True)
+        except pymysql.MySQLError:
+            self._release(conn, broken=True)
+            raise
+        return conn
+
+    def _release(self, conn, broken=False):
+        if broken:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            with self._lock:
+                self._created -= 1
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        broken = False
+        try:
+            yield conn
+        except pymysql.OperationalError:
+            broken = True
+            raise
+        except BaseException:
+            # Открытая транзакция или непрочитанные результаты не должны вернуться в пул
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            self._release(conn, broken=broken)
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn.close()
+            except Exception:
+                pass
+            with self._lock:
+                self._created -= 1
+
+
+_pools = {}
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Пул текущего проекта (lib.utils.use_project): DB_CONFIG с его настройками db."""
+    project = current_project()
+    key = project.name if project is not None else None
+    pool = _pools.get(key)
+    if pool is None:
+        with _pool_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(**(project.db if project is not None else {}))
+    return pool
+
+
+class ResultSet:
+    """Результат SELECT: имена колонок и строки-кортежи со значениями, типизированными драйвером.
+
+    Колонки можно получать целиком (список или array.array) без построения словаря на строку.
+    """
+
+    def __init__(self, columns, rows):
+        self.columns = list(columns)
+        self.rows = rows
+        self._index = {name: i for i, name in enumerate(self.columns)}
+        self._transposed = None
+        self._extra = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __bool__(self):
+        return bool(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def _columns(self):
+        if self._transposed is None:
+            if self.rows:
+                self._transposed = list(zip(*self.rows))
+            else:
+                self._transposed = [() for _ in self.columns]
+        return self._transposed
+
+    def column(self, name, typecode=None):
+        """Значения колонки; с typecode возвращается компактный array.array."""
+        if name in self._extra:
+            values = self._extra[name]
+        else:
+            values = self._columns()[self._index[name]]
+        if typecode is not None:
+            return array(typecode, values)
+        return values
+
+    def add_column(self, name, values):
+        """Добавить вычисляемую колонку (той же длины, что и результат)."""
+        values = list(values)
+        if len(values) != len(self.rows):
+            raise ValueError(f"Длина колонки {name} ({len(values)}) не совпадает с числом строк ({len(self.rows)})")
+        self._extra[name] = values
+
+    def to_dicts(self):
+        """Материализовать строки в словари (для JSON и старых вызывающих)."""
+        names = self.columns + list(self._extra)
+        if self._extra:
+            rows = zip(*(self._columns() + list(self._extra.values())))
+        else:
+            rows = self.rows
+        return [dict(zip(names, row)) for row in rows]
+
+
+def query_result(sql, args=None):
+    """Выполнить SELECT и вернуть (ResultSet, success)."""
+    try:
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, args)
+                columns = [d[0] for d in cursor.description] if cursor.description else []
+                return ResultSet(columns, cursor.fetchall()), True
+    except pymysql.MySQLError as e:
+        print(f"✗ Ошибка SQL: {e}", file=sys.stderr)
+        return ResultSet([], ()), False
+
+
+def query_multi(statements):
+    """Выполнить несколько запросов одним обращением к серверу.
+
+    statements - список SQL-строк (без параметров). Возвращает (список ResultSet
+    для запросов, вернувших строки, success). При ошибке любого запроса
+    соединение откатывается (ConnectionPool.connection), поэтому транзакция из
+    statements не остается открытой в пуле.
+    """
+    sql = ";\n".join(stmt.strip().rstrip(";") for stmt in statements)
+    results = []
+    try:
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql)
+                while True:
+                    if cursor.description:
+                        columns = [d[0] for d in cursor.description]
+                        results.append(ResultSet(columns, cursor.fetchall()))
+                    if not cursor.nextset():
+                        break
+        return results, True
+    except pymysql.MySQLError as e:
+        print(f"✗ Ошибка SQL: {e}", file=sys.stderr)
+        return results, False
+
+
+def query(sql, args=None, as_dict=False):
+    """Выполнить SELECT и вернуть (rows, success).
+
+    rows - список кортежей или словарей (as_dict=True) с уже типизированными значениями.
+    """
+    result, success = query_result(sql, args)
+    if as_dict:
+        return result.to_dicts(), success
+    return list(result.rows), success
+
+
+def query_value(sql, args=None):
+    """Выполнить запрос и вернуть первое поле первой строки (или None)."""
+    rows, success = query(sql, args)
+    if not success or not rows:
+        return None
+    return rows[0][0]
+
+
+def execute(sql, args=None):
+    """Выполнить изменяющий запрос и вернуть (rowcount, success)."""
+    try:
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                rowcount = cursor.execute(sql, args)
+                return rowcount, True
+    except pymysql.MySQLError as e:
+        print(f"✗ Ошибка SQL: {e}", file=sys.stderr)
+        return 0, False
+
+
+def execute_transaction(statements):
+    """Выполнить список (sql, args) одной транзакцией. Возвращает (rowcount, success)."""
+    try:
+        with get_pool().connection() as conn:
+            try:
+                conn.begin()
+                total = 0
+                with conn.cursor() as cursor:
+                    for sql, args in statements:
+                        total += cursor.execute(sql, args)
+                conn.commit()
+                return total, True
+            except pymysql.MySQLError:
+                conn.rollback()
+                raise
+    except pymysql.MySQLError as e:
+        print(f"✗ Ошибка SQL: {e}", file=sys.stderr)
+        return 0, False
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Дискретно-событийная модель цикла выдачи BOINC для оценки контроллеров весов без docker.
+
+Модель повторяет настройки проекта (setup_daemons, app_config.xml клиентов):
+- клиент держит не больше min(max_wus_in_progress, project_max_concurrent) задач,
+  обращается к планировщику не чаще min_sendwork_interval и получает одну задачу
+  за запрос (max_wus_to_send=1), готовые результаты сдает на следующем запросе;
+- feeder (--allapps) раз в sleep_interval заполняет слоты, распределенные между
+  приложениями по weighted_interleave (lib.slot_model); планировщик берет задачу
+  из случайного занятого слота; смена распределения стоит restart_seconds без слотов;
+- время выполнения задач - как в tasks/*.py, кредит пропорционален времени
+  и начисляется валидатором через validate_delay после сдачи.
+
+Раз в interval секунд вызывается контроллер с той же статистикой, что дает
+get_credit_statistics, и состоянием очереди feeder.
+"""
+import heapq
+import random
+
+from .slot_model import slot_counts
+
+# (мин, макс) время выполнения, с: tasks/fast_task.py, medium_task.py, long_task.py, random_task.py
+APP_RUNTIMES = {
+    "fast_task": (1.0, 1.0),
+    "medium_task": (10.0, 10.0),
+    "random_task": (5.0, 15.0),
+    "long_task": (30.0, 30.0),
+}
+
+DEFAULT_CLIENTS = 20
+MAX_WUS_IN_PROGRESS = 1
+PROJECT_MAX_CONCURRENT = 2
+MIN_SENDWORK_INTERVAL = 2
+NO_WORK_BACKOFF = 10
+FEEDER_SLOTS = 100
+FEEDER_SLEEP = 1
+RESTART_SECONDS = 3
+VALIDATE_DELAY = 5
+CREDIT_PER_SECOND = 1.0
+
+_REQUEST = 0
+_FINISH = 1
+_VALIDATE = 2
+_FEEDER = 3
+_CONTROL = 4
+_RESTARTED = 5
+
+
+class DispatchSimulator:
+    """Симуляция выдачи: run(controller, duration, interval) -> список шагов контроллера."""
+
+    def __init__(self, weights, runtimes=None, clients=DEFAULT_CLIENTS, max_wus_in_progress=MAX_WUS_IN_PROGRESS,
+                 project_max_concurrent=PROJECT_MAX_CONCURRENT, min_sendwork_interval=MIN_SENDWORK_INTERVAL,
+                 no_work_backoff=NO_WORK_BACKOFF, feeder_slots=FEEDER_SLOTS, feeder_sleep=FEEDER_SLEEP,
+                 restart_seconds=RESTART_SECONDS, validate_delay=VALIDATE_DELAY,
+                 credit_per_second=CREDIT_PER_SECOND, unsent=None, seed=None):
+        self.weights = dict(weights)
+        self.apps = list(self.weights)
+        self.runtimes = dict(APP_RUNTIMES if runtimes is None else runtimes)
+        self.clients = clients
+        self.client_limit = min(max_wus_in_progress, project_max_concurrent)
+        self.min_sendwork_interval = min_sendwork_interval
+        self.no_work_backoff = no_work_backoff
+        self.feeder_slots = feeder_slots
+        self.feeder_sleep = feeder_sleep
+        self.restart_seconds = restart_seconds
+        self.validate_delay = validate_delay
+        self.credit_per_second = credit_per_second
+        # None - генератор работы держит очередь непустой
+        self.unsent = None if unsent is None else dict(unsent)
+        self.rng = random.Random(seed)
+
+        self.now = 0.0
+        self.restarts = 0
+        self.allotted = slot_counts(self.weights, feeder_slots)
+        self.filled = {app: 0 for app in self.apps}
+        self.feeder_up = True
+        self.completed_credit = {app: 0.0 for app in self.apps}
+        self.completed_count = {app: 0 for app in self.apps}
+        self.credited_count = {app: 0 for app in self.apps}
+        self.in_progress = {app: 0 for app in self.apps}
+        self._events = []
+        self._seq = 0
+        self._running = [0] * clients
+        self._reports = [[] for _ in range(clients)]
+        self._last_rpc = [float("-inf")] * clients
+        self._pending_request = [False] * clients
+
+    def _push(self, at, kind, payload=None):
+        self._seq += 1
+        heapq.heappush(self._events, (at, self._seq, kind, payload))
+
+    def _schedule_request(self, client, at):
+        if self._pending_request[client]:
+            return
+        self._pending_request[client] = True
+        self._push(max(at, self._last_rpc[client] + self.min_sendwork_interval), _REQUEST, client)
+
+    def _fill_slots(self):
+        for app in self.apps:
+            free = self.allotted.get(app, 0) - self.filled[app]
+            if free <= 0:
+                continue
+            if self.unsent is not None:
+                free = min(free, self.unsent.get(app, 0) - self.filled[app])
+            if free > 0:
+                self.filled[app] += free
+
+    def _take_job(self):
+        total = sum(self.filled.values())
+        if not self.feeder_up or total == 0:
+            return None
+        pick = self.rng.randrange(total)
+        for app in self.apps:
+            pick -= self.filled[app]
+            if pick < 0:
+                self.filled[app] -= 1
+                if self.unsent is not None:
+                    self.unsent[app] -= 1
+                return app
+        return None
+
+    def _runtime(self, app):
+        low, high = self.runtimes[app]
+        return low if high <= low else self.rng.uniform(low, high)
+
+    def _on_request(self, client):
+        self._pending_request[client] = False
+        self._last_rpc[client] = self.now
+        for app, runtime in self._reports[client]:
+            self.in_progress[app] -= 1
+            self.completed_count[app] += 1
+            self._push(self.now + self.validate_delay, _VALIDATE, (app, runtime))
+        self._reports[client] = []
+
+        if self._running[client] >= self.client_limit:
+            return
+        app = self._take_job()
+        if app is None:
+            self._schedule_request(client, self.now + self.no_work_backoff)
+            return
+        runtime = self._runtime(app)
+        self._running[client] += 1
+        self.in_progress[app] += 1
+        self._push(self.now + runtime, _FINISH, (client, app, runtime))
+        if self._running[client] < self.client_limit:
+            self._schedule_request(client, self.now)
+
+    def _on_finish(self, client, app, runtime):
+        self._running[client] -= 1
+        self._reports[client].append((app, runtime))
+        self._schedule_request(client, self.now)
+
+    def _on_validate(self, app, runtime):
+        credit = runtime * self.credit_per_second
+        if credit > 0:
+            self.completed_credit[app] += credit
+            self.credited_count[app] += 1
+
+    def credit_stats(self):
+        """{app: stats} в формате get_credit_statistics."""
+        stats = {}
+        for app in self.apps:
+            credited = self.credited_count[app]
+            stats[app] = {
+                "completed_credit": self.completed_credit[app],
+                "completed_count": self.completed_count[app],
+                "avg_credit": self.completed_credit[app] / credited if credited > 0 else 0.0,
+                "in_progress_count": self.in_progress[app],
+                "unsent_count": self.filled[app] if self.unsent is None else self.unsent.get(app, 0),
+            }
+        return stats
+
+    def queue_state(self):
+        """(доли, количества, всего слотов) очереди feeder, как в SensorSnapshot."""
+        counts = dict(self.filled) if self.feeder_up else {}
+        occupied = sum(counts.values())
+        shares = {app: count / occupied for app, count in counts.items()} if occupied else {}
+        return shares, counts, self.feeder_slots if self.feeder_up else 0
+
+    def apply_weights(self, weights, restart=True):
+        """Записать веса; True, если распределение слотов изменилось и feeder перезапускается.
+
+        restart=False - только запись в БД: слоты остаются прежними до следующего перезапуска.
+        """
+        self.weights.update(weights)
+        if not restart:
+            return False
+        allotted = slot_counts(self.weights, self.feeder_slots)
+        if allotted == self.allotted:
+            return False
+        self.allotted = allotted
+        self.restarts += 1
+        self.feeder_up = False
+        self.filled = {app: 0 for app in self.apps}
+        self._push(self.now + self.restart_seconds, _RESTARTED)
+        return True
+
+    def run(self, controller, duration, interval):
+        """Прогнать duration секунд; controller(sim, dt) вызывается раз в interval секунд.
+
+        controller возвращает запись шага (попадает в результат) или None.
+        """
+        self._fill_slots()
+        for client in range(self.clients):
+            self._schedule_request(client, self.rng.uniform(0, self.min_sendwork_interval))
+        self._push(self.feeder_sleep, _FEEDER)
+        self._push(interval, _CONTROL)
+
+        steps = []
+        while self._events and self._events[0][0] <= duration:
+            self.now, _, kind, payload = heapq.heappop(self._events)
+            if kind == _REQUEST:
+                self._on_request(payload)
+            elif kind == _FINISH:
+                self._on_finish(*payload)
+            elif kind == _VALIDATE:
+                self._on_validate(*payload)
+            elif kind == _FEEDER:
+                if self.feeder_up:
+                    self._fill_slots()
+                self._push(self.now + self.feeder_sleep, _FEEDER)
+            elif kind == _RESTARTED:
+                self.feeder_up = True
+                self._fill_slots()
+            elif kind == _CONTROL:
+                step = controller(self, interval)
+                if step is not None:
+                    steps.append(step)
+                self._push(self.now + interval, _CONTROL)
+        self.now = duration
+        return steps
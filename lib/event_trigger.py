@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Событийный запуск итераций балансировщика вместо фиксированного sleep(interval).
+
+CompletionTrigger часто опрашивает IncrementalCreditAggregator (дельта по водяному
+знаку result.id/mod_time - дешевый запрос) и копит кредит, начисленный с прошлой
+итерации. Итерация запускается, когда новый кредит достиг заданной доли от
+кредита, который при недавней скорости приходит за max_latency, или истек
+max_latency; если за max_latency не пришло ничего, итерация пропускается -
+перезапуск feeder на тех же данных бесполезен. Недавняя скорость - сглаженная
+скорость прошлых окон ожидания (до первого окна - скорость из CreditRateSensor,
+если он есть), поэтому порог не растет вместе с накопленным за все время
+кредитом. Опросы без запуска считаются по причинам.
+"""
+import sys
+import time
+from collections import Counter
+
+from .credit_aggregator import RESULT_SERVER_STATE_OVER
+
+SCHEDULE_INTERVAL = "interval"
+SCHEDULE_EVENT = "event"
+
+DEFAULT_POLL_INTERVAL = 2.0
+DEFAULT_MAX_LATENCY = 300.0
+DEFAULT_MIN_INTERVAL = 10.0
+# Доля кредита, ожидаемого за max_latency при недавней скорости, достаточная для итерации
+DEFAULT_CREDIT_FRACTION = 0.25
+# Сглаживание скорости кредитов по окнам ожидания
+RATE_SMOOTHING = 0.3
+
+TRIGGER_CREDIT = "credit"
+TRIGGER_DEADLINE = "deadline"
+
+SKIP_BELOW_THRESHOLD = "below_threshold"
+SKIP_MIN_INTERVAL = "min_interval"
+SKIP_NO_NEW_CREDIT = "no_new_credit"
+SKIP_POLL_FAILED = "poll_failed"
+
+
+class CompletionTrigger:
+    """Ожидание следующей итерации по новым кредитам: wait() -> сводка срабатывания."""
+
+    def __init__(self, aggregator, rate_sensor=None, credit_fraction=DEFAULT_CREDIT_FRACTION,
+                 max_latency=DEFAULT_MAX_LATENCY, min_interval=DEFAULT_MIN_INTERVAL,
+                 poll_interval=DEFAULT_POLL_INTERVAL):
+        self.aggregator = aggregator
+        # События кредитов, забранные опросом, передаются сенсору скорости - иначе они потеряются
+        self.rate_sensor = rate_sensor
+        self.credit_fraction = credit_fraction
+        self.max_latency = max_latency
+        self.min_interval = min_interval
+        self.poll_interval = poll_interval
+        self.skipped = Counter()
+        self.triggered = Counter()
+        # Сглаженная скорость кредитов прошлых окон, кредит/с (None - окон еще не было)
+        self.credit_rate = None
+        self.last_iteration = time.monotonic()
+        self.window_start = self.last_iteration
+        self._reset_window()
+
+    def _reset_window(self):
+        self.new_credit = {}
+        self.new_completed = 0
+        self.polls = 0
+        self._window_skipped = Counter()
+
+    def _observe(self, summary):
+        for app_name, credit in summary.get("new_credit", {}).items():
+            self.new_credit[app_name] = self.new_credit.get(app_name, 0.0) + credit
+        self.new_completed += sum(count for (_, state), count in summary.get("transitions", {}).items()
+                                  if state == RESULT_SERVER_STATE_OVER)
+        if self.rate_sensor is not None and self.aggregator.watermark is not None:
+            self.rate_sensor.observe(summary, float(self.aggregator.watermark))
+
+    def _close_window(self, now):
+        duration = now - self.window_start
+        if duration > 0:
+            rate = sum(self.new_credit.values()) / duration
+            self.credit_rate = rate if self.credit_rate is None else \
+                self.credit_rate + RATE_SMOOTHING * (rate - self.credit_rate)
+        self.window_start = now
+
+    def expected_credit(self):
+        """Кредит, ожидаемый за max_latency при недавней скорости (None - скорость неизвестна)."""
+        rate = self.credit_rate
+        if rate is None and self.rate_sensor is not None:
+            rates = self.rate_sensor.rates(self.rate_sensor.max_window)
+            rate = sum(rates.values()) if rates else None
+        return rate * self.max_latency if rate else None
+
+    def _skip(self, reason):
+        self.skipped[reason] += 1
+        self._window_skipped[reason] += 1
+
+    def poll(self):
+        """Один опрос. Возвращает причину запуска итерации или None."""
+        self.polls += 1
+        summary, success = self.aggregator.refresh()
+        if not success:
+            self._skip(SKIP_POLL_FAILED)
+            print("⚠ Не удалось опросить новые результаты", file=sys.stderr)
+            return None
+        self._observe(summary)
+
+        now = time.monotonic()
+        new_total = sum(self.new_credit.values())
+        expected = self.expected_credit()
+
+        if new_total > 0 and expected is not None and new_total >= self.credit_fraction * expected:
+            if now - self.last_iteration >= self.min_interval:
+                return TRIGGER_CREDIT
+            self._skip(SKIP_MIN_INTERVAL)
+            return None
+        if now - self.window_start >= self.max_latency:
+            if new_total > 0:
+                return TRIGGER_DEADLINE
+            # За max_latency ничего не пришло: окно начинается заново без итерации
+            self._skip(SKIP_NO_NEW_CREDIT)
+            self._close_window(now)
+            return None
+        self._skip(SKIP_BELOW_THRESHOLD)
+        return None
+
+    def wait(self, sleep=None):
+        """Опрашивать до срабатывания; возвращает сводку окна для лога и снимка.
+
+        sleep(секунды) -> True, если ожидание прервано (например,
+        BalancerControl.wait_unless_paused при pause через API); тогда окно
+        начинается заново и возвращается None.
+        """
+        while True:
+            started = time.monotonic()
+            reason = self.poll()
+            if reason is not None:
+                break
+            delay = max(self.poll_interval - (time.monotonic() - started), 0.0)
+            if sleep is None:
+                time.sleep(delay)
+            elif sleep(delay):
+                # Итерация после прерывания сама прочитает накопленный кредит
+                self.last_iteration = self.window_start = time.monotonic()
+                self._reset_window()
+                return None
+
+        now = time.monotonic()
+        self.triggered[reason] += 1
+        info = {
+            "reason": reason,
+            "waited_seconds": now - self.last_iteration,
+            "polls": self.polls,
+            "new_credit": dict(self.new_credit),
+            "new_completed": self.new_completed,
+            "skipped": dict(self._window_skipped),
+            "skipped_total": dict(self.skipped),
+            "credit_rate": self.credit_rate,
+        }
+        self._close_window(now)
+        self.last_iteration = now
+        self._reset_window()
+        return info
+
+
+def describe_trigger(info):
+    """Строка лога о срабатывании: причина, ожидание, новый кредит и пропущенные опросы."""
+    skipped = ", ".join(f"{reason} {count}" for reason, count in sorted(info["skipped"].items())) or "нет"
+    return (f"Итерация по событию '{info['reason']}' через {info['waited_seconds']:.1f} с: "
+            f"новый кредит {sum(info['new_credit'].values()):.2f}, завершено {info['new_completed']}, "
+            f"пропущено опросов: {skipped}")
+
+
+def describe_totals(trigger):
+    """Итог за весь цикл: срабатывания и пропуски по причинам."""
+    triggered = ", ".join(f"{reason} {count}" for reason, count in sorted(trigger.triggered.items())) or "нет"
+    skipped = ", ".join(f"{reason} {count}" for reason, count in sorted(trigger.skipped.items())) or "нет"
+    return f"Событийный режим: итераций по причинам: {triggered}; пропущено опросов: {skipped}"
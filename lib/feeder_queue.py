@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Единый снимок очереди feeder: занятость слотов по приложениям и веса из shared memory.
+
+Снимок читается один раз (напрямую через lib.shmem, иначе одним запуском
+bin/show_shmem) и кэшируется на QUEUE_SNAPSHOT_TTL секунд, поэтому количества,
+доли и веса внутри итерации согласованы между собой.
+"""
+import re
+import time
+import threading
+from collections import namedtuple
+
+from .utils import run_command, project_home, project_key
+from .shmem import read_feeder_shmem
+from .app_config import BALANCED_APPS
+
+QUEUE_SNAPSHOT_TTL = 1.0
+
+_JOBS_HEADER_RE = re.compile(r"(?=.*slot)(?=.*app)(?=.*wu id)", re.IGNORECASE)
+_EMPTY_SLOT_RE = re.compile(r"\s*\d+:\s+---")
+_OCCUPIED_SLOT_RE = re.compile(r"\s*\d+\s+(\w+)\s+\d+")
+_APP_LINE_RE = re.compile(r"^id:.*?\bname:\s+(\S+).*?\bweight:\s+(\S+)", re.MULTILINE)
+
+_FeederQueueSnapshotBase = namedtuple("FeederQueueSnapshot", [
+    "timestamp",    # time.time() момента чтения
+    "source",       # "shmem" (прямое чтение) или "show_shmem"
+    "counts",       # {app: число занятых слотов}
+    "total_slots",  # всего слотов в очереди
+    "weights",      # {app: вес в shared memory} для BALANCED_APPS
+])
+
+
+class FeederQueueSnapshot(_FeederQueueSnapshotBase):
+    """Состояние очереди feeder на момент чтения."""
+    __slots__ = ()
+
+    @property
+    def occupied_slots(self):
+        return sum(self.counts.values())
+
+    @property
+    def empty_slots(self):
+        return max(self.total_slots - self.occupied_slots, 0)
+
+    @property
+    def shares(self):
+        """{app: доля от занятых слотов} (пусто, если очередь пуста)."""
+        occupied = self.occupied_slots
+        if occupied == 0:
+            return {}
+        return {name: count / float(occupied) for name, count in self.counts.items()}
+
+
+def parse_show_shmem(stdout):
+    """Разобрать вывод show_shmem за один проход. Возвращает (counts, total_slots, weights)."""
+    weights = {}
+    for name, weight in _APP_LINE_RE.findall(stdout):
+        try:
+            weights[name] = float(weight)
+        except ValueError:
+            continue
+
+    counts = {}
+    total_slots = 0
+    in_jobs_section = False
+    for line in stdout.splitlines():
+        if _JOBS_HEADER_RE.match(line):
+            in_jobs_section = True
+            continue
+        if not in_jobs_section:
+            continue
+        if _EMPTY_SLOT_RE.match(line):
+            total_slots += 1
+            continue
+        match = _OCCUPIED_SLOT_RE.match(line)
+        if match:
+            app_name = match.group(1)
+            counts[app_name] = counts.get(app_name, 0) + 1
+            total_slots += 1
+    return counts, total_slots, weights
+
+
+def _balanced_weights(weights):
+    # Веса остальных приложений проекта не должны попасть в решения о перезапуске и проверку чекпоинта
+    return {name: weight for name, weight in weights.items() if name in BALANCED_APPS}
+
+
+def read_feeder_queue():
+    """Прочитать очередь без кэша. Возвращает FeederQueueSnapshot или None.
+
+    Занятость считается по всем приложениям, веса - только по BALANCED_APPS.
+    """
+    shm = read_feeder_shmem()
+    if shm is not None:
+        return FeederQueueSnapshot(
+            timestamp=shm.timestamp,
+            source="shmem",
+            counts=shm.queue_counts(),
+            total_slots=shm.total_slots,
+            weights=_balanced_weights(shm.weights()),
+        )
+
+    stdout, success = run_command(f"cd {project_home()} && bin/show_shmem", check=False, capture_output=True)
+    if not success or not stdout:
+        return None
+    counts, total_slots, weights = parse_show_shmem(stdout)
+    if not weights and total_slots == 0:
+        return None
+    return FeederQueueSnapshot(
+        timestamp=time.time(),
+        source="show_shmem",
+        counts=counts,
+        total_slots=total_slots,
+        weights=_balanced_weights(weights),
+    )
+
+
+# Снимок и блокировка на проект (lib.utils.use_project): медленный show_shmem одного проекта не держит другие
+_cached = {}
+_cache_locks = {}
+_cache_lock = threading.Lock()
+
+
+def _project_lock(key):
+    with _cache_lock:
+        return _cache_locks.setdefault(key, threading.Lock())
+
+
+def get_feeder_queue_snapshot(max_age=None):
+    """Снимок очереди feeder не старше max_age секунд (по умолчанию QUEUE_SNAPSHOT_TTL).
+
+    max_age=0 - всегда читать заново. Возвращает FeederQueueSnapshot или None.
+    """
+    if max_age is None:
+        max_age = QUEUE_SNAPSHOT_TTL
+    key = project_key()
+    with _project_lock(key):
+        cached = _cached.get(key)
+        if cached is not None and max_age > 0 and time.time() - cached.timestamp < max_age:
+            return cached
+        snapshot = read_feeder_queue()
+        if snapshot is not None:
+            _cached[key] = snapshot
+        return snapshot
+
+
+def feeder_weights_applied(weights, tolerance=1e-6):
+    """Проверка после перезапуска: веса в shared memory совпадают с weights {app: weight}."""
+    snapshot = get_feeder_queue_snapshot(max_age=0)
+    if snapshot is None or not snapshot.weights:
+        return False
+    for name, weight in weights.items():
+        applied = snapshot.weights.get(name)
+        if applied is None or abs(applied - weight) > tolerance * max(abs(weight), 1.0):
+            return False
+    return True
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Супервизор feeder внутри контейнера для быстрого применения весов.
+
+Стоковый feeder вызывает weighted_interleave только при старте, а reread_db
+перечитывает веса без перераспределения слотов, поэтому без пересборки BOINC
+пересчитать распределение можно только новым процессом. Супервизор
+(bin/feeder_supervisor, запускается из config.xml вместо feeder) держит feeder
+дочерним процессом и по файлу-триггеру reload_feeder останавливает его SIGHUP
+и сразу запускает заново: без docker exec на каждый шаг, фиксированных пауз
+и проверки остальных демонов. Кэш заданий пуст только на время старта feeder.
+
+Упавший feeder перезапускается с растущей паузой (RESPAWN_MIN_DELAY, удваивается
+до RESPAWN_MAX_DELAY, пока feeder живет меньше FEEDER_STABLE_SECONDS); каждое
+падение пишется в logs/feeder_supervisor.log, а число падений подряд - в
+ответ на reload, чтобы reload_feeder сообщал о цикле падений.
+"""
+import sys
+
+from .utils import run_command, project_home
+
+FEEDER_ARGS = "-d 3 --allapps --priority_order --sleep_interval 1"
+# Без --allapps слоты заполняются одной выборкой ORDER BY priority (актуатор приоритетов)
+FEEDER_PRIORITY_ARGS = "-d 3 --priority_order --sleep_interval 1"
+# Аргументы для следующего запуска feeder супервизором (если файл есть)
+FEEDER_ARGS_FILE = "feeder_args"
+SUPERVISOR_NAME = "feeder_supervisor"
+RELOAD_TRIGGER = "reload_feeder"
+RELOAD_DONE = "feeder_reloaded"
+SUPERVISOR_POLL = 0.05
+# Сколько ждать выхода feeder по SIGHUP до SIGKILL
+FEEDER_STOP_TIMEOUT = 5
+RELOAD_TIMEOUT = 10
+# Пауза перед перезапуском упавшего feeder, с: удваивается при падениях подряд
+RESPAWN_MIN_DELAY = 1
+RESPAWN_MAX_DELAY = 60
+# Feeder, проработавший дольше, считается запущенным успешно (счетчик падений сбрасывается), с
+FEEDER_STABLE_SECONDS = 30
+# С этого числа падений подряд reload_feeder считает перезапуск неудачным
+CRASH_LOOP_THRESHOLD = 3
+# Шаблон pgrep, не совпадающий с командной строкой самого bash -c
+_SUPERVISOR_PATTERN = "[f]eeder_supervisor"
+
+SUPERVISOR_SCRIPT = f"""#!/bin/bash
+# Держит feeder запущенным и перезапускает его по триггеру {RELOAD_TRIGGER}
+cd "$(dirname "$0")/.." || exit 1
+FEEDER_PID=
+FEEDER_STARTED=0
+CRASHES=0
+DELAY={RESPAWN_MIN_DELAY}
+RESPAWN_AT=0
+
+log() {{
+    echo "$(date '+%Y-%m-%d %H:%M:%S') $*" >> logs/{SUPERVISOR_NAME}.log
+}}
+
+start_feeder() {{
+    ARGS="{FEEDER_ARGS}"
+    [ -s {FEEDER_ARGS_FILE} ] && ARGS=$(cat {FEEDER_ARGS_FILE})
+    bin/feeder $ARGS >> logs/feeder.log 2>&1 &
+    FEEDER_PID=$!
+    FEEDER_STARTED=$SECONDS
+}}
+
+stop_feeder() {{
+    [ -n "$FEEDER_PID" ] || return
+    kill -HUP "$FEEDER_PID" 2>/dev/null
+    ( sleep {FEEDER_STOP_TIMEOUT}; kill -9 "$FEEDER_PID" 2>/dev/null ) &
+    WATCHDOG_PID=$!
+    wait "$FEEDER_PID" 2>/dev/null
+    kill "$WATCHDOG_PID" 2>/dev/null
+    FEEDER_PID=
+}}
+
+trap 'stop_feeder; exit 0' HUP TERM INT
+
+mkdir -p logs
+rm -f {RELOAD_TRIGGER}
+start_feeder
+while true; do
+    if [ -f {RELOAD_TRIGGER} ]; then
+        rm -f {RELOAD_TRIGGER} {RELOAD_DONE}
+        T_STOP=$(date +%s.%N)
+        stop_feeder
+        T_STOPPED=$(date +%s.%N)
+        start_feeder
+        echo "$FEEDER_PID $T_STOP $T_STOPPED $(date +%s.%N) $CRASHES" > {RELOAD_DONE}
+    elif [ -n "$FEEDER_PID" ] && ! kill -0 "$FEEDER_PID" 2>/dev/null; then
+        wait "$FEEDER_PID" 2>/dev/null
+        STATUS=$?
+        LIVED=$((SECONDS - FEEDER_STARTED))
+        if [ "$LIVED" -lt {FEEDER_STABLE_SECONDS} ] && [ "$CRASHES" -gt 0 ]; then
+            DELAY=$((DELAY * 2))
+            [ "$DELAY" -gt {RESPAWN_MAX_DELAY} ] && DELAY={RESPAWN_MAX_DELAY}
+        else
+            DELAY={RESPAWN_MIN_DELAY}
+        fi
+        CRASHES=$((CRASHES + 1))
+        log "feeder $FEEDER_PID завершился (код $STATUS, проработал $LIVED с), падений подряд $CRASHES, перезапуск через $DELAY с"
+        FEEDER_PID=
+        RESPAWN_AT=$((SECONDS + DELAY))
+    elif [ -z "$FEEDER_PID" ] && [ "$SECONDS" -ge "$RESPAWN_AT" ]; then
+        start_feeder
+    elif [ "$CRASHES" -gt 0 ] && [ $((SECONDS - FEEDER_STARTED)) -ge {FEEDER_STABLE_SECONDS} ]; then
+        log "feeder $FEEDER_PID работает {FEEDER_STABLE_SECONDS} с, счетчик падений сброшен"
+        CRASHES=0
+    fi
+    sleep {SUPERVISOR_POLL}
+done
+"""
+
+
+def feeder_supervisor_running():
+    stdout, success = run_command(f"pgrep -f '{_SUPERVISOR_PATTERN}'",
+                                  check=False, capture_output=True)
+    return success and bool(stdout.strip())
+
+
+def install_feeder_supervisor(enable=True):
+    """Поставить (enable=True) или убрать супервизор из config.xml и перезапустить демоны проекта.
+
+    Отдельно запущенные через nohup копии feeder останавливаются, иначе они
+    работали бы параллельно с feeder супервизора.
+    """
+    run_cmd = lambda cmd, check=True: run_command(f"cd {project_home()} && {cmd}", check=check)
+
+    if enable:
+        _, success = run_cmd(f"""cat > bin/{SUPERVISOR_NAME} << 'EOF'
+{SUPERVISOR_SCRIPT}EOF
+chmod +x bin/{SUPERVISOR_NAME} && chown boincadm:boincadm bin/{SUPERVISOR_NAME}""", check=False)
+        if not success:
+            print("✗ Ошибка: не удалось записать bin/feeder_supervisor", file=sys.stderr)
+            return False
+        run_cmd(f"sed -i 's|<cmd>feeder -d 3[^<]*</cmd>|<cmd>{SUPERVISOR_NAME}</cmd>|g' config.xml", check=False)
+    else:
+        run_cmd(f"sed -i 's|<cmd>{SUPERVISOR_NAME}</cmd>|<cmd>feeder {FEEDER_ARGS}</cmd>|g' config.xml", check=False)
+
+    run_cmd("bin/stop && sleep 2", check=False)
+    run_cmd("pkill -HUP -f '[f]eeder -d'; sleep 1", check=False)
+    run_cmd(f"rm -f {RELOAD_TRIGGER} {RELOAD_DONE} && bin/start", check=False)
+
+    if enable and not feeder_supervisor_running():
+        print("⚠ Супервизор feeder не запустился после bin/start", file=sys.stderr)
+        return False
+    return True
+
+
+def reload_feeder(timeout=RELOAD_TIMEOUT, feeder_args=None):
+    """Перезапустить feeder через супервизор одной командой в контейнере.
+
+    feeder_args - аргументы нового feeder (сохраняются для следующих перезапусков).
+
+    Возвращает ({"pid", "stop_seconds", "down_seconds", "wall_seconds", "crashes"}, успех);
+    down_seconds - от SIGHUP старому feeder до запуска нового, crashes - падений
+    feeder подряд до перезапуска. Начиная с CRASH_LOOP_THRESHOLD падений перезапуск
+    считается неудачным: feeder, скорее всего, падает при старте.
+    """
+    polls = max(int(timeout / SUPERVISOR_POLL), 1)
+    write_args = f"echo '{feeder_args}' > {FEEDER_ARGS_FILE} && " if feeder_args else ""
+    cmd = (
+        f"cd {project_home()} && "
+        f"(pgrep -f '{_SUPERVISOR_PATTERN}' > /dev/null || exit 2) && "
+        f"{write_args}"
+        f"T0=$(date +%s.%N) && rm -f {RELOAD_DONE} && touch {RELOAD_TRIGGER} && "
+        f"for i in $(seq 1 {polls}); do "
+        f"if [ -s {RELOAD_DONE} ]; then echo \"$T0 $(cat {RELOAD_DONE})\"; exit 0; fi; "
+        f"sleep {SUPERVISOR_POLL}; done; exit 1"
+    )
+    stdout, success = run_command(cmd, check=False, capture_output=True)
+    if not success:
+        print("⚠ Супервизор feeder не подтвердил перезапуск", file=sys.stderr)
+        return {}, False
+
+    try:
+        requested, pid, stop, stopped, started, crashes = stdout.split()[-6:]
+        requested, stop, stopped, started = (float(v) for v in (requested, stop, stopped, started))
+        pid, crashes = int(pid), int(crashes)
+    except ValueError:
+        print(f"⚠ Непонятный ответ супервизора feeder: {stdout!r}", file=sys.stderr)
+        return {}, False
+
+    timings = {
+        "pid": pid,
+        "stop_seconds": stopped - stop,
+        "down_seconds": started - stop,
+        "wall_seconds": started - requested,
+        "crashes": crashes,
+    }
+    if crashes >= CRASH_LOOP_THRESHOLD:
+        print(f"⚠ Feeder падает после запуска ({crashes} раз подряд), "
+              f"см. logs/feeder.log и logs/{SUPERVISOR_NAME}.log", file=sys.stderr)
+        return timings, False
+    return timings, True
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Модель пропускной способности хостов для прогноза потока кредита по приложениям.
+
+Из завершенных результатов за окно (те же величины, что в
+get_completed_client_statistics: завершения по приложениям на хосте, elapsed_time,
+простой и время последнего RPC) по каждому хосту оцениваются:
+
+- занятость - сколько заданий хост выполняет одновременно (сумма elapsed за окно / окно);
+- скорость хоста и время задания каждого приложения на нем (для приложений,
+  которые хост не выполнял, - базовое время приложения, деленное на скорость);
+- сродство к приложениям - доля приложения в заданиях хоста относительно общей
+  (хосты без версии приложения или с app_config получают другой набор заданий).
+
+Для вектора весов feeder раздает задания в долях весов, хост h получает задания
+приложения a в доле p_ha ~ w_a * сродство_ha и выполняет их со скоростью
+занятость_h / sum_b p_hb * время_hb. Поток кредита приложения:
+
+    flow_a = sum_h занятость_h * p_ha * кредит_a / sum_b p_hb * время_hb
+
+Если быстрые хосты берут в основном одно приложение, его доля кредита выше доли
+весов; модель это учитывает, а суммарный кредит показывает лишь после запаздывания.
+
+Состояние обновляется инкрементально: после первой загрузки окна читаются только
+результаты с mod_time после водяного знака (индекс bal_res_mod_time), хосты и
+задания в работе - одной строкой на хост.
+"""
+import math
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+from .app_config import BALANCED_APPS_SQL
+from .db import query_multi
+
+DEFAULT_HOST_WINDOW = 6 * 3600
+# Хост без RPC дольше этого считается выключенным и в прогноз не входит, с
+DEFAULT_STALE_SECONDS = 1800
+# Запас по mod_time, как в IncrementalCreditAggregator
+MOD_TIME_OVERLAP = 30
+# Вес общего распределения заданий при оценке сродства хоста (в заданиях)
+AFFINITY_PRIOR = 5.0
+SPEED_FIT_ITERATIONS = 20
+SOLVER_ITERATIONS = 100
+SOLVER_TOLERANCE = 1e-6
+
+_APPS_SQL = f"""
+SELECT id, name FROM app
+WHERE name IN ({BALANCED_APPS_SQL})
+    AND deprecated = 0
+ORDER BY name
+"""
+_HOSTS_SQL = "SELECT id, rpc_time, create_time FROM host WHERE id > 0"
+_IN_PROGRESS_SQL = "SELECT hostid, COUNT(*) FROM result WHERE server_state = 4 AND hostid > 0 GROUP BY hostid"
+_COMPLETIONS_COLUMNS = "id, hostid, appid, received_time, elapsed_time, granted_credit"
+
+HostEstimate = namedtuple("HostEstimate", [
+    "host_id",
+    "active",              # RPC не старше stale_seconds
+    "in_progress",         # заданий в работе сейчас
+    "idle_seconds",        # с последнего завершения
+    "since_rpc_seconds",   # с последнего RPC
+    "concurrency",         # заданий одновременно (сумма elapsed за окно / окно)
+    "speed",               # скорость относительно среднего хоста (1.0 - средний, 2.0 - вдвое быстрее)
+    "completed",           # {app: завершено за окно}
+])
+
+HostArrays = namedtuple("HostArrays", [
+    "apps",         # приложения с завершениями за окно (порядок столбцов)
+    "host_ids",
+    "capacity",     # (H,) занятость активных хостов, 0 для неактивных
+    "elapsed",      # (H, A) время задания приложения на хосте, с
+    "affinity",     # (H, A) сродство хоста к приложению (1.0 - как в среднем)
+    "credit",       # (A,) кредит за задание
+])
+
+
+def _dispatch_shares(weights, affinity):
+    """(H, A) доли заданий приложений на хостах для весов."""
+    raw = affinity * np.maximum(weights, 0.0)
+    totals = raw.sum(axis=1, keepdims=True)
+    return np.divide(raw, totals, out=np.zeros_like(raw), where=totals > 0)
+
+
+def predict_flow_array(arrays, weights):
+    """Поток кредита (кредит/с) по arrays.apps для весов (массив в том же порядке)."""
+    shares = _dispatch_shares(np.asarray(weights, dtype=float), arrays.affinity)
+    seconds_per_job = (shares * arrays.elapsed).sum(axis=1)
+    jobs_per_second = np.divide(arrays.capacity, seconds_per_job, out=np.zeros_like(seconds_per_job),
+                                where=seconds_per_job > 0)
+    return (jobs_per_second[:, None] * shares).sum(axis=0) * arrays.credit
+
+
+def flow_shares_array(arrays, weights):
+    flow = predict_flow_array(arrays, weights)
+    total = flow.sum()
+    return flow / total if total > 0 else np.full(flow.size, 1.0 / flow.size)
+
+
+def weights_for_flow_shares(arrays, target_shares, initial, fixed=None, lower=None, upper=None):
+    """Веса (массив по arrays.apps), при которых доли потока кредита равны target_shares.
+
+    Итерации w_a *= цель_a / прогноз_a для незакрепленных приложений с ограничением
+    [lower, upper]. fixed - маска приложений, чьи веса не меняются.
+    Возвращает (веса, максимальное отклонение долей).
+    """
+    weights = np.asarray(initial, dtype=float).copy()
+    target = np.asarray(target_shares, dtype=float)
+    free = ~fixed if fixed is not None else np.ones(weights.size, dtype=bool)
+    lower = np.zeros(weights.size) if lower is None else lower
+    upper = np.full(weights.size, np.inf) if upper is None else upper
+    deviation = np.inf
+    for _ in range(SOLVER_ITERATIONS):
+        shares = flow_shares_array(arrays, weights)
+        deviation = float(np.abs(shares - target)[free].max()) if free.any() else 0.0
+        if deviation < SOLVER_TOLERANCE:
+            break
+        ratio = np.divide(target, shares, out=np.ones_like(shares), where=shares > 0)
+        weights = np.where(free, np.clip(weights * ratio, lower, upper), weights)
+    return weights, deviation
+
+
+class HostThroughputModel:
+    """refresh() -> обновить наблюдения; arrays(apps) / predict_flow(weights) -> прогноз."""
+
+    def __init__(self, window=DEFAULT_HOST_WINDOW, stale_seconds=DEFAULT_STALE_SECONDS, clock=time.time):
+        self.window = window
+        self.stale_seconds = stale_seconds
+        self._clock = clock
+        self.app_names = {}
+        # host_id -> deque[[received_time, app, elapsed, credit]] в порядке received_time
+        self._events = {}
+        # result_id -> событие (кредит может быть начислен после завершения)
+        self._seen = {}
+        self.hosts = {}
+        self.in_progress = {}
+        self.watermark = None
+        self.server_offset = 0.0
+        self.last_refresh = None
+
+    def statements(self):
+        if self.watermark is None:
+            completions = (f"SELECT {_COMPLETIONS_COLUMNS} FROM result "
+                           "WHERE server_state = 5 AND outcome = 1 AND hostid > 0 AND elapsed_time > 0 "
+                           f"AND received_time >= UNIX_TIMESTAMP(NOW()) - {int(self.window)}")
+        else:
+            since = int(self.watermark - MOD_TIME_OVERLAP)
+            completions = (f"SELECT {_COMPLETIONS_COLUMNS} FROM result "
+                           f"WHERE mod_time >= FROM_UNIXTIME({since}) "
+                           "AND server_state = 5 AND outcome = 1 AND hostid > 0 AND elapsed_time > 0")
+        return ["SELECT UNIX_TIMESTAMP(NOW())", _APPS_SQL, _HOSTS_SQL, _IN_PROGRESS_SQL, completions]
+
+    def refresh(self):
+        """Прочитать изменения одним обращением к БД. Возвращает ({"completions", "hosts"}, success)."""
+        results, success = query_multi(self.statements())
+        if not success or len(results) != 5:
+            return {}, False
+        return self.apply(results), True
+
+    def apply(self, results):
+        now_rs, apps_rs, hosts_rs, in_progress_rs, completions_rs = results
+        server_now = float(now_rs.rows[0][0])
+        self.server_offset = server_now - self._clock()
+        self.app_names = {app_id: name for app_id, name in apps_rs}
+        self.hosts = {host_id: (rpc_time or 0, create_time or 0) for host_id, rpc_time, create_time in hosts_rs}
+        self.in_progress = {host_id: count for host_id, count in in_progress_rs}
+        added = 0
+        for result_id, host_id, app_id, received_time, elapsed, credit in sorted(completions_rs, key=lambda r: r[3]):
+            app = self.app_names.get(app_id)
+            if app is None:
+                continue
+            event = self._seen.get(result_id)
+            if event is not None:
+                # Валидация начислила кредит уже учтенному завершению
+                event[3] = float(credit or 0.0)
+                continue
+            event = [received_time, app, float(elapsed), float(credit or 0.0)]
+            self._seen[result_id] = event
+            self._events.setdefault(host_id, deque()).append(event)
+            added += 1
+        self.watermark = int(server_now)
+        self._expire(server_now)
+        self.last_refresh = server_now
+        return {"completions": added, "hosts": len(self.hosts)}
+
+    def _expire(self, now):
+        since = now - self.window
+        for host_id in list(self._events):
+            events = self._events[host_id]
+            while events and events[0][0] < since:
+                events.popleft()
+            if not events:
+                del self._events[host_id]
+        self._seen = {result_id: event for result_id, event in self._seen.items() if event[0] >= since}
+
+    def _now(self, now):
+        return self._clock() + self.server_offset if now is None else now
+
+    def _app_means(self):
+        """{app: (среднее elapsed, кредит за задание или None, заданий)} по всем хостам окна."""
+        sums = {}
+        for events in self._events.values():
+            for _, app, elapsed, credit in events:
+                n, e, c, nc = sums.get(app, (0, 0.0, 0.0, 0))
+                sums[app] = (n + 1, e + elapsed, c + credit, nc + (1 if credit > 0 else 0))
+        return {app: (e / n, c / nc if nc else None, n) for app, (n, e, c, nc) in sums.items()}
+
+    def _profiles(self):
+        """{host_id: ({app: (заданий, среднее elapsed)}, сумма elapsed)} по хостам окна."""
+        profiles = {}
+        for host_id, events in self._events.items():
+            per_app = {}
+            busy = 0.0
+            for _, app, elapsed, _ in events:
+                n, e = per_app.get(app, (0, 0.0))
+                per_app[app] = (n + 1, e + elapsed)
+                busy += elapsed
+            profiles[host_id] = ({app: (n, e / n) for app, (n, e) in per_app.items()}, busy)
+        return profiles
+
+    @staticmethod
+    def _fit_speeds(profiles, iterations=SPEED_FIT_ITERATIONS):
+        """Скорости хостов и базовое время приложений: elapsed_ha ~ база_a / скорость_h.
+
+        Взвешенный по числу заданий подбор в логарифмах (попеременно по базе и
+        скоростям), поэтому разный набор приложений на хостах не искажает скорость.
+        Средняя (геометрическая, по заданиям) скорость равна 1.
+        """
+        log_speed = {host_id: 0.0 for host_id in profiles}
+        log_base = {}
+        for _ in range(iterations):
+            sums = {}
+            for host_id, (per_app, _) in profiles.items():
+                for app, (n, mean) in per_app.items():
+                    total, count = sums.get(app, (0.0, 0))
+                    sums[app] = (total + n * (math.log(mean) + log_speed[host_id]), count + n)
+            log_base = {app: total / count for app, (total, count) in sums.items()}
+            total_jobs = 0
+            shift = 0.0
+            for host_id, (per_app, _) in profiles.items():
+                count = sum(n for n, _ in per_app.values())
+                log_speed[host_id] = sum(n * (log_base[app] - math.log(mean))
+                                         for app, (n, mean) in per_app.items()) / count
+                shift += count * log_speed[host_id]
+                total_jobs += count
+            shift = shift / total_jobs if total_jobs else 0.0
+            log_speed = {host_id: value - shift for host_id, value in log_speed.items()}
+        return ({host_id: math.exp(value) for host_id, value in log_speed.items()},
+                {app: math.exp(value) for app, value in log_base.items()})
+
+    def host_estimates(self, now=None):
+        """Оценки по хостам с завершениями за окно (список HostEstimate)."""
+        now = self._now(now)
+        profiles = self._profiles()
+        speeds, _ = self._fit_speeds(profiles)
+        estimates = []
+        for host_id, events in sorted(self._events.items()):
+            per_app, busy = profiles[host_id]
+            rpc_time, create_time = self.hosts.get(host_id, (0, 0))
+            span = min(self.window, now - create_time) if create_time else self.window
+            span = max(span, max(elapsed for _, _, elapsed, _ in events))
+            since_rpc = now - rpc_time if rpc_time else None
+            estimates.append(HostEstimate(
+                host_id=host_id,
+                active=since_rpc is not None and since_rpc <= self.stale_seconds,
+                in_progress=self.in_progress.get(host_id, 0),
+                idle_seconds=now - events[-1][0],
+                since_rpc_seconds=since_rpc,
+                concurrency=busy / span if span > 0 else 0.0,
+                speed=speeds[host_id],
+                completed={app: n for app, (n, _) in per_app.items()},
+            ))
+        return estimates
+
+    def arrays(self, apps, avg_credit=None, now=None):
+        """HostArrays по приложениям из apps, для которых есть завершения; None, если их меньше двух.
+
+        avg_credit - {app: кредит за задание} для приложений, у которых в окне еще нет начисленного кредита.
+        """
+        app_means = self._app_means()
+        profiles = self._profiles()
+        speeds, base = self._fit_speeds(profiles)
+        credit = {}
+        for app in apps:
+            if app not in app_means:
+                continue
+            value = app_means[app][1] or (avg_credit or {}).get(app)
+            if value:
+                credit[app] = value
+        known = [app for app in apps if app in credit]
+        estimates = [e for e in self.host_estimates(now) if e.active]
+        if len(known) < 2 or not estimates:
+            return None
+
+        total_jobs = sum(app_means[app][2] for app in known)
+        global_share = np.array([app_means[app][2] / total_jobs for app in known])
+        elapsed = np.empty((len(estimates), len(known)))
+        affinity = np.empty((len(estimates), len(known)))
+        for i, estimate in enumerate(estimates):
+            per_app, _ = profiles[estimate.host_id]
+            counts = np.array([per_app.get(app, (0, 0.0))[0] for app in known], dtype=float)
+            elapsed[i] = [per_app[app][1] if app in per_app else base[app] / speeds[estimate.host_id] for app in known]
+            host_share = (counts + AFFINITY_PRIOR * global_share) / (counts.sum() + AFFINITY_PRIOR)
+            affinity[i] = host_share / global_share
+        return HostArrays(
+            apps=known,
+            host_ids=[estimate.host_id for estimate in estimates],
+            capacity=np.array([estimate.concurrency for estimate in estimates]),
+            elapsed=elapsed,
+            affinity=affinity,
+            credit=np.array([credit[app] for app in known]),
+        )
+
+    def predict_flow(self, weights, avg_credit=None, now=None):
+        """{app: кредит/с} для весов {app: вес}; пусто, если данных по хостам недостаточно."""
+        arrays = self.arrays(list(weights), avg_credit=avg_credit, now=now)
+        if arrays is None:
+            return {}
+        flow = predict_flow_array(arrays, [weights[app] for app in arrays.apps])
+        return dict(zip(arrays.apps, flow.tolist()))
+
+
+def correct_weights(arrays, current, proposed, fixed=None, lower=None, upper=None):
+    """Поправка весов контроллера на неоднородность хостов.
+
+    Контроллер меняет веса, считая, что доля кредита меняется как доля весов.
+    Здесь то же относительное изменение задается долям прогнозного потока, и
+    подбираются веса, которые его дают. current/proposed - массивы по arrays.apps.
+    Возвращает (веса, {"current_shares", "proposed_shares", "desired_shares",
+    "corrected_shares", "deviation"}).
+    """
+    current = np.asarray(current, dtype=float)
+    proposed = np.asarray(proposed, dtype=float)
+    current_shares = flow_shares_array(arrays, current)
+    naive_ratio = (proposed / proposed.sum()) / (current / current.sum())
+    desired = current_shares * naive_ratio
+    desired = desired / desired.sum()
+    corrected, deviation = weights_for_flow_shares(arrays, desired, proposed, fixed=fixed, lower=lower, upper=upper)
+    return corrected, {
+        "current_shares": dict(zip(arrays.apps, current_shares.tolist())),
+        "proposed_shares": dict(zip(arrays.apps, flow_shares_array(arrays, proposed).tolist())),
+        "desired_shares": dict(zip(arrays.apps, desired.tolist())),
+        "corrected_shares": dict(zip(arrays.apps, flow_shares_array(arrays, corrected).tolist())),
+        "deviation": deviation,
+    }
+
+
+def describe_hosts(estimates):
+    """Строка лога по хостам: активные, простаивающие, средняя занятость и разброс скорости."""
+    active = [e for e in estimates if e.active]
+    if not active:
+        return "Хосты: нет активных с завершениями за окно"
+    idle = sum(1 for e in active if e.in_progress == 0)
+    speeds = [e.speed for e in active]
+    concurrency = sum(e.concurrency for e in active)
+    return (f"Хосты: активных {len(active)} из {len(estimates)}, без заданий {idle}, "
+            f"занятость {concurrency:.1f} заданий, скорость {min(speeds):.2f}-{max(speeds):.2f}")
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Дополнительные индексы BOINC БД под запросы сенсоров балансировщика.
+
+Стоковые индексы result (workunitid, (server_state, priority), (appid, server_state),
+(hostid, ...)) не покрывают агрегаты по outcome/granted_credit/elapsed_time,
+поэтому запросы статистики ходят в кластерный индекс за каждой строкой.
+Индексы создаются только если их колонки еще не являются префиксом существующего индекса.
+"""
+import sys
+from collections import namedtuple
+from contextlib import contextmanager
+
+import pymysql
+
+from .db import get_pool, ResultSet
+
+IndexSpec = namedtuple("IndexSpec", ["table", "name", "columns", "purpose"])
+
+INDEXES = [
+    IndexSpec(
+        "result", "bal_res_wu_credit",
+        ("workunitid", "server_state", "outcome", "granted_credit"),
+        "CREDIT_STATISTICS_SQL: JOIN по workunitid с агрегатами по состоянию и кредиту",
+    ),
+    IndexSpec(
+        "result", "bal_res_app_credit",
+        ("appid", "server_state", "outcome", "granted_credit"),
+        "check_* и пересчет app_credit_summary по result.appid",
+    ),
+    IndexSpec(
+        "result", "bal_res_host_done",
+        ("hostid", "server_state", "outcome", "elapsed_time", "granted_credit", "received_time"),
+        "COMPLETED_CLIENT_STATISTICS_SQL: завершенные результаты по хостам",
+    ),
+    IndexSpec(
+        "result", "bal_res_mod_time",
+        ("mod_time",),
+        "дельта IncrementalCreditAggregator по mod_time",
+    ),
+    IndexSpec(
+        "workunit", "bal_wu_app",
+        ("appid",),
+        "JOIN app -> workunit в запросах статистики",
+    ),
+]
+
+
+@contextmanager
+def _cursor(conn=None):
+    if conn is not None:
+        with conn.cursor() as cursor:
+            yield cursor
+        return
+    with get_pool().connection() as pooled:
+        with pooled.cursor() as cursor:
+            yield cursor
+
+
+def existing_indexes(table, conn=None):
+    """Индексы таблицы в текущей БД: {имя: (колонки по порядку)}."""
+    with _cursor(conn) as cursor:
+        cursor.execute(
+            "SELECT INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s "
+            "ORDER BY INDEX_NAME, SEQ_IN_INDEX",
+            (table,)
+        )
+        indexes = {}
+        for index_name, column_name in cursor.fetchall():
+            indexes.setdefault(index_name, []).append(column_name)
+    return {name: tuple(columns) for name, columns in indexes.items()}
+
+
+def _covered_by(spec, indexes):
+    for name, columns in indexes.items():
+        if name != spec.name and columns[:len(spec.columns)] == spec.columns:
+            return name
+    return None
+
+
+def ensure_indexes(specs=INDEXES, conn=None, verbose=True):
+    """Создать недостающие индексы. Возвращает (список созданных имен, success)."""
+    created = []
+    try:
+        for spec in specs:
+            indexes = existing_indexes(spec.table, conn)
+            if spec.name in indexes:
+                continue
+            covering = _covered_by(spec, indexes)
+            if covering:
+                if verbose:
+                    print(f"  {spec.table}.{spec.name}: уже покрыт индексом {covering}")
+                continue
+            with _cursor(conn) as cursor:
+                cursor.execute(
+                    f"ALTER TABLE {spec.table} ADD INDEX {spec.name} ({', '.join(spec.columns)}), "
+                    f"ALGORITHM=INPLACE, LOCK=NONE"
+                )
+            created.append(spec.name)
+            if verbose:
+                print(f"  ✓ {spec.table}.{spec.name} ({', '.join(spec.columns)})")
+    except pymysql.MySQLError as e:
+        print(f"✗ Ошибка создания индексов: {e}", file=sys.stderr)
+        return created, False
+    return created, True
+
+
+def drop_indexes(specs=INDEXES, conn=None):
+    """Удалить индексы балансировщика (для сравнения до/после). Возвращает (список удаленных, success)."""
+    dropped = []
+    try:
+        for spec in specs:
+            if spec.name not in existing_indexes(spec.table, conn):
+                continue
+            with _cursor(conn) as cursor:
+                cursor.execute(f"ALTER TABLE {spec.table} DROP INDEX {spec.name}")
+            dropped.append(spec.name)
+    except pymysql.MySQLError as e:
+        print(f"✗ Ошибка удаления индексов: {e}", file=sys.stderr)
+        return dropped, False
+    return dropped, True
+
+
+def explain(sql, conn=None):
+    """План запроса (EXPLAIN) в виде ResultSet."""
+    with _cursor(conn) as cursor:
+        cursor.execute("EXPLAIN " + sql.strip().rstrip(";"))
+        columns = [d[0] for d in cursor.description]
+        return ResultSet(columns, cursor.fetchall())
+
+
+def index_sizes(tables=("result", "workunit"), conn=None):
+    """Размер данных и индексов по таблицам в байтах: {table: (data_length, index_length)}."""
+    with _cursor(conn) as cursor:
+        cursor.execute(
+            "SELECT TABLE_NAME, DATA_LENGTH, INDEX_LENGTH FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({})".format(", ".join(["%s"] * len(tables))),
+            tuple(tables)
+        )
+        return {name: (int(data or 0), int(index or 0)) for name, data, index in cursor.fetchall()}
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Монотонные часы цикла балансировщика.
+
+Контроллер получает фактическое время между началами итераций, а не номинальный
+interval: запросы статистики, обновление весов и перезапуск feeder удлиняют период.
+Пробуждения идут по фиксированной сетке от старта цикла, поэтому время итерации
+не накапливается в дрейф; пропущенные из-за долгой итерации точки сетки считаются.
+Фазы итерации (sense / compute / actuate / verify) замеряются отдельно.
+"""
+import time
+from contextlib import contextmanager
+
+PHASE_SENSE = "sense"
+PHASE_COMPUTE = "compute"
+PHASE_ACTUATE = "actuate"
+PHASE_VERIFY = "verify"
+PHASES = (PHASE_SENSE, PHASE_COMPUTE, PHASE_ACTUATE, PHASE_VERIFY)
+
+
+class IterationTimer:
+    """begin() в начале итерации -> измеренный dt; phase(name) - замер фазы; next_delay() - пауза до сетки."""
+
+    def __init__(self, interval, clock=time.monotonic):
+        self.interval = interval
+        self._clock = clock
+        self._next_wakeup = clock()
+        self._last_begin = None
+        self.iteration_started = None
+        self.phases = {}
+        self.overruns = 0
+
+    def reset(self):
+        """Начать сетку и замер dt заново (после паузы цикла)."""
+        self._next_wakeup = self._clock()
+        self._last_begin = None
+
+    def set_interval(self, interval):
+        """Сменить интервал: сетка отсчитывается заново от начала текущей итерации."""
+        self.interval = interval
+        self._next_wakeup = self._last_begin if self._last_begin is not None else self._clock()
+
+    def begin(self):
+        """Начать итерацию. Возвращает секунды с начала прошлой итерации (None для первой)."""
+        now = self._clock()
+        dt = now - self._last_begin if self._last_begin is not None else None
+        self._last_begin = now
+        self.iteration_started = now
+        self.phases = {}
+        return dt
+
+    @contextmanager
+    def phase(self, name):
+        started = self._clock()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + self._clock() - started
+
+    def breakdown(self):
+        """{"phases": {фаза: с}, "iteration_seconds", "overruns"} для снимка."""
+        elapsed = self._clock() - self.iteration_started if self.iteration_started is not None else 0.0
+        return {
+            "phases": {name: self.phases.get(name, 0.0) for name in PHASES},
+            "iteration_seconds": elapsed,
+            "overruns": self.overruns,
+        }
+
+    def next_delay(self):
+        """Сдвинуть сетку на следующую точку; возвращает (секунды до нее, пропущено точек)."""
+        self._next_wakeup += self.interval
+        now = self._clock()
+        missed = 0
+        if self._next_wakeup <= now:
+            missed = int((now - self._next_wakeup) // self.interval) + 1
+            self.overruns += missed
+            self._next_wakeup += missed * self.interval
+        return self._next_wakeup - now, missed
+
+
+def describe_breakdown(breakdown):
+    """Строка лога с фазами итерации."""
+    phases = ", ".join(f"{name} {seconds:.2f}" for name, seconds in breakdown["phases"].items())
+    return f"Итерация {breakdown['iteration_seconds']:.2f} с ({phases})"
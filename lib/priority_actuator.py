@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Актуатор приоритетов: управление выдачей через result.priority вместо app.weight.
+
+Feeder без --allapps, но с --priority_order заполняет пустые слоты одной
+выборкой неотправленных результатов ORDER BY priority DESC, поэтому порядок
+выдачи задается приоритетами и меняется на следующей выборке feeder без
+перезапуска. Неотправленным результатам каждого приложения (по id) ставится
+priority = PRIORITY_TOP - rank * PRIORITY_SCALE / weight (не ниже 0), так что
+в общей очереди приложения чередуются пропорционально весам.
+
+Обновление идет кусками по PRIORITY_CHUNK строк по индексу (appid, server_state)
+с рангом в пользовательской переменной, каждый кусок - отдельная короткая транзакция.
+"""
+import sys
+import time
+from contextlib import contextmanager
+
+import pymysql
+
+from .db import get_pool
+from .utils import run_command, project_home
+from .feeder_supervisor import FEEDER_ARGS, FEEDER_PRIORITY_ARGS
+from .boinc_utils import feeder_running_args, restart_feeder
+
+PRIORITY_TOP = 1000000000
+PRIORITY_SCALE = 1000
+PRIORITY_CHUNK = 5000
+
+# Актуаторы балансировщиков
+ACTUATOR_WEIGHT = "weight"
+ACTUATOR_PRIORITY = "priority"
+
+APP_IDS_SQL = "SELECT id, name FROM app WHERE deprecated = 0"
+
+# id последнего результата следующего куска (None - до конца очереди приложения)
+CHUNK_BOUNDARY_SQL = """
+SELECT id FROM result
+WHERE appid = %s AND server_state = 2 AND id > %s
+ORDER BY id
+LIMIT 1 OFFSET %s
+"""
+
+PRIORITY_UPDATE_SQL = f"""
+UPDATE result
+SET priority = GREATEST(0, {PRIORITY_TOP} - FLOOR((@bal_rank := @bal_rank + 1) * %s))
+WHERE appid = %s AND server_state = 2 AND id > %s AND id <= %s
+ORDER BY id
+"""
+
+
+@contextmanager
+def _cursor(conn=None):
+    if conn is not None:
+        with conn.cursor() as cursor:
+            yield cursor
+        return
+    with get_pool().connection() as pooled:
+        with pooled.cursor() as cursor:
+            yield cursor
+
+
+def priority_step(weight):
+    """Снижение приоритета на один ранг; вес <= 0 - все результаты приложения получают 0."""
+    if weight <= 0:
+        return float(PRIORITY_TOP)
+    return PRIORITY_SCALE / float(weight)
+
+
+def set_app_priorities(appid, weight, chunk=PRIORITY_CHUNK, conn=None):
+    """Проставить приоритеты неотправленным результатам одного приложения.
+
+    Пользовательская переменная @bal_rank живет в соединении, поэтому все
+    куски идут через один курсор. Возвращает (число результатов, success).
+    """
+    step = priority_step(weight)
+    rank = 0
+    last_id = 0
+    try:
+        with _cursor(conn) as cursor:
+            while True:
+                cursor.execute(CHUNK_BOUNDARY_SQL, (appid, last_id, chunk - 1))
+                row = cursor.fetchone()
+                upper = row[0] if row else sys.maxsize
+                cursor.execute("SET @bal_rank := %s", (rank,))
+                cursor.execute(PRIORITY_UPDATE_SQL, (step, appid, last_id, upper))
+                cursor.execute("SELECT @bal_rank")
+                rank = int(cursor.fetchone()[0] or 0)
+                if row is None:
+                    return rank, True
+                last_id = upper
+    except pymysql.MySQLError as e:
+        print(f"✗ Ошибка SQL при обновлении приоритетов appid={appid}: {e}", file=sys.stderr)
+        return rank, False
+
+
+def apply_priorities(weights, chunk=PRIORITY_CHUNK, conn=None):
+    """Применить веса {app: weight} через приоритеты неотправленных результатов.
+
+    Возвращает ({"apps": {app: результатов}, "seconds", "rows"}, success).
+    """
+    started = time.perf_counter()
+    try:
+        with _cursor(conn) as cursor:
+            cursor.execute(APP_IDS_SQL)
+            app_ids = {name: app_id for app_id, name in cursor.fetchall()}
+    except pymysql.MySQLError as e:
+        print(f"✗ Ошибка SQL: {e}", file=sys.stderr)
+        return {}, False
+
+    apps = {}
+    success = True
+    for app_name, weight in sorted(weights.items()):
+        app_id = app_ids.get(app_name)
+        if app_id is None:
+            print(f"⚠ Приложение {app_name} не найдено в БД", file=sys.stderr)
+            success = False
+            continue
+        rows, ok = set_app_priorities(app_id, weight, chunk=chunk, conn=conn)
+        apps[app_name] = rows
+        success = success and ok
+
+    return {"apps": apps, "rows": sum(apps.values()), "seconds": time.perf_counter() - started}, success
+
+
+def ensure_feeder_mode(actuator):
+    """Привести аргументы feeder к актуатору: без --allapps для priority, с --allapps для weight.
+
+    Меняет команду feeder в config.xml и перезапускает feeder только если режим
+    запущенного feeder не совпадает. Возвращает True, если feeder в нужном режиме.
+    """
+    feeder_args = FEEDER_PRIORITY_ARGS if actuator == ACTUATOR_PRIORITY else FEEDER_ARGS
+    run_command(f"cd {project_home()} && sed -i 's|<cmd>feeder -d 3[^<]*</cmd>|<cmd>feeder {feeder_args}</cmd>|g' config.xml",
+                check=False)
+
+    running_args = feeder_running_args()
+    if running_args is not None and ("--allapps" in running_args) == (actuator != ACTUATOR_PRIORITY):
+        return True
+    _, success = restart_feeder(feeder_args=feeder_args)
+    if not success:
+        print(f"⚠ Не удалось перезапустить feeder в режиме актуатора {actuator}", file=sys.stderr)
+    return success
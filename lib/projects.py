@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Несколько проектов BOINC в одном процессе балансировщика.
+
+Подключения и настройки контроллера проектов задаются JSON-файлом:
+
+    {
+      "defaults": {"interval": 60, "kp": 1.0},
+      "projects": [
+        {"name": "alpha", "container": "alpha-apache-1",
+         "db": {"port": 3307, "database": "alpha"},
+         "project_dir": "/srv/alpha/project",
+         "controller": {"kp": 0.8, "targets": {"long_task": 0.4}}},
+        {"name": "beta", "container": "beta-apache-1", "db": {"host": "10.0.0.5"}}
+      ]
+    }
+
+- container, project_home: контейнер и каталог проекта в нем (по умолчанию
+  lib.utils.CONTAINER_NAME и PROJECT_HOME).
+- db: переопределения lib.db.DB_CONFIG (host, port, user, password, database).
+- project_dir, shmem_file, shmem_key: прямое чтение shared memory feeder
+  с хоста; без них очередь читается через show_shmem в контейнере проекта.
+- controller: настройки контроллера поверх defaults.
+
+Код внутри lib.utils.use_project(project) выполняет команды, запросы к БД и
+чтение очереди для этого проекта.
+"""
+import re
+import sys
+import json
+from collections import namedtuple
+
+from .utils import CONTAINER_NAME, PROJECT_HOME
+
+DB_KEYS = ("host", "port", "user", "password", "database")
+_NAME_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+ProjectConfig = namedtuple("ProjectConfig", [
+    "name",          # имя: префикс логов, файлов снимков и чекпоинтов
+    "container",     # контейнер apache проекта (docker exec)
+    "project_home",  # каталог проекта в контейнере
+    "project_dir",   # каталог проекта на хосте (прямое чтение shared memory) или None
+    "shmem_file",    # mmap-файл сегмента feeder или None
+    "shmem_key",     # ключ SysV shmem или None
+    "db",            # {параметр: значение} поверх DB_CONFIG
+    "controller",    # настройки контроллера: defaults + controller проекта
+])
+
+
+def _optional_str(entry, key, where):
+    value = entry.get(key)
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f"{where}.{key}: ожидается строка")
+    return value or None
+
+
+def parse_project(entry, defaults, where):
+    if not isinstance(entry, dict):
+        raise ValueError(f"{where}: проект ожидается объектом")
+    name = entry.get("name")
+    if not isinstance(name, str) or not _NAME_RE.match(name):
+        raise ValueError(f"{where}.name: ожидается имя из букв, цифр, '_', '-', '.'")
+    where = f"projects.{name}"
+    db = entry.get("db") or {}
+    if not isinstance(db, dict):
+        raise ValueError(f"{where}.db: ожидается объект")
+    unknown = set(db) - set(DB_KEYS)
+    if unknown:
+        raise ValueError(f"{where}.db: неизвестные параметры {', '.join(sorted(unknown))}")
+    if "port" in db:
+        if isinstance(db["port"], bool) or not isinstance(db["port"], int):
+            raise ValueError(f"{where}.db.port: ожидается целое число")
+    controller = entry.get("controller") or {}
+    if not isinstance(controller, dict):
+        raise ValueError(f"{where}.controller: ожидается объект")
+    return ProjectConfig(
+        name=name,
+        container=_optional_str(entry, "container", where) or CONTAINER_NAME,
+        project_home=_optional_str(entry, "project_home", where) or PROJECT_HOME,
+        project_dir=_optional_str(entry, "project_dir", where),
+        shmem_file=_optional_str(entry, "shmem_file", where),
+        shmem_key=_optional_str(entry, "shmem_key", where),
+        db=dict(db),
+        controller=dict(defaults, **controller),
+    )
+
+
+def parse_projects(data):
+    """Список ProjectConfig из разобранного JSON; ValueError при ошибке в настройках."""
+    if not isinstance(data, dict):
+        raise ValueError("настройки проектов ожидаются JSON-объектом")
+    defaults = data.get("defaults") or {}
+    if not isinstance(defaults, dict):
+        raise ValueError("defaults: ожидается объект")
+    entries = data.get("projects")
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("projects: ожидается непустой список")
+    projects = [parse_project(entry, defaults, f"projects.{k}") for k, entry in enumerate(entries)]
+    names = [project.name for project in projects]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"projects: повторяются имена {', '.join(duplicates)}")
+    return projects
+
+
+def load_projects(path):
+    """Проекты из JSON-файла; None при ошибке (сообщение в stderr)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return parse_projects(json.load(f))
+    except (OSError, ValueError) as e:
+        print(f"✗ Ошибка чтения настроек проектов {path}: {e}", file=sys.stderr)
+        return None
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Фоновый сэмплер занятости очереди feeder.
+
+Несколько раз в секунду снимает количество слотов по приложениям в кольцевой
+буфер на array (без словаря на каждый сэмпл) и отдает усредненные по времени
+доли, min/max и долю времени, когда приложение занимало всю очередь или почти
+не имело слотов. Так решения балансировщика опираются на интервал, а не на
+одно случайное мгновение.
+
+Сэмплер читает только сегмент feeder напрямую (lib.shmem): запуск docker exec
+show_shmem несколько раз в секунду стоил бы дороже самой балансировки. Если
+прямое чтение недоступно, start() не запускает поток; пока сегмент недоступен
+(перезапуск feeder), паузы между попытками растут до MAX_BACKOFF.
+"""
+import sys
+import time
+import threading
+import contextvars
+from array import array
+
+from .shmem import read_feeder_shmem
+
+SAMPLE_INTERVAL = 0.25
+HISTORY_SECONDS = 900
+MAX_APPS = 16
+SATURATION_THRESHOLD = 0.99
+STARVED_COUNT = 1
+# Предельная пауза между попытками чтения недоступного сегмента, с
+MAX_BACKOFF = 30.0
+
+
+class QueueOccupancySampler:
+    """Кольцевой буфер сэмплов занятости: время, всего слотов и строка количеств по приложениям."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL, history_seconds=HISTORY_SECONDS, max_apps=MAX_APPS,
+                 saturation_threshold=SATURATION_THRESHOLD, starved_count=STARVED_COUNT):
+        self.interval = interval
+        self.max_apps = max_apps
+        self.saturation_threshold = saturation_threshold
+        self.starved_count = starved_count
+        self.capacity = int(history_seconds / interval) + 1
+        self._times = array("d", [0.0]) * self.capacity
+        self._totals = array("i", [0]) * self.capacity
+        self._counts = array("i", [0]) * (self.capacity * max_apps)
+        self._zero_row = array("i", [0]) * max_apps
+        self._pos = 0
+        self._size = 0
+        self.app_index = {}
+        self.app_names = []
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(self, timestamp, counts, total_slots):
+        """Записать один сэмпл {app: слотов}. Приложения сверх max_apps не учитываются."""
+        with self._lock:
+            base = self._pos * self.max_apps
+            self._counts[base:base + self.max_apps] = self._zero_row
+            for app_name, count in counts.items():
+                j = self.app_index.get(app_name)
+                if j is None:
+                    if len(self.app_names) >= self.max_apps:
+                        continue
+                    j = len(self.app_names)
+                    self.app_index[app_name] = j
+                    self.app_names.append(app_name)
+                self._counts[base + j] = count
+            self._times[self._pos] = timestamp
+            self._totals[self._pos] = total_slots
+            self._pos = (self._pos + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def sample_once(self):
+        shm = read_feeder_shmem()
+        if shm is None:
+            self.errors += 1
+            return False
+        self.record(shm.timestamp, shm.queue_counts(), shm.total_slots)
+        return True
+
+    def _run(self):
+        delay = self.interval
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                success = self.sample_once()
+            except Exception as e:
+                # Ошибка одного сэмпла не должна молча останавливать поток
+                self.errors += 1
+                success = False
+                print(f"⚠ Ошибка сэмплера очереди: {e!r}", file=sys.stderr)
+            delay = self.interval if success else min(delay * 2, MAX_BACKOFF)
+            self._stop.wait(max(delay - (time.monotonic() - started), 0.0))
+
+    def start(self):
+        """Запустить поток. False, если сегмент feeder не читается напрямую (поток не запущен)."""
+        if self._thread is not None and self._thread.is_alive():
+            return True
+        if read_feeder_shmem() is None:
+            return False
+        self._stop.clear()
+        # Сэмплер читает очередь проекта, в контексте которого запущен (lib.utils.use_project)
+        self._thread = threading.Thread(target=contextvars.copy_context().run, args=(self._run,),
+                                        name="queue-sampler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _window_indices(self, since):
+        oldest = (self._pos - self._size) % self.capacity
+        indices = []
+        for k in range(self._size):
+            i = (oldest + k) % self.capacity
+            if self._times[i] >= since:
+                indices.append(i)
+        return indices
+
+    def aggregate(self, window=None, now=None):
+        """Сводка за последние window секунд (все сэмплы, если window не задан).
+
+        Каждый сэмпл весит время до следующего (последний - до now).
+        Возвращает {"samples", "duration", "mean_total_slots", "apps": {app: {...}}}
+        или {} если сэмплов нет.
+        """
+        with self._lock:
+            if now is None:
+                now = time.time()
+            since = now - window if window else float("-inf")
+            indices = self._window_indices(since)
+            if not indices:
+                return {}
+
+            napps = len(self.app_names)
+            weights = []
+            for k, i in enumerate(indices):
+                next_time = self._times[indices[k + 1]] if k + 1 < len(indices) else now
+                weights.append(max(next_time - self._times[i], 0.0))
+            duration = sum(weights)
+            if duration <= 0:
+                weights = [1.0] * len(indices)
+                duration = float(len(indices))
+
+            share_time = [0.0] * napps
+            count_time = [0.0] * napps
+            saturated_time = [0.0] * napps
+            starved_time = [0.0] * napps
+            full_time = [0.0] * napps
+            min_count = [None] * napps
+            max_count = [0] * napps
+            total_slots_time = 0.0
+
+            for i, w in zip(indices, weights):
+                base = i * self.max_apps
+                row = self._counts[base:base + napps]
+                total_slots = self._totals[i]
+                occupied = sum(row)
+                total_slots_time += total_slots * w
+                for j, count in enumerate(row):
+                    share = count / float(occupied) if occupied > 0 else 0.0
+                    share_time[j] += share * w
+                    count_time[j] += count * w
+                    if occupied > 0 and share >= self.saturation_threshold:
+                        saturated_time[j] += w
+                    if count <= self.starved_count:
+                        starved_time[j] += w
+                    if total_slots > 0 and count >= total_slots - 1:
+                        full_time[j] += w
+                    if min_count[j] is None or count < min_count[j]:
+                        min_count[j] = count
+                    if count > max_count[j]:
+                        max_count[j] = count
+
+            apps = {}
+            for j, app_name in enumerate(self.app_names):
+                apps[app_name] = {
+                    "mean_share": share_time[j] / duration,
+                    "mean_count": count_time[j] / duration,
+                    "min_count": min_count[j] if min_count[j] is not None else 0,
+                    "max_count": max_count[j],
+                    "saturated_fraction": saturated_time[j] / duration,
+                    "starved_fraction": starved_time[j] / duration,
+                    "full_fraction": full_time[j] / duration,
+                }
+            return {
+                "samples": len(indices),
+                "duration": duration,
+                "mean_total_slots": total_slots_time / duration,
+                "apps": apps,
+            }
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Согласованный во времени снимок сенсоров для одной итерации балансировщика.
+
+Веса и агрегаты по кредитам читаются одним обращением к БД внутри
+транзакции WITH CONSISTENT SNAPSHOT, очередь feeder читается параллельно.
+"""
+import time
+import threading
+import contextvars
+from collections import namedtuple
+from types import MappingProxyType
+
+from .db import query_multi
+from .apps import WEIGHTS_SQL, weights_from_rows
+from .statistics import credit_statistics_sql, credit_statistics_from_rows
+from .feeder_queue import get_feeder_queue_snapshot
+
+SensorSnapshot = namedtuple("SensorSnapshot", [
+    "timestamp",        # время снимка БД (UNIX_TIMESTAMP на сервере)
+    "weights",          # {app: weight}
+    "credit_stats",     # {app: {...}} в формате get_credit_statistics
+    "queue_counts",     # {app: число слотов в shared memory}
+    "queue_shares",     # {app: доля от занятых слотов}
+    "total_slots",      # всего слотов в очереди feeder
+    "queue_timestamp",  # время чтения очереди feeder
+    "db_latency",       # секунды на запрос к БД
+    "queue_latency",    # секунды на чтение очереди
+    "credit_rates",     # {окно, сек: {app: кредит/сек}} (пусто без CreditRateSensor)
+])
+
+
+def _freeze(mapping):
+    return MappingProxyType({
+        key: MappingProxyType(dict(value)) if isinstance(value, dict) else value
+        for key, value in mapping.items()
+    })
+
+
+def _read_queue(out):
+    started = time.monotonic()
+    snapshot = get_feeder_queue_snapshot()
+    if snapshot is not None:
+        out["counts"] = dict(snapshot.counts)
+        out["total_slots"] = snapshot.total_slots
+        out["timestamp"] = snapshot.timestamp
+    out["latency"] = time.monotonic() - started
+
+
+def collect_sensor_snapshot(include_queue=True, aggregator=None, rate_sensor=None):
+    """Собрать неизменяемый снимок: веса, кредиты по приложениям и занятость очереди feeder.
+
+    С aggregator (IncrementalCreditAggregator) вместо полного агрегирующего запроса
+    в том же обращении к БД читаются только изменившиеся результаты.
+    rate_sensor (CreditRateSensor, только вместе с aggregator) получает события
+    начисления кредитов и дает скорости по окнам.
+    Возвращает (SensorSnapshot, success).
+    """
+    summaries = []
+    if aggregator is not None and aggregator.needs_bootstrap():
+        summary, success = aggregator.refresh()
+        if not success:
+            return None, False
+        summaries.append(summary)
+
+    queue_data = {"counts": {}, "total_slots": 0, "timestamp": None, "latency": 0.0}
+    queue_thread = None
+    if include_queue:
+        # Поток читает очередь того же проекта (lib.utils.use_project)
+        queue_thread = threading.Thread(target=contextvars.copy_context().run, args=(_read_queue, queue_data),
+                                        daemon=True)
+        queue_thread.start()
+
+    if aggregator is not None:
+        credit_statements = aggregator.delta_statements()
+    else:
+        credit_statements = [credit_statistics_sql()]
+
+    started = time.monotonic()
+    # Если запрос внутри транзакции упадет, query_multi откатит ее до возврата соединения в пул
+    results, success = query_multi(
+        ["START TRANSACTION WITH CONSISTENT SNAPSHOT", "SELECT UNIX_TIMESTAMP(NOW(6))", WEIGHTS_SQL]
+        + credit_statements
+        + ["COMMIT"]
+    )
+    db_latency = time.monotonic() - started
+
+    if queue_thread is not None:
+        queue_thread.join()
+
+    if not success or len(results) != 2 + len(credit_statements):
+        return None, False
+
+    timestamp_rs, weights_rs = results[:2]
+    db_timestamp = float(timestamp_rs.rows[0][0]) if timestamp_rs else time.time()
+
+    if aggregator is not None:
+        summary = aggregator.apply_delta(results[2:])
+        if summary.get("reset"):
+            summary, success = aggregator.refresh()
+            if not success:
+                return None, False
+        summaries.append(summary)
+        credit_stats = aggregator.stats()
+    else:
+        credit_stats = credit_statistics_from_rows(results[2])
+
+    credit_rates = {}
+    if rate_sensor is not None and aggregator is not None:
+        for summary in summaries:
+            rate_sensor.observe(summary, db_timestamp)
+        credit_rates = rate_sensor.all_rates(db_timestamp)
+
+    counts = queue_data["counts"]
+    total_occupied = sum(counts.values())
+    shares = {name: count / float(total_occupied) for name, count in counts.items()} if total_occupied else {}
+
+    snapshot = SensorSnapshot(
+        timestamp=db_timestamp,
+        weights=_freeze(weights_from_rows(weights_rs)),
+        credit_stats=_freeze(credit_stats),
+        queue_counts=_freeze(counts),
+        queue_shares=_freeze(shares),
+        total_slots=queue_data["total_slots"],
+        queue_timestamp=queue_data["timestamp"],
+        db_latency=db_latency,
+        queue_latency=queue_data["latency"],
+        credit_rates=_freeze(credit_rates),
+    )
+    return snapshot, True
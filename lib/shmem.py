@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Прямое чтение shared memory feeder (SCHED_SHMEM) без запуска bin/show_shmem.
+
+Сегмент подключается через mmap-файл проекта (в контейнере или через смонтированный
+том проекта) либо через SysV shmem по ключу из config.xml. Заголовок, таблица
+приложений и слоты WU_RESULT раскладываются в массивы. Смещения полей соответствуют
+sched_shmem.h / boinc_db_types.h для x86_64; при несовпадении раскладки чтение
+отклоняется и вызывающий код возвращается к разбору вывода show_shmem.
+"""
+import os
+import re
+import sys
+import math
+import mmap
+import time
+import ctypes
+import ctypes.util
+import struct
+import threading
+from array import array
+from collections import namedtuple
+
+from .utils import PROJECT_HOME, load_env_file, current_project, project_key
+
+_env = load_env_file()
+
+# Каталог проекта: в контейнере PROJECT_HOME, снаружи - путь к смонтированному тому project
+PROJECT_DIR = os.environ.get("BOINC_PROJECT_DIR", _env.get("BOINC_PROJECT_DIR", PROJECT_HOME))
+SHMEM_FILE = os.environ.get("BOINC_SHMEM_FILE", _env.get("BOINC_SHMEM_FILE", ""))
+SHMEM_KEY = os.environ.get("BOINC_SHMEM_KEY", _env.get("BOINC_SHMEM_KEY", ""))
+MMAP_FILE_NAME = "boinc_mmap_file"
+
+# bool ready; int ss_size, platform_size, app_size, app_version_size, assignment_size,
+# wu_result_size, max_platforms, max_apps, max_app_versions, max_assignments,
+# max_wu_results, nplatforms, napps; double app_weight_sum
+_HEADER = struct.Struct("<?3x13id")
+
+# APP: DB_ID_TYPE id @0, char name[256] @12, double weight @536
+_APP_ID_OFFSET = 0
+_APP_NAME_OFFSET = 12
+_APP_WEIGHT_OFFSET = 536
+_APP_MIN_SIZE = _APP_WEIGHT_OFFSET + 8
+
+# WU_RESULT: int state @0, WORKUNIT.appid @32
+_WU_STATE_OFFSET = 0
+_WU_APPID_OFFSET = 32
+_WU_MIN_SIZE = _WU_APPID_OFFSET + 8
+WR_STATE_EMPTY = 0
+
+# Границы правдоподобия заголовка (защита от чужой/поврежденной раскладки)
+_MAX_ITEMS = 100000
+_MAX_STRUCT_SIZE = 1 << 20
+
+_SHMEM_KEY_RE = re.compile(r"<shmem_key>\s*([^<\s]+)\s*</shmem_key>")
+
+_SHM_RDONLY = 0o10000
+
+
+class ShmemLayoutError(ValueError):
+    """Содержимое сегмента не соответствует ожидаемой раскладке SCHED_SHMEM."""
+
+
+_FeederShmemBase = namedtuple("FeederShmem", [
+    "timestamp",        # time.time() момента чтения
+    "source",           # "mmap" или "sysv"
+    "app_ids",          # array('q')
+    "app_names",        # [str]
+    "app_weights",      # array('d')
+    "app_weight_sum",   # app_weight_sum из заголовка
+    "slot_states",      # array('i'), WR_STATE_EMPTY - пустой слот
+    "slot_appids",      # array('q'), appid задания в слоте
+])
+
+
+class FeederShmem(_FeederShmemBase):
+    """Декодированное состояние shared memory feeder."""
+    __slots__ = ()
+
+    @property
+    def total_slots(self):
+        return len(self.slot_states)
+
+    def queue_counts(self):
+        """{app: число занятых слотов} в формате get_queue_counts_from_shmem."""
+        names = dict(zip(self.app_ids, self.app_names))
+        counts = {}
+        for state, appid in zip(self.slot_states, self.slot_appids):
+            if state == WR_STATE_EMPTY:
+                continue
+            name = names.get(appid)
+            if name is not None:
+                counts[name] = counts.get(name, 0) + 1
+        return counts
+
+    def weights(self):
+        return dict(zip(self.app_names, self.app_weights))
+
+
+def decode_shmem(data, source="mmap"):
+    """Разобрать байты сегмента SCHED_SHMEM в FeederShmem (ShmemLayoutError при несоответствии)."""
+    if len(data) < _HEADER.size:
+        raise ShmemLayoutError("сегмент меньше заголовка")
+    (ready, ss_size, _platform_size, app_size, app_version_size, assignment_size,
+     wu_result_size, _max_platforms, max_apps, max_app_versions, max_assignments,
+     max_wu_results, _nplatforms, napps, app_weight_sum) = _HEADER.unpack_from(data, 0)
+
+    if not ready:
+        raise ShmemLayoutError("feeder еще не заполнил сегмент (ready = 0)")
+    for value in (app_size, app_version_size, assignment_size, wu_result_size):
+        if not 0 < value < _MAX_STRUCT_SIZE:
+            raise ShmemLayoutError(f"неправдоподобный размер структуры: {value}")
+    for value in (max_apps, max_app_versions, max_assignments, max_wu_results):
+        if not 0 <= value < _MAX_ITEMS:
+            raise ShmemLayoutError(f"неправдоподобный размер массива: {value}")
+    if app_size < _APP_MIN_SIZE or wu_result_size < _WU_MIN_SIZE:
+        raise ShmemLayoutError("размеры APP/WU_RESULT меньше ожидаемых смещений")
+    if not 0 <= napps <= max_apps:
+        raise ShmemLayoutError(f"napps={napps} вне [0, {max_apps}]")
+
+    # Массивы лежат подряд в конце SCHED_SHMEM: apps, app_versions, assignments, затем wu_results
+    apps_offset = (ss_size - max_assignments * assignment_size
+                   - max_app_versions * app_version_size - max_apps * app_size)
+    total_size = ss_size + max_wu_results * wu_result_size
+    if apps_offset < _HEADER.size or len(data) < total_size:
+        raise ShmemLayoutError(f"смещения вне сегмента (apps@{apps_offset}, нужно {total_size} байт)")
+
+    app_struct = struct.Struct(f"<q{_APP_NAME_OFFSET - 8}x256s"
+                               f"{_APP_WEIGHT_OFFSET - _APP_NAME_OFFSET - 256}xd{app_size - _APP_MIN_SIZE}x")
+    app_ids = array("q")
+    app_names = []
+    app_weights = array("d")
+    apps_end = apps_offset + napps * app_size
+    for app_id, raw_name, weight in app_struct.iter_unpack(data[apps_offset:apps_end]):
+        name = raw_name.split(b"\0", 1)[0].decode("ascii", "replace")
+        if app_id <= 0 or not name or not math.isfinite(weight) or weight < 0:
+            raise ShmemLayoutError(f"некорректная запись приложения: id={app_id} name={name!r} weight={weight}")
+        app_ids.append(app_id)
+        app_names.append(name)
+        app_weights.append(weight)
+
+    weight_total = sum(app_weights)
+    if abs(weight_total - app_weight_sum) > 1e-3 * max(1.0, weight_total):
+        raise ShmemLayoutError(f"app_weight_sum={app_weight_sum} не совпадает с суммой весов {weight_total}")
+
+    wu_struct = struct.Struct(f"<i{_WU_APPID_OFFSET - 4}xq{wu_result_size - _WU_MIN_SIZE}x")
+    slot_states = array("i")
+    slot_appids = array("q")
+    known_ids = set(app_ids)
+    for state, appid in wu_struct.iter_unpack(data[ss_size:total_size]):
+        if state != WR_STATE_EMPTY and appid not in known_ids:
+            raise ShmemLayoutError(f"слот ссылается на неизвестное приложение {appid}")
+        slot_states.append(state)
+        slot_appids.append(appid)
+
+    return FeederShmem(
+        timestamp=time.time(),
+        source=source,
+        app_ids=app_ids,
+        app_names=app_names,
+        app_weights=app_weights,
+        app_weight_sum=app_weight_sum,
+        slot_states=slot_states,
+        slot_appids=slot_appids,
+    )
+
+
+def _segment_size(header):
+    fields = _HEADER.unpack_from(header, 0)
+    ss_size, wu_result_size, max_wu_results = fields[1], fields[6], fields[11]
+    return ss_size + max_wu_results * wu_result_size
+
+
+def _load_libc():
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+    libc.shmget.restype = ctypes.c_int
+    libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+    libc.shmat.restype = ctypes.c_void_p
+    libc.shmdt.argtypes = [ctypes.c_void_p]
+    libc.shmdt.restype = ctypes.c_int
+    return libc
+
+
+def read_shmem_key(project_dir=PROJECT_DIR, raw=SHMEM_KEY):
+    """Ключ SysV shmem: raw (BOINC_SHMEM_KEY) или <shmem_key> из config.xml проекта (или None)."""
+    if not raw:
+        if not project_dir:
+            return None
+        try:
+            with open(os.path.join(project_dir, "config.xml"), "r", encoding="utf-8") as f:
+                match = _SHMEM_KEY_RE.search(f.read())
+        except OSError:
+            return None
+        if not match:
+            return None
+        raw = match.group(1)
+    try:
+        key = int(raw, 0)
+    except ValueError:
+        return None
+    # key_t - знаковый int
+    return key - (1 << 32) if key >= (1 << 31) else key
+
+
+class ShmemReader:
+    """Подключение к сегменту feeder, переиспользуемое между чтениями.
+
+    Перезапуск feeder создает новый сегмент, поэтому перед каждым чтением
+    проверяется, что подключение указывает на актуальный файл/идентификатор.
+    Читатель общий для потоков: проверка, переподключение и чтение идут под
+    блокировкой, чтобы сегмент не отключили посреди чтения.
+    """
+
+    def __init__(self, path=None, key=None):
+        self.path = path
+        self.key = key
+        self.source = None
+        self._file = None
+        self._mm = None
+        self._inode = None
+        self._libc = None
+        self._shmid = None
+        self._addr = None
+        self._lock = threading.Lock()
+
+    def _attach_mmap(self):
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        self.source = "mmap"
+
+    def _attach_sysv(self):
+        if self._libc is None:
+            self._libc = _load_libc()
+        shmid = self._libc.shmget(self.key, 0, 0)
+        if shmid < 0:
+            raise OSError(ctypes.get_errno(), f"shmget({self.key:#x}): {os.strerror(ctypes.get_errno())}")
+        addr = self._libc.shmat(shmid, None, _SHM_RDONLY)
+        if addr is None or addr == ctypes.c_void_p(-1).value:
+            raise OSError(ctypes.get_errno(), f"shmat: {os.strerror(ctypes.get_errno())}")
+        self._shmid = shmid
+        self._addr = addr
+        self.source = "sysv"
+
+    def _attached(self):
+        return self._mm is not None or self._addr is not None
+
+    def _stale(self):
+        if self._mm is not None:
+            try:
+                return os.stat(self.path).st_ino != self._inode
+            except OSError:
+                return True
+        if self._addr is not None:
+            return self._libc.shmget(self.key, 0, 0) != self._shmid
+        return True
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._file.close()
+            self._mm = None
+            self._file = None
+        if self._addr is not None:
+            self._libc.shmdt(self._addr)
+            self._addr = None
+            self._shmid = None
+        self.source = None
+
+    def _attach(self):
+        if self.path and os.path.exists(self.path):
+            self._attach_mmap()
+        elif self.key is not None:
+            self._attach_sysv()
+        else:
+            raise OSError("сегмент feeder не найден (нет mmap-файла и ключа SysV)")
+
+    def _read_bytes(self):
+        if self._mm is not None:
+            size = _segment_size(self._mm[:_HEADER.size])
+            return self._mm[:min(size, len(self._mm))]
+        size = _segment_size(ctypes.string_at(self._addr, _HEADER.size))
+        return ctypes.string_at(self._addr, size)
+
+    def read(self):
+        """Снять копию сегмента и декодировать ее (OSError / ShmemLayoutError при ошибке)."""
+        with self._lock:
+            if self._attached() and self._stale():
+                self._close()
+            if not self._attached():
+                self._attach()
+            data, source = self._read_bytes(), self.source
+        return decode_shmem(data, source)
+
+
+def default_reader():
+    """Читатель сегмента текущего проекта (lib.utils.use_project).
+
+    Для проекта из файла без project_dir/shmem_file/shmem_key сегмент
+    недоступен напрямую, и очередь читается через show_shmem в его контейнере.
+    """
+    project = current_project()
+    if project is None:
+        path = SHMEM_FILE or os.path.join(PROJECT_DIR, MMAP_FILE_NAME)
+        return ShmemReader(path=path, key=read_shmem_key())
+    project_dir = project.project_dir
+    path = project.shmem_file or (os.path.join(project_dir, MMAP_FILE_NAME) if project_dir else None)
+    return ShmemReader(path=path, key=read_shmem_key(project_dir, project.shmem_key))
+
+
+# Читатель и признак выданного предупреждения на проект
+_readers = {}
+_warned = set()
+
+
+def read_feeder_shmem():
+    """Прочитать shared memory feeder напрямую.
+
+    Возвращает FeederShmem или None, если сегмент недоступен из этого процесса
+    или его раскладка не распознана (тогда стоит использовать show_shmem).
+    """
+    key = project_key()
+    reader = _readers.get(key)
+    if reader is None:
+        reader = _readers.setdefault(key, default_reader())
+    try:
+        return reader.read()
+    except (OSError, ValueError, ShmemLayoutError) as e:
+        # ValueError - чтение закрытого mmap
+        reader.close()
+        if key not in _warned:
+            print(f"⚠ Прямое чтение shared memory недоступно ({e}), используется show_shmem", file=sys.stderr)
+            _warned.add(key)
+        return None
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Модель распределения слотов feeder по весам приложений (--allapps --priority_order).
+
+При старте feeder вызывает weighted_interleave: для каждого слота выбирается
+приложение с минимальным x (при равенстве - с меньшим индексом в shared memory),
+затем x += 1/weight. Слот заполняется только заданиями своего приложения,
+поэтому в установившемся режиме занято min(слотов приложения, unsent) слотов.
+Приложения с весом 0 слотов не получают.
+
+Выборы приложения j происходят при x = 0, 1/w, 1/w + 1/w, ... (сумма накапливается
+последовательно, как в цикле feeder), так что весь цикл - это первые nslots
+элементов объединения этих последовательностей, отсортированного по (x, индекс).
+"""
+import numpy as np
+
+# Шаг подгонки весов в weights_for_slot_counts, если округление сдвинуло границу
+_NUDGE = 1e-9
+_MAX_NUDGES = 50
+
+
+def weighted_interleave(weights, nslots):
+    """Эталонный цикл feeder: [индекс приложения для каждого слота] (-1, если весов нет)."""
+    x = [0.0] * len(weights)
+    slots = []
+    for _ in range(nslots):
+        best = -1
+        for j, weight in enumerate(weights):
+            if weight <= 0:
+                continue
+            if best < 0 or x[j] < x[best]:
+                best = j
+        slots.append(best)
+        if best >= 0:
+            x[best] += 1.0 / weights[best]
+    return slots
+
+
+def interleave_slots(weights, nslots):
+    """То же, что weighted_interleave, на NumPy. Возвращает np.ndarray индексов длины nslots."""
+    w = np.asarray(weights, dtype=np.float64)
+    active = np.flatnonzero(w > 0)
+    if nslots <= 0:
+        return np.empty(0, dtype=np.int64)
+    if active.size == 0:
+        return np.full(nslots, -1, dtype=np.int64)
+
+    steps = np.repeat((1.0 / w[active])[:, None], nslots, axis=1)
+    steps[:, 0] = 0.0
+    # np.cumsum по оси накапливает последовательно - те же округления, что x += 1/w в feeder
+    times = np.cumsum(steps, axis=1).ravel()
+    owners = np.repeat(active, nslots)
+    order = np.lexsort((owners, times))[:nslots]
+    return owners[order]
+
+
+def slot_counts(weights, total_slots):
+    """{app: слотов} для весов {app: weight} в порядке приложений feeder."""
+    names = list(weights)
+    slots = interleave_slots([weights[name] for name in names], total_slots)
+    counts = np.bincount(slots[slots >= 0], minlength=len(names))
+    return {name: int(count) for name, count in zip(names, counts)}
+
+
+def predict_slot_counts(weights, unsent_counts, total_slots):
+    """{app: ожидаемо занятых слотов} = min(слотов по весам, неотправленных заданий).
+
+    unsent_counts - {app: unsent_count} (get_credit_statistics); приложения без
+    записи считаются имеющими задания на все свои слоты.
+    """
+    return {
+        name: min(count, unsent_counts.get(name, count))
+        for name, count in slot_counts(weights, total_slots).items()
+    }
+
+
+def feeder_weights(new_weights, base_weights):
+    """Веса всех приложений в порядке feeder (base_weights из shared memory) с подставленными new_weights."""
+    merged = {name: new_weights.get(name, weight) for name, weight in base_weights.items()}
+    for name, weight in new_weights.items():
+        merged.setdefault(name, weight)
+    return merged
+
+
+def weights_for_slot_counts(target_counts, total_slots=None):
+    """Веса, при которых feeder выделит ровно target_counts {app: слотов} (порядок - порядок feeder).
+
+    Веса пропорциональны числу слотов (средний вес ненулевых = 1), приложения с 0
+    слотов получают вес 0. Если округление 1/w сдвигает границу, веса
+    корректируются на доли 1e-9 и проверяются моделью. Возвращает (weights, точно ли).
+    """
+    if total_slots is None:
+        total_slots = sum(target_counts.values())
+    names = list(target_counts)
+    counts = np.array([target_counts[name] for name in names], dtype=np.float64)
+    if total_slots != counts.sum() or (counts < 0).any() or not (counts > 0).any():
+        return {}, False
+
+    w = counts / counts[counts > 0].mean()
+    for _ in range(_MAX_NUDGES):
+        slots = interleave_slots(w, total_slots)
+        got = np.bincount(slots[slots >= 0], minlength=len(names))
+        diff = got - counts
+        if not diff.any():
+            return {name: float(weight) for name, weight in zip(names, w)}, True
+        w = w * (1.0 - _NUDGE * np.sign(diff))
+    return {name: float(weight) for name, weight in zip(names, w)}, False
+
+
+def predict_feeder_slots(new_weights, unsent_counts, queue):
+    """Сравнить распределение слотов feeder сейчас и после new_weights.
+
+    queue - FeederQueueSnapshot (его веса и порядок приложений - те, с которыми
+    запущен feeder). Возвращает {"current_slots", "new_slots", "predicted_filled",
+    "unchanged"} или None, если очередь не прочитана.
+    """
+    if queue is None or not queue.total_slots or not queue.weights:
+        return None
+    current = dict(queue.weights)
+    new = feeder_weights(new_weights, current)
+    current_slots = slot_counts(current, queue.total_slots)
+    new_slots = slot_counts(new, queue.total_slots)
+    return {
+        "current_slots": current_slots,
+        "new_slots": new_slots,
+        "predicted_filled": predict_slot_counts(new, unsent_counts, queue.total_slots),
+        "unchanged": current_slots == new_slots,
+    }
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Целевые доли кредита для контроллеров весов.
+
+Без настроек все приложения получают равные доли. Настройки задаются JSON-файлом
+(--targets) или через API (--serve):
+
+    {
+      "apps": {"long_task": 0.4},
+      "groups": [
+        {"name": "short", "share": 0.4, "apps": {"fast_task": 1, "medium_task": 3}},
+        {"name": "other", "share": 0.2, "apps": ["random_task"]}
+      ],
+      "schedule": [
+        {"from": "22:00", "to": "06:00", "apps": {"long_task": 0.7}}
+      ]
+    }
+
+- apps: явные доли приложений.
+- groups: доля группы делится между ее приложениями пропорционально
+  относительным весам; список приложений делит долю поровну.
+- schedule: окна местного времени суток со своими apps/groups. Действует
+  первое подходящее окно; вне окон действуют доли верхнего уровня.
+
+Остаток до 1 поровну делят приложения, которым доля не задана. Приложения из
+настроек, которых нет среди текущих, не учитываются, и доли нормируются.
+Словарь {app: доля} без этих ключей понимается как apps.
+
+Доли вычисляются один раз на окно расписания и набор приложений, после чего
+берутся из кэша. Время следующей смены окна известно заранее, поэтому
+шаг контроллера не разбирает настройки заново.
+"""
+import sys
+import json
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .controller_core import target_share_array
+
+SPEC_KEYS = ("apps", "groups", "schedule")
+SHARE_TOLERANCE = 1e-9
+
+
+def _share(value, where):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= 1:
+        raise ValueError(f"{where}: доля должна быть числом от 0 до 1")
+    return float(value)
+
+
+def _minutes(value, where):
+    try:
+        hours, minutes = (int(part) for part in str(value).split(":"))
+    except ValueError:
+        raise ValueError(f"{where}: время ожидается в формате ЧЧ:ММ") from None
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f"{where}: время ожидается в формате ЧЧ:ММ")
+    return hours * 60 + minutes
+
+
+def _parse_layer(spec, where):
+    """(явные доли, [(доля группы, {app: относительный вес})]) одного набора долей."""
+    explicit = {str(app): _share(share, f"{where}.apps.{app}") for app, share in (spec.get("apps") or {}).items()}
+    groups = []
+    seen = set(explicit)
+    for k, group in enumerate(spec.get("groups") or []):
+        if not isinstance(group, dict):
+            raise ValueError(f"{where}.groups.{k}: группа ожидается объектом")
+        name = f"{where}.groups.{group.get('name', k)}"
+        members = group.get("apps") or {}
+        if isinstance(members, list):
+            members = {app: 1.0 for app in members}
+        if not members:
+            raise ValueError(f"{name}: в группе нет приложений")
+        for app, weight in members.items():
+            if isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight < 0:
+                raise ValueError(f"{name}.{app}: относительный вес должен быть >= 0")
+        overlap = seen & set(members)
+        if overlap:
+            raise ValueError(f"{name}: приложения уже имеют долю: {', '.join(sorted(overlap))}")
+        seen |= set(members)
+        groups.append((_share(group.get("share"), name), {str(app): float(w) for app, w in members.items()}))
+    total = sum(explicit.values()) + sum(share for share, _ in groups)
+    if total > 1 + SHARE_TOLERANCE:
+        raise ValueError(f"{where}: сумма долей {total:.3f} больше 1")
+    return explicit, groups
+
+
+def _resolve_layer(layer, apps):
+    """Заданные доли для приложений apps: явные и доли групп, разделенные внутри групп."""
+    explicit, groups = layer
+    present = set(apps)
+    given = {app: share for app, share in explicit.items() if app in present}
+    for group_share, members in groups:
+        weights = {app: w for app, w in members.items() if app in present}
+        total = sum(weights.values())
+        for app, w in weights.items():
+            given[app] = group_share * w / total if total > 0 else group_share / len(weights)
+    return given
+
+
+class TargetModel:
+    """Целевые доли из настроек: share_array(apps) для ядра контроллера, shares(apps) для снимков."""
+
+    def __init__(self, spec=None, clock=time.time):
+        spec = spec or {}
+        if not isinstance(spec, dict):
+            raise ValueError("настройки долей ожидаются JSON-объектом")
+        if spec and not any(key in spec for key in SPEC_KEYS):
+            spec = {"apps": spec}
+        self.spec = spec
+        self.base = _parse_layer(spec, "targets")
+        self.windows = []
+        for k, window in enumerate(spec.get("schedule") or []):
+            where = f"targets.schedule.{k}"
+            start = _minutes(window.get("from"), f"{where}.from")
+            end = _minutes(window.get("to"), f"{where}.to")
+            if start == end:
+                raise ValueError(f"{where}: пустое окно")
+            self.windows.append((start, end, _parse_layer(window, where)))
+        self._clock = clock
+        self._layer = None
+        self._next_check = None
+        self._last_now = None
+        self._cache = {}
+
+    def _window_at(self, minute):
+        for k, (start, end, _) in enumerate(self.windows):
+            inside = start <= minute < end if start < end else (minute >= start or minute < end)
+            if inside:
+                return k
+        return None
+
+    def _refresh(self, now):
+        """Активный набор долей и время следующей границы окна (пересчет только на границе)."""
+        if self._next_check is not None and self._last_now <= now < self._next_check:
+            self._last_now = now
+            return
+        self._last_now = now
+        if not self.windows:
+            self._layer, self._next_check = None, float("inf")
+            return
+        moment = datetime.fromtimestamp(now)
+        minute = moment.hour * 60 + moment.minute
+        self._layer = self._window_at(minute)
+        midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        boundaries = []
+        for start, end, _ in self.windows:
+            for boundary in (start, end):
+                at = midnight + timedelta(minutes=boundary)
+                if at <= moment:
+                    at += timedelta(days=1)
+                boundaries.append(at.timestamp())
+        self._next_check = min(boundaries)
+
+    def _resolved(self, apps, now):
+        apps = tuple(apps)
+        self._refresh(self._clock() if now is None else now)
+        cached = self._cache.get(self._layer)
+        if cached is not None and cached[0] == apps:
+            return cached[1]
+        layer = self.base if self._layer is None else self.windows[self._layer][2]
+        array = target_share_array(_resolve_layer(layer, apps), apps)
+        if array is None:
+            array = np.full(len(apps), 1.0 / len(apps)) if apps else np.zeros(0)
+        self._cache[self._layer] = (apps, array)
+        return array
+
+    def share_array(self, apps, now=None):
+        """Доли в порядке apps (np.ndarray, сумма 1); now - UNIX-время, по умолчанию clock()."""
+        return self._resolved(apps, now)
+
+    def shares(self, apps, now=None):
+        """{app: доля} для снимков и метрик."""
+        apps = list(apps)
+        return dict(zip(apps, self._resolved(apps, now).tolist()))
+
+    def active_window(self, now=None):
+        """Номер действующего окна расписания или None (доли верхнего уровня)."""
+        self._refresh(self._clock() if now is None else now)
+        return self._layer
+
+
+def load_target_model(path):
+    """TargetModel из JSON-файла; None при ошибке (сообщение в stderr)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+        return TargetModel(spec.get("targets", spec) if isinstance(spec, dict) else spec)
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        print(f"✗ Ошибка чтения целевых долей {path}: {e}", file=sys.stderr)
+        return None
@@ -5,35 +5,27 @@ import xml.etree.ElementTree as ET
 import sys
 from pathlib import Path
 from lib.utils import load_env_file, run_local_command, SCRIPT_DIR
+from lib.db import execute
 
 def md5_hash(text):
     return hashlib.md5(text.encode('utf-8')).hexdigest()
 
 
 def _set_max_jobs_for_user(email):
-    email_escaped = email.replace("'", "''")
-    sql = f"""
+    sql = """
     UPDATE user
     SET project_prefs = CASE
         WHEN project_prefs IS NULL OR project_prefs = '' THEN
             '<max_jobs_in_progress>1</max_jobs_in_progress>'
-        WHEN project_prefs NOT LIKE '%<max_jobs_in_progress>%' THEN
+        WHEN project_prefs NOT LIKE '%%<max_jobs_in_progress>%%' THEN
             CONCAT(project_prefs, '<max_jobs_in_progress>1</max_jobs_in_progress>')
         ELSE
             REGEXP_REPLACE(project_prefs, '<max_jobs_in_progress>[0-9]+</max_jobs_in_progress>', '<max_jobs_in_progress>1</max_jobs_in_progress>')
     END
-    WHERE email_addr = '{email_escaped}';
+    WHERE email_addr = %s;
     """
     
-    try:
-        result = run_local_command(
-            ["docker", "exec", "-i", "server-apache-1",
-                "bash", "-c", "cd /home/boincadm/project && mysql -u root -ppassword boincserver"],
-            input=sql,
-            check=False
-        )
-    except Exception:
-        pass
+    execute(sql, (email,))
 
 
 def create_user(email, password, user_name, project_url):
@@ -3,6 +3,8 @@ import subprocess
 import sys
 import os
 import shutil
+import contextvars
+from contextlib import contextmanager
 from pathlib import Path
 
 PROJECT_HOME = "/home/boincadm/project"
@@ -10,6 +12,43 @@ CONTAINER_NAME = "server-apache-1"
 SCRIPT_DIR = Path(__file__).parent.parent.absolute()
 SERVER_DIR = SCRIPT_DIR
 
+# Проект текущего потока/задачи asyncio (lib.projects.ProjectConfig); None - проект из констант выше
+_current_project = contextvars.ContextVar("boinc_project", default=None)
+
+
+def current_project():
+    return _current_project.get()
+
+
+def project_key():
+    """Имя текущего проекта для кэшей на уровне модулей (None - проект по умолчанию)."""
+    project = _current_project.get()
+    return project.name if project is not None else None
+
+
+def container_name():
+    project = _current_project.get()
+    return project.container if project is not None else CONTAINER_NAME
+
+
+def project_home():
+    project = _current_project.get()
+    return project.project_home if project is not None else PROJECT_HOME
+
+
+@contextmanager
+def use_project(project):
+    """Выполнять команды, запросы к БД и чтение shared memory для project внутри блока.
+
+    Контекст наследуют задачи asyncio и asyncio.to_thread; потоки threading -
+    только через contextvars.copy_context().run.
+    """
+    token = _current_project.set(project)
+    try:
+        yield project
+    finally:
+        _current_project.reset(token)
+
 def get_docker_cmd():
     # if shutil.which("wsl.exe"):
     #     return ["wsl.exe", "-e", "docker"]
@@ -66,11 +105,11 @@ def run_local_command(cmd, check=True, capture_output=False, cwd=None, shell=Fal
 def run_command(cmd, check=True, capture_output=False, cwd=None, shell=False):
     docker_cmd = get_docker_cmd()
     if isinstance(cmd, str) and not shell:
-        full_cmd = docker_cmd + ["exec", CONTAINER_NAME, "bash", "-c", cmd]
+        full_cmd = docker_cmd + ["exec", container_name(), "bash", "-c", cmd]
     elif isinstance(cmd, str) and shell:
         full_cmd = cmd
     else:
-        full_cmd = docker_cmd + ["exec", CONTAINER_NAME] + list(cmd)
+        full_cmd = docker_cmd + ["exec", container_name()] + list(cmd)
     
     try:
         result = subprocess.run(
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк актуатора приоритетов: цена обновления result.priority от размера очереди.
+
+Использует синтетическую БД benchmark_statistics_indexes (копия схемы проекта).
+Для каждого числа неотправленных результатов замеряется apply_priorities при
+разных размерах куска, время выборки feeder без --allapps (ORDER BY priority)
+и доли приложений среди первых слотов этой выборки против заданных весов.
+
+Запуск: python -m scripts.analysis.benchmark_priority_actuator --unsent 10000 50000 100000
+"""
+import sys
+import json
+import time
+from pathlib import Path
+from datetime import datetime
+from statistics import median
+
+from lib.db import DB_CONFIG, create_connection
+from lib.priority_actuator import apply_priorities, PRIORITY_CHUNK
+from scripts.analysis.benchmark_statistics_indexes import (
+    BENCH_DATABASE,
+    BENCH_APPS,
+    DEFAULT_HOSTS,
+    prepare_database,
+    grow_results,
+)
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+SERVER_DIR = SCRIPT_DIR.parent.parent
+
+DEFAULT_UNSENT = [10000, 50000, 100000]
+DEFAULT_CHUNKS = [1000, PRIORITY_CHUNK, 20000]
+DEFAULT_WEIGHTS = {"fast_task": 1.0, "medium_task": 2.0, "long_task": 0.5, "random_task": 1.0}
+# Столько первых результатов выборки feeder сравнивается с весами
+FEEDER_WINDOW = 100
+
+FEEDER_PRIORITY_SQL = f"""
+SELECT r.id, r.priority, r.workunitid, r.appid
+FROM result r
+WHERE r.server_state = 2
+ORDER BY r.priority DESC
+LIMIT {FEEDER_WINDOW}
+"""
+
+
+def set_unsent_count(conn, target):
+    """Перевести результаты между unsent и over, чтобы unsent было ровно target."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM result WHERE server_state = 2")
+        current = int(cursor.fetchone()[0])
+        if current < target:
+            cursor.execute(
+                "UPDATE result SET server_state = 2, outcome = 0, hostid = 0 "
+                "WHERE server_state = 5 ORDER BY id DESC LIMIT %s", (target - current,))
+        elif current > target:
+            cursor.execute(
+                "UPDATE result SET server_state = 5, outcome = 1 "
+                "WHERE server_state = 2 ORDER BY id LIMIT %s", (current - target,))
+        cursor.execute("UPDATE result SET priority = 0 WHERE server_state = 2")
+        cursor.execute("SELECT COUNT(*) FROM result WHERE server_state = 2")
+        return int(cursor.fetchone()[0])
+
+
+def feeder_window_shares(conn):
+    """(время выборки feeder, {app: доля среди первых FEEDER_WINDOW результатов})."""
+    with conn.cursor() as cursor:
+        started = time.perf_counter()
+        cursor.execute(FEEDER_PRIORITY_SQL)
+        rows = cursor.fetchall()
+        elapsed = time.perf_counter() - started
+        cursor.execute("SELECT id, name FROM app")
+        names = dict(cursor.fetchall())
+    counts = {}
+    for _, _, _, appid in rows:
+        name = names.get(appid, str(appid))
+        counts[name] = counts.get(name, 0) + 1
+    total = float(len(rows)) or 1.0
+    return elapsed, {name: count / total for name, count in sorted(counts.items())}
+
+
+def run_benchmark(unsent_sizes, chunks, weights, database=BENCH_DATABASE, hosts=DEFAULT_HOSTS, repeat=3):
+    conn = create_connection()
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "database": database,
+        "weights": weights,
+        "sizes": [],
+    }
+    try:
+        prepare_database(conn, DB_CONFIG["database"], database, hosts)
+        grow_results(conn, max(unsent_sizes) * 2, hosts)
+        weight_sum = sum(weights.values())
+        report["target_shares"] = {name: w / weight_sum for name, w in sorted(weights.items())}
+
+        for size in sorted(unsent_sizes):
+            unsent = set_unsent_count(conn, size)
+            print(f"\n=== {unsent} неотправленных результатов ===")
+            entry = {"unsent": unsent, "chunks": {}}
+            for chunk in chunks:
+                timings = []
+                for _ in range(repeat):
+                    stats, success = apply_priorities(weights, chunk=chunk, conn=conn)
+                    if not success:
+                        print("✗ Ошибка обновления приоритетов", file=sys.stderr)
+                        return report
+                    timings.append(stats["seconds"])
+                entry["chunks"][chunk] = {
+                    "rows": stats["rows"],
+                    "min": min(timings),
+                    "median": median(timings),
+                    "median_per_row": median(timings) / max(stats["rows"], 1),
+                    "runs": timings,
+                }
+                print(f"  кусок {chunk}: median {median(timings):.3f}s "
+                      f"({median(timings) / max(stats['rows'], 1) * 1e6:.1f} мкс/строку)")
+            feeder_time, shares = feeder_window_shares(conn)
+            entry["feeder_enumeration_seconds"] = feeder_time
+            entry["feeder_window_shares"] = shares
+            print(f"  выборка feeder: {feeder_time * 1000:.1f} мс, доли первых {FEEDER_WINDOW}: "
+                  + ", ".join(f"{name} {share * 100:.0f}%" for name, share in shares.items()))
+            report["sizes"].append(entry)
+    finally:
+        conn.close()
+    return report
+
+
+def save_report(report):
+    out_dir = SERVER_DIR / "data" / "priority_benchmarks"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = out_dir / f"priority_benchmark_{ts}.json"
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+    return path
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--unsent", type=int, nargs="+", default=DEFAULT_UNSENT)
+    parser.add_argument("--chunks", type=int, nargs="+", default=DEFAULT_CHUNKS)
+    parser.add_argument("--database", type=str, default=BENCH_DATABASE)
+    parser.add_argument("--hosts", type=int, default=DEFAULT_HOSTS)
+    parser.add_argument("--repeat", type=int, default=3)
+
+    args = parser.parse_args()
+
+    if args.database == DB_CONFIG["database"]:
+        print("✗ Ошибка: бенчмарк нельзя запускать на рабочей БД проекта", file=sys.stderr)
+        return 1
+    if min(args.chunks) <= 0 or min(args.unsent) <= 0:
+        print("✗ Ошибка: unsent и chunks должны быть > 0", file=sys.stderr)
+        return 1
+
+    weights = {name: DEFAULT_WEIGHTS.get(name, 1.0) for name in BENCH_APPS}
+    report = run_benchmark(args.unsent, args.chunks, weights, database=args.database,
+                           hosts=args.hosts, repeat=args.repeat)
+    path = save_report(report)
+    print(f"\n✓ Результаты сохранены: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк запросов статистики на синтетической БД до и после индексов lib.indexes.
+
+Схема копируется из БД проекта (CREATE TABLE ... LIKE, со стоковыми индексами BOINC)
+в отдельную базу, result заполняется до заданных размеров. Для каждого размера
+снимаются EXPLAIN и время запросов сенсоров, а также запросов со стороны
+планировщика (выборка feeder и переходы состояний), чтобы видеть цену индексов на запись.
+
+Запуск: python -m scripts.analysis.benchmark_statistics_indexes --sizes 1000000 10000000
+"""
+import sys
+import json
+import time
+from pathlib import Path
+from datetime import datetime
+from statistics import median
+
+from lib.db import DB_CONFIG, create_connection
+from lib.indexes import INDEXES, ensure_indexes, drop_indexes, explain, index_sizes
+from lib.statistics import (
+    COMPLETED_TASK_STATISTICS_SQL,
+    COMPLETED_CLIENT_STATISTICS_SQL,
+    CREDIT_STATISTICS_SQL,
+)
+from lib.credit_aggregator import IncrementalCreditAggregator
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+SERVER_DIR = SCRIPT_DIR.parent.parent
+
+BENCH_DATABASE = "boincserver_bench"
+BENCH_TABLES = ("app", "host", "workunit", "result")
+BENCH_APPS = ("fast_task", "medium_task", "long_task", "random_task")
+DEFAULT_HOSTS = 1000
+INSERT_BATCH = 200000
+WRITE_BATCH = 1000
+
+FEEDER_SQL = """
+SELECT r.id, r.priority, r.workunitid, r.appid
+FROM result r
+JOIN workunit w ON r.workunitid = w.id
+WHERE r.server_state = 2
+ORDER BY r.priority DESC
+LIMIT 100
+"""
+
+_NUMERIC_TYPES = {
+    "tinyint", "smallint", "mediumint", "int", "integer", "bigint",
+    "float", "double", "decimal", "real", "bit",
+}
+
+
+def _table_columns(cursor, table):
+    """[(имя, тип, обязательна_без_значения_по_умолчанию)] без auto_increment колонок."""
+    cursor.execute(
+        "SELECT COLUMN_NAME, DATA_TYPE, IS_NULLABLE, COLUMN_DEFAULT, EXTRA "
+        "FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION",
+        (table,)
+    )
+    columns = []
+    for name, data_type, nullable, default, extra in cursor.fetchall():
+        if "auto_increment" in (extra or ""):
+            continue
+        required = nullable == "NO" and default is None
+        columns.append((name, data_type, required))
+    return columns
+
+
+def _insert_select(cursor, table, overrides, source, copy_columns=False):
+    """INSERT INTO table ... SELECT: overrides - выражения по колонкам,
+    остальные обязательные колонки заполняются нулями/пустыми строками (или копируются)."""
+    names = []
+    exprs = []
+    for name, data_type, required in _table_columns(cursor, table):
+        if name in overrides:
+            expr = overrides[name]
+        elif copy_columns:
+            expr = name
+        elif required:
+            expr = "0" if data_type in _NUMERIC_TYPES else "''"
+        else:
+            continue
+        names.append(name)
+        exprs.append(expr)
+    sql = f"INSERT INTO {table} ({', '.join(names)}) SELECT {', '.join(exprs)} FROM {source}"
+    return cursor.execute(sql)
+
+
+def _count(cursor, sql, args=None):
+    cursor.execute(sql, args)
+    return int(cursor.fetchone()[0] or 0)
+
+
+def prepare_database(conn, source_database, database, hosts):
+    """Создать базу с копией схемы проекта и справочниками app/host."""
+    with conn.cursor() as cursor:
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {database}")
+        conn.select_db(database)
+        for table in BENCH_TABLES:
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {database}.{table} LIKE {source_database}.{table}")
+
+        if _count(cursor, "SELECT COUNT(*) FROM app") == 0:
+            for app_name in BENCH_APPS:
+                _insert_select(cursor, "app", {
+                    "name": f"'{app_name}'",
+                    "user_friendly_name": f"'{app_name}'",
+                    "weight": "1",
+                    "deprecated": "0",
+                }, "DUAL")
+
+        existing_hosts = _count(cursor, "SELECT COUNT(*) FROM host")
+        for host_id in range(existing_hosts + 1, hosts + 1):
+            _insert_select(cursor, "host", {
+                "domain_name": f"'bench_host_{host_id}'",
+                "p_fpops": "1e9 + RAND() * 4e9",
+                "create_time": "UNIX_TIMESTAMP() - 86400",
+                "rpc_time": "UNIX_TIMESTAMP()",
+            }, "DUAL")
+
+
+def grow_results(conn, target, hosts):
+    """Догнать workunit и result до target строк (по одному результату на workunit)."""
+    with conn.cursor() as cursor:
+        if _count(cursor, "SELECT COUNT(*) FROM workunit") == 0:
+            _insert_select(cursor, "workunit", {
+                "name": "'bench_wu_seed'",
+                "appid": "1",
+                "create_time": "UNIX_TIMESTAMP()",
+            }, "DUAL")
+
+        # Удвоение workunit копированием существующих строк
+        while True:
+            current = _count(cursor, "SELECT COUNT(*) FROM workunit")
+            if current >= target:
+                break
+            offset = _count(cursor, "SELECT MAX(id) FROM workunit")
+            batch = min(current, target - current, INSERT_BATCH)
+            _insert_select(cursor, "workunit", {
+                "name": f"CONCAT('bench_wu_', id + {offset})",
+                "appid": f"1 + FLOOR(RAND() * {len(BENCH_APPS)})",
+                "create_time": "UNIX_TIMESTAMP() - FLOOR(RAND() * 86400)",
+            }, f"workunit ORDER BY id LIMIT {batch}", copy_columns=True)
+            print(f"  workunit: {current + batch}")
+
+        # Результаты с распределением состояний, близким к рабочему проекту:
+        # 85% выполнено и засчитано, 5% завершено с ошибкой, 5% в работе, 5% в очереди
+        while True:
+            last_wu = _count(cursor, "SELECT COALESCE(MAX(workunitid), 0) FROM result")
+            inserted = _insert_select(cursor, "result", {
+                "name": "CONCAT('bench_res_', t.id)",
+                "workunitid": "t.id",
+                "appid": "t.appid",
+                "create_time": "t.create_time",
+                "server_state": "CASE WHEN t.u < 0.9 THEN 5 WHEN t.u < 0.95 THEN 4 ELSE 2 END",
+                "outcome": "CASE WHEN t.u < 0.85 THEN 1 WHEN t.u < 0.9 THEN 3 ELSE 0 END",
+                "validate_state": "IF(t.u < 0.85, 1, 0)",
+                "granted_credit": "IF(t.u < 0.85, RAND() * 10, 0)",
+                "elapsed_time": "IF(t.u < 0.9, RAND() * 600, 0)",
+                "cpu_time": "IF(t.u < 0.9, RAND() * 600, 0)",
+                "sent_time": "IF(t.u < 0.95, t.create_time + FLOOR(RAND() * 600), 0)",
+                "received_time": "IF(t.u < 0.9, t.create_time + 600 + FLOOR(RAND() * 600), 0)",
+                "hostid": f"IF(t.u < 0.95, 1 + t.id % {hosts}, 0)",
+                "priority": "FLOOR(RAND() * 100)",
+                "mod_time": "IF(t.u < 0.9, FROM_UNIXTIME(t.create_time + 1200), NOW())",
+            }, f"(SELECT id, appid, create_time, RAND() AS u FROM workunit "
+               f"WHERE id > {last_wu} ORDER BY id LIMIT {INSERT_BATCH}) t")
+            if not inserted:
+                break
+            print(f"  result: +{inserted}")
+
+        for table in ("workunit", "result"):
+            cursor.execute(f"ANALYZE TABLE {table}")
+            cursor.fetchall()
+        return _count(cursor, "SELECT COUNT(*) FROM result")
+
+
+def _aggregator_delta_sql(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT UNIX_TIMESTAMP(NOW()), COALESCE(MAX(id), 0) FROM result")
+        server_now, max_id = cursor.fetchone()
+    aggregator = IncrementalCreditAggregator()
+    aggregator.watermark = int(server_now)
+    aggregator.max_result_id = max(int(max_id) - WRITE_BATCH, 0)
+    return aggregator.delta_statements()[1]
+
+
+def benchmark_queries(conn):
+    return {
+        "completed_task_statistics": COMPLETED_TASK_STATISTICS_SQL,
+        "completed_client_statistics": COMPLETED_CLIENT_STATISTICS_SQL,
+        "credit_statistics": CREDIT_STATISTICS_SQL,
+        "aggregator_delta": _aggregator_delta_sql(conn),
+        "feeder_enumeration": FEEDER_SQL,
+    }
+
+
+def time_query(conn, sql, repeat):
+    timings = []
+    with conn.cursor() as cursor:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            cursor.execute(sql)
+            cursor.fetchall()
+            timings.append(time.perf_counter() - started)
+    return {"min": min(timings), "median": median(timings), "runs": timings}
+
+
+def time_transitions(conn, repeat):
+    """Время переходов unsent -> in progress -> unsent пачкой результатов (цена индексов на запись)."""
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT id FROM result WHERE server_state = 2 ORDER BY id LIMIT {WRITE_BATCH}")
+        ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            return {}
+        id_list = ", ".join(str(result_id) for result_id in ids)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            cursor.execute(f"UPDATE result SET server_state = 4, mod_time = NOW() WHERE id IN ({id_list})")
+            cursor.execute(f"UPDATE result SET server_state = 2, mod_time = NOW() WHERE id IN ({id_list})")
+            timings.append(time.perf_counter() - started)
+    per_row = [t / (2 * len(ids)) for t in timings]
+    return {"rows": len(ids), "min": min(timings), "median": median(timings), "median_per_row": median(per_row)}
+
+
+def measure_phase(conn, repeat):
+    phase = {"queries": {}, "table_sizes": index_sizes(conn=conn)}
+    for name, sql in benchmark_queries(conn).items():
+        plan = explain(sql, conn).to_dicts()
+        timing = time_query(conn, sql, repeat)
+        phase["queries"][name] = {"explain": plan, "timing": timing}
+        print(f"    {name}: median {timing['median']:.3f}s")
+    phase["transitions"] = time_transitions(conn, repeat)
+    if phase["transitions"]:
+        print(f"    transitions: {phase['transitions']['median_per_row'] * 1e6:.1f} мкс/строку")
+    return phase
+
+
+def run_benchmark(sizes, database=BENCH_DATABASE, hosts=DEFAULT_HOSTS, repeat=3, drop=False):
+    source_database = DB_CONFIG["database"]
+    conn = create_connection()
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "source_database": source_database,
+        "database": database,
+        "indexes": [spec._asdict() for spec in INDEXES],
+        "sizes": [],
+    }
+    try:
+        prepare_database(conn, source_database, database, hosts)
+        for size in sorted(sizes):
+            print(f"\n=== {size} результатов ===")
+            drop_indexes(conn=conn)
+            rows = grow_results(conn, size, hosts)
+
+            print("  До индексов:")
+            before = measure_phase(conn, repeat)
+
+            started = time.perf_counter()
+            created, success = ensure_indexes(conn=conn)
+            build_time = time.perf_counter() - started
+            if not success:
+                print("✗ Не удалось создать индексы", file=sys.stderr)
+                break
+            with conn.cursor() as cursor:
+                for table in ("workunit", "result"):
+                    cursor.execute(f"ANALYZE TABLE {table}")
+                    cursor.fetchall()
+
+            print(f"  После индексов (создание {build_time:.1f}s):")
+            after = measure_phase(conn, repeat)
+
+            report["sizes"].append({
+                "rows": rows,
+                "created_indexes": created,
+                "index_build_seconds": build_time,
+                "before": before,
+                "after": after,
+            })
+    finally:
+        if drop:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP DATABASE IF EXISTS {database}")
+        conn.close()
+    return report
+
+
+def save_report(report):
+    out_dir = SERVER_DIR / "data" / "index_benchmarks"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = out_dir / f"index_benchmark_{ts}.json"
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+    return path
+
+
+def print_summary(report):
+    print("\n" + "=" * 80)
+    print(f"{'rows':>10}  {'query':<28} {'before, s':>10} {'after, s':>10} {'speedup':>8}")
+    print("=" * 80)
+    for entry in report["sizes"]:
+        for name, before in entry["before"]["queries"].items():
+            before_time = before["timing"]["median"]
+            after_time = entry["after"]["queries"][name]["timing"]["median"]
+            speedup = before_time / after_time if after_time > 0 else 0.0
+            print(f"{entry['rows']:>10}  {name:<28} {before_time:>10.3f} {after_time:>10.3f} {speedup:>7.1f}x")
+        before_write = entry["before"]["transitions"].get("median_per_row")
+        after_write = entry["after"]["transitions"].get("median_per_row")
+        if before_write and after_write:
+            print(f"{entry['rows']:>10}  {'transitions (мкс/строку)':<28} "
+                  f"{before_write * 1e6:>10.1f} {after_write * 1e6:>10.1f} {before_write / after_write:>7.2f}x")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000000, 10000000])
+    parser.add_argument("--database", type=str, default=BENCH_DATABASE)
+    parser.add_argument("--hosts", type=int, default=DEFAULT_HOSTS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--drop", action="store_true")
+
+    args = parser.parse_args()
+
+    if args.database == DB_CONFIG["database"]:
+        print("✗ Ошибка: бенчмарк нельзя запускать на рабочей БД проекта", file=sys.stderr)
+        return 1
+
+    report = run_benchmark(args.sizes, database=args.database, hosts=args.hosts,
+                           repeat=args.repeat, drop=args.drop)
+    path = save_report(report)
+    print_summary(report)
+    print(f"\n✓ Результаты сохранены: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
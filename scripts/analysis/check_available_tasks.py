@@ -4,9 +4,23 @@
 import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
-from lib.utils import run_command, PROJECT_HOME
+from lib.db import query
+from lib.credit_summary import SUMMARY_TABLE, credit_summary_installed
 
-query = """
+summary_sql = f"""
+SELECT 
+    a.name as app_name,
+    COALESCE(s.unsent_count, 0) as unsent,
+    COALESCE(s.in_progress_count, 0) as in_progress,
+    COALESCE(s.completed_count, 0) as completed
+FROM app a
+LEFT JOIN {SUMMARY_TABLE} s ON s.appid = a.id
+WHERE a.name IN ('fast_task', 'medium_task', 'long_task', 'random_task') 
+    AND a.deprecated = 0
+ORDER BY a.name;
+"""
+
+sql = """
 SELECT 
     a.name as app_name,
     COUNT(DISTINCT CASE WHEN r.server_state = 2 THEN r.id END) as unsent,
@@ -21,14 +35,14 @@ GROUP BY a.id, a.name
 ORDER BY a.name;
 """
 
-cmd = f"cd {PROJECT_HOME} && mysql -u root -ppassword boincserver -e \"{query}\""
-stdout, success = run_command(cmd, check=False, capture_output=True)
+rows, success = query(summary_sql if credit_summary_installed() else sql, as_dict=True)
 
-if success and stdout:
+if success and rows:
     print("=" * 80)
     print("СТАТУС ЗАДАЧ ПО ПРИЛОЖЕНИЯМ")
     print("=" * 80)
-    print(stdout)
+    print("\t".join(rows[0].keys()))
+    for row in rows:
+        print("\t".join(str(value) for value in row.values()))
 else:
     print("Ошибка при получении данных")
-
@@ -4,9 +4,25 @@
 import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
-from lib.utils import run_command, PROJECT_HOME
+from lib.db import query
+from lib.credit_summary import SUMMARY_TABLE, credit_summary_installed
 
-query = """
+summary_sql = f"""
+SELECT 
+    a.name as app_name,
+    s.completed_count as total_results,
+    s.completed_count - s.credited_count as zero_credit,
+    s.credited_count as non_zero_credit,
+    ROUND((s.completed_count - s.credited_count) * 100.0 / s.completed_count, 2) as zero_credit_pct
+FROM app a
+JOIN {SUMMARY_TABLE} s ON s.appid = a.id
+WHERE s.completed_count > 0
+    AND a.name IN ('fast_task', 'medium_task', 'long_task', 'random_task')
+    AND a.deprecated = 0
+ORDER BY a.name;
+"""
+
+sql = """
 SELECT 
     a.name as app_name,
     COUNT(*) as total_results,
@@ -24,15 +40,14 @@ GROUP BY a.id, a.name
 ORDER BY a.name;
 """
 
-cmd = f"cd {PROJECT_HOME} && mysql -u root -ppassword boincserver -e \"{query}\""
-stdout, success = run_command(cmd, check=False, capture_output=True)
+rows, success = query(summary_sql if credit_summary_installed() else sql, as_dict=True)
 
-if success and stdout:
+if success and rows:
     print("=" * 80)
     print("СТАТИСТИКА ПО granted_credit")
     print("=" * 80)
-    print(stdout)
+    print("\t".join(rows[0].keys()))
+    for row in rows:
+        print("\t".join(str(value) for value in row.values()))
 else:
     print("Ошибка при получении данных")
-
-
@@ -4,38 +4,8 @@
 import sys
 from lib.apps import get_current_weights
 from lib.boinc_utils import trigger_feeder_update
-from lib.utils import run_command, PROJECT_HOME
+from scripts.analysis.show_feeder_queue import get_weights_from_shmem
 
-def get_weights_from_shmem():
-    """Получить веса из shared memory."""
-    cmd = f"cd {PROJECT_HOME} && bin/show_shmem | grep '^id:'"
-    stdout, success = run_command(cmd, check=False, capture_output=True)
-    
-    if not success or not stdout:
-        return {}
-    
-    weights = {}
-    target_apps = {'fast_task', 'medium_task', 'long_task', 'random_task'}
-    
-    for line in stdout.strip().split('\n'):
-        if 'name:' not in line or 'weight:' not in line:
-            continue
-        
-        parts = line.split()
-        try:
-            name_idx = parts.index('name:')
-            weight_idx = parts.index('weight:')
-            
-            if name_idx + 1 < len(parts) and weight_idx + 1 < len(parts):
-                app_name = parts[name_idx + 1]
-                if app_name in target_apps:
-                    weight_str = parts[weight_idx + 1]
-                    weight = float(weight_str)
-                    weights[app_name] = weight
-        except (ValueError, IndexError):
-            continue
-    
-    return weights
 
 if __name__ == "__main__":
     print("=" * 80)
@@ -11,8 +11,8 @@ from tqdm import tqdm
 from lib.statistics import (
     get_completed_task_statistics,
     get_completed_client_statistics,
-    get_credit_statistics,
 )
+from lib.credit_aggregator import get_incremental_credit_statistics
 from lib.pipeline import run_full_pipeline
 
 SCRIPT_DIR = Path(__file__).parent.absolute()
@@ -115,7 +115,7 @@ def step_wait():
             pbar.update(1)
 
             if sec > wait_seconds - observe_window:
-                stats = get_credit_statistics()
+                stats = get_incremental_credit_statistics()
                 if not stats:
                     continue
                 total_credits_per_app = {}
@@ -266,7 +266,7 @@ def main():
             time.sleep(1)
             counter += 1
             if counter % 30 == 0:
-                stats = get_credit_statistics()
+                stats = get_incremental_credit_statistics()
                 if stats:
                     append_baseline_state(snapshot_path, stats)
 
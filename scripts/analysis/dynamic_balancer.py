@@ -3,9 +3,56 @@ from __future__ import print_function
 import sys
 import time
 import logging
-from lib.apps import get_current_weights, update_weights
-from lib.statistics import get_credit_statistics
-from lib.boinc_utils import trigger_feeder_update, restart_feeder, ensure_daemons_running
+from lib.apps import update_weights
+from lib.sensors import collect_sensor_snapshot
+from lib.credit_aggregator import IncrementalCreditAggregator
+from lib.credit_rate import CreditRateSensor, DEFAULT_WINDOWS
+from lib.feeder_queue import get_feeder_queue_snapshot, feeder_weights_applied
+from lib.slot_model import predict_feeder_slots
+from lib.priority_actuator import apply_priorities, ensure_feeder_mode, ACTUATOR_WEIGHT, ACTUATOR_PRIORITY
+from lib.iteration_timer import IterationTimer
+from lib.targets import TargetModel, load_target_model
+from lib.control_api import (
+    BalancerControl,
+    ControlServer,
+    DEFAULT_CONTROL_PORT,
+    STATE_RUNNING,
+    STATE_WAITING,
+    STATE_PAUSED,
+    STATE_STOPPED,
+)
+from lib.actuation_scheduler import (
+    RestartScheduler,
+    describe_decision,
+    describe_actuation_totals,
+    DEFAULT_MAX_RESTARTS_PER_HOUR,
+)
+from lib.event_trigger import (
+    CompletionTrigger,
+    describe_trigger,
+    describe_totals,
+    SCHEDULE_INTERVAL,
+    SCHEDULE_EVENT,
+    DEFAULT_CREDIT_FRACTION,
+    DEFAULT_MAX_LATENCY,
+    DEFAULT_MIN_INTERVAL,
+    DEFAULT_POLL_INTERVAL,
+)
+from lib.controller_core import (
+    app_arrays,
+    aligned,
+    total_credits,
+    effective_avg_credit,
+    ratio_step,
+    STATUS_OK,
+    CREDIT_STATUS_WARNINGS,
+)
+from lib.boinc_utils import (
+    trigger_feeder_update,
+    apply_feeder_weights,
+    FEEDER_ACTUATION_RESTART,
+    FEEDER_ACTUATION_RELOAD,
+)
 
 MIN_WEIGHT = 0.01
 MAX_WEIGHT = 100.0
@@ -15,116 +62,75 @@ DEFAULT_SMOOTHING = 0.3
 INITIAL_WEIGHT_MIN = 0.8
 INITIAL_WEIGHT_MAX = 1.2
 
+CREDIT_INPUT_TOTAL = "total"
+CREDIT_INPUT_RATE = "rate"
+DEFAULT_RATE_WINDOW = 300
+
 
 def calculate_total_credits(credit_stats):
-    total_completed_credit = sum(stats.get('completed_credit', 0) for stats in credit_stats.values())
-    total_completed_count = sum(stats.get('completed_count', 0) for stats in credit_stats.values())
-    global_avg_credit = total_completed_credit / total_completed_count if total_completed_count > 0 else 0
-    
-    app_total_credits = {}
-    for app_name, app_stats in credit_stats.items():
-        completed_credit = app_stats.get('completed_credit', 0)
-        completed_count = app_stats.get('completed_count', 0)
-        avg_credit = app_stats.get('avg_credit', 0)
-        in_progress_count = app_stats.get('in_progress_count', 0)
-        unsent_count = app_stats.get('unsent_count', 0)
-        
-        if avg_credit == 0 and completed_count > 0 and completed_credit > 0:
-            avg_credit = completed_credit / completed_count
-        elif avg_credit == 0:
-            avg_credit = global_avg_credit
-        
-        expected_credit_from_in_progress = avg_credit * in_progress_count
-        
-        total_credit = completed_credit + expected_credit_from_in_progress
-        app_total_credits[app_name] = total_credit
-    
-    return app_total_credits
+    return dict(zip(credit_stats, total_credits(app_arrays(credit_stats)).tolist()))
+
+
+def create_credit_sensors(credit_input=CREDIT_INPUT_TOTAL, rate_window=DEFAULT_RATE_WINDOW):
+    """Агрегатор кредитов и (для входа по скорости) CreditRateSensor."""
+    if credit_input != CREDIT_INPUT_RATE:
+        return IncrementalCreditAggregator(), None
+    rate_sensor = CreditRateSensor(windows=set(DEFAULT_WINDOWS) | {rate_window})
+    return IncrementalCreditAggregator(history_seconds=rate_sensor.max_window), rate_sensor
 
 
-def calculate_target_weights(credit_stats, current_weights, smoothing=0.3):
+def calculate_target_weights(credit_stats, current_weights, smoothing=0.3, app_credits=None, target_model=None):
     all_apps = set(credit_stats.keys()) | set(current_weights.keys())
     if not all_apps:
         return current_weights
-    
-    all_apps_have_nonzero_credit = True
-    any_app_has_nonzero_credit = False
-    for app_name in all_apps:
-        app_stats = credit_stats.get(app_name, {})
-        completed_credit = app_stats.get('completed_credit', 0)
-        if completed_credit > 0:
-            any_app_has_nonzero_credit = True
-        else:
-            all_apps_have_nonzero_credit = False
-    
-    if not any_app_has_nonzero_credit:
-        logger = logging.getLogger()
-        logger.warning("  ⚠ Нет завершенных задач с ненулевым кредитом ни у одного приложения, веса не изменяются")
-        return current_weights
-    
-    if not all_apps_have_nonzero_credit:
-        logger = logging.getLogger()
-        logger.warning("  ⚠ Не у всех приложений есть завершенные задачи с ненулевым кредитом, веса не изменяются")
-        return current_weights
-    
-    app_total_credits = calculate_total_credits(credit_stats)
-    
-    for app_name in all_apps:
-        if app_name not in app_total_credits:
-            app_total_credits[app_name] = 0
-    
-    total_credit = sum(app_total_credits.values())
-    
-    if total_credit == 0:
+
+    apps = list(all_apps)
+    arrays = app_arrays(credit_stats, apps)
+    if app_credits is not None:
+        credits, credit_order = aligned(app_credits, apps)
+    else:
+        credits, credit_order = total_credits(arrays), arrays.stats_order
+    weights, _ = aligned(current_weights, apps, default=1.0)
+
+    status, target = ratio_step(credits, weights, arrays.completed_credit, smoothing, credit_order=credit_order,
+                                min_weight=MIN_WEIGHT, max_weight=MAX_WEIGHT,
+                                target_share=target_model.share_array(apps) if target_model is not None else None)
+    if status != STATUS_OK:
         logger = logging.getLogger()
-        logger.warning("  ⚠ Нет данных о кредитах, веса не изменяются")
+        logger.warning(CREDIT_STATUS_WARNINGS[status])
         return current_weights
-    
-    target_share = 1.0 / len(all_apps)
-    
-    target_weights = {}
-    
-    for app_name in all_apps:
-        current_weight = current_weights.get(app_name, 1.0)
-        current_credit = app_total_credits.get(app_name, 0)
-        
-        current_share = current_credit / total_credit if total_credit > 0 else 0
-        
-        if current_share > 0:
-            new_weight = current_weight * (target_share / current_share)
-        else:
-            new_weight = current_weight
-        
-        new_weight = max(MIN_WEIGHT, min(MAX_WEIGHT, new_weight))
-        
-        smoothed_weight = smoothing * current_weight + (1 - smoothing) * new_weight
-        smoothed_weight = max(MIN_WEIGHT, min(MAX_WEIGHT, smoothed_weight))
-        
-        target_weights[app_name] = smoothed_weight
-    
-    return target_weights
+
+    return dict(zip(apps, target.tolist()))
 
 
-_last_feeder_restart_time = 0
 _min_restart_interval = 30
 _min_restart_change_threshold = 0.1
 
-def balance_once(smoothing=DEFAULT_SMOOTHING, verbose=True, min_change_threshold=0.01):
+def balance_once(smoothing=DEFAULT_SMOOTHING, verbose=True, min_change_threshold=0.01, aggregator=None,
+                 rate_sensor=None, rate_window=DEFAULT_RATE_WINDOW, actuation=FEEDER_ACTUATION_RESTART,
+                 actuator=ACTUATOR_WEIGHT, scheduler=None, horizon=60, target_model=None):
     logger = logging.getLogger()
     
-    current_weights = get_current_weights()
+    snapshot, success = collect_sensor_snapshot(include_queue=False, aggregator=aggregator, rate_sensor=rate_sensor)
+    if not success:
+        logger.error("  ✗ Не удалось получить снимок сенсоров")
+        return False, {}, {}, {}
+    
+    current_weights = dict(snapshot.weights)
     if not current_weights:
         logger.error("  ✗ Не удалось получить текущие веса")
         return False, {}, {}, {}
     
-    credit_stats = get_credit_statistics()
+    credit_stats = {app_name: dict(stats) for app_name, stats in snapshot.credit_stats.items()}
     if not credit_stats:
         logger.warning("  ⚠ Нет статистики по кредитам")
         return False, current_weights, current_weights, {}
     
     if verbose:
         logger.info("\nСтатистика по кредитам:")
-        app_total_credits = calculate_total_credits(credit_stats)
+        arrays = app_arrays(credit_stats)
+        app_total_credits = dict(zip(arrays.apps, total_credits(arrays).tolist()))
+        avg_credits = dict(zip(arrays.apps, effective_avg_credit(arrays).tolist()))
         total_credit = sum(app_total_credits.values())
         
         for app_name in sorted(credit_stats.keys()):
@@ -137,14 +143,7 @@ def balance_once(smoothing=DEFAULT_SMOOTHING, verbose=True, min_change_threshold
             in_progress_count = stats.get('in_progress_count', 0)
             unsent_count = stats.get('unsent_count', 0)
             
-            avg_credit = stats.get('avg_credit', 0)
-            if avg_credit == 0 and completed_count > 0 and completed_credit > 0:
-                avg_credit = completed_credit / completed_count
-            elif avg_credit == 0:
-                total_completed_credit = sum(s.get('completed_credit', 0) for s in credit_stats.values())
-                total_completed_count = sum(s.get('completed_count', 0) for s in credit_stats.values())
-                avg_credit = total_completed_credit / total_completed_count if total_completed_count > 0 else 0
-            
+            avg_credit = avg_credits[app_name]
             expected_credit = avg_credit * in_progress_count
             
             logger.info(f"  {app_name}:")
@@ -156,12 +155,27 @@ def balance_once(smoothing=DEFAULT_SMOOTHING, verbose=True, min_change_threshold
                 logger.info(f"      - В очереди: {unsent_count} (не учитываются в расчете)")
             logger.info(f"      - Средний кредит: {avg_credit:.4f}")
     
-    target_weights = calculate_target_weights(credit_stats, current_weights, smoothing)
+    app_credits = None
+    if rate_sensor is not None:
+        window_rates = snapshot.credit_rates.get(rate_window, {})
+        app_credits = {app_name: window_rates.get(app_name, 0.0) for app_name in credit_stats}
+        if verbose:
+            logger.info(f"\nСкорость кредитов за {rate_window} с (вход балансировки):")
+            for app_name in sorted(app_credits):
+                logger.info(f"  {app_name}: {app_credits[app_name]:.4f} кредит/с")
+    
+    reference_weights = current_weights
+    if scheduler is not None:
+        # Сглаживание от весов, с которыми работает feeder: отложенные до перезапуска шаги не складываются
+        queue = get_feeder_queue_snapshot()
+        reference_weights = scheduler.effective_weights(current_weights, queue.weights if queue is not None else None)
+    target_weights = calculate_target_weights(credit_stats, reference_weights, smoothing, app_credits=app_credits,
+                                              target_model=target_model)
     
     if verbose:
         logger.info("\nНовые веса (после балансировки):")
         for app_name in sorted(target_weights.keys()):
-            old_w = current_weights.get(app_name, 1.0)
+            old_w = reference_weights.get(app_name, 1.0)
             new_w = target_weights[app_name]
             change = ((new_w - old_w) / old_w * 100) if old_w > 0 else 0
             logger.info(f"  {app_name}: {new_w:.4f} (было {old_w:.4f}, изменение {change:+.1f}%)")
@@ -169,12 +183,12 @@ def balance_once(smoothing=DEFAULT_SMOOTHING, verbose=True, min_change_threshold
     weights_changed = False
     changes_detail = []
     for app_name in target_weights:
-        old_w = current_weights.get(app_name, 1.0)
+        old_w = reference_weights.get(app_name, 1.0)
         new_w = target_weights[app_name]
         change = abs(new_w - old_w)
         change_pct = ((new_w - old_w) / old_w * 100) if old_w > 0 else 0
         changes_detail.append((app_name, old_w, new_w, change, change_pct))
-        if change > min_change_threshold:
+        if change > min_change_threshold or abs(new_w - current_weights.get(app_name, 1.0)) > min_change_threshold:
             weights_changed = True
     
     if not weights_changed:
@@ -192,13 +206,48 @@ def balance_once(smoothing=DEFAULT_SMOOTHING, verbose=True, min_change_threshold
         logger.error("  ✗ Ошибка при обновлении весов")
         return False, current_weights, target_weights, credit_stats
     
+    if actuator == ACTUATOR_PRIORITY:
+        priority_update, success = apply_priorities(target_weights)
+        if verbose and priority_update:
+            logger.info(f"\nПриоритеты обновлены: {priority_update['rows']} неотправленных результатов "
+                        f"за {priority_update['seconds']:.2f} с")
+        if not success:
+            logger.error("  ✗ Ошибка при обновлении приоритетов")
+        return success, current_weights, target_weights, credit_stats
+    
+    unsent_counts = {name: stats.get("unsent_count", 0) for name, stats in credit_stats.items()}
+    queue = get_feeder_queue_snapshot()
+    slot_prediction = predict_feeder_slots(target_weights, unsent_counts, queue)
+    if scheduler is not None:
+        decision = scheduler.decide(target_weights, horizon, slot_prediction,
+                                    applied_weights=queue.weights if queue is not None else None)
+        if verbose:
+            logger.info("\n" + describe_decision(decision))
+        if not decision["restart"]:
+            return True, current_weights, target_weights, credit_stats
+    elif slot_prediction is not None and slot_prediction["unchanged"]:
+        if verbose:
+            logger.info("\nРаспределение слотов feeder по модели не меняется - перезапуск пропущен")
+        return True, current_weights, target_weights, credit_stats
+    
     if verbose:
         logger.info("\nПерезапуск feeder для применения новых весов...")
-    restart_feeder()
-    time.sleep(3)
+    timings, restart_success = apply_feeder_weights(actuation)
+    weights_verified = restart_success and feeder_weights_applied(target_weights)
+    if scheduler is not None:
+        # Без подтвержденных весов планировщик не считает изменение примененным и повторит его
+        scheduler.record_restart(target_weights, timings, success=weights_verified)
+    if not restart_success:
+        logger.warning("  ⚠ Перезапуск feeder не удался, веса будут применены на следующей итерации")
+        return False, current_weights, target_weights, credit_stats
     if verbose:
-        logger.info("Проверка валидаторов и ассимиляторов...")
-    ensure_daemons_running()
+        fill_seconds = timings.get("first_fill_seconds")
+        fill_text = f"{fill_seconds:.2f} с" if fill_seconds is not None else "нет"
+        logger.info(f"Feeder перезапущен ({timings['actuation']}) за {timings['wall_seconds']:.2f} с, "
+                    f"первый заполненный слот: {fill_text}")
+    if not weights_verified:
+        logger.warning("  ⚠ Веса в shared memory feeder не совпадают с записанными")
+        return False, current_weights, target_weights, credit_stats
     
     return True, current_weights, target_weights, credit_stats
 
@@ -226,14 +275,26 @@ def setup_logging(log_file=None):
     return root_logger
 
 
-def balance_loop(interval=60, smoothing=DEFAULT_SMOOTHING, max_iterations=None, log_file=None, min_change_threshold=0.01):
+def balance_loop(interval=60, smoothing=DEFAULT_SMOOTHING, max_iterations=None, log_file=None, min_change_threshold=0.01,
+                 credit_input=CREDIT_INPUT_TOTAL, rate_window=DEFAULT_RATE_WINDOW,
+                 actuation=FEEDER_ACTUATION_RESTART, actuator=ACTUATOR_WEIGHT,
+                 schedule=SCHEDULE_INTERVAL, credit_fraction=DEFAULT_CREDIT_FRACTION,
+                 max_latency=DEFAULT_MAX_LATENCY, min_interval=DEFAULT_MIN_INTERVAL,
+                 poll_interval=DEFAULT_POLL_INTERVAL, restart_budget=DEFAULT_MAX_RESTARTS_PER_HOUR,
+                 control_port=None, target_model=None):
     logger = setup_logging(log_file)
     
     logger.info("="*80)
     logger.info("ЗАПУСК ЦИКЛА БАЛАНСИРОВКИ")
     logger.info("="*80)
-    logger.info(f"Интервал: {interval} секунд")
+    if schedule == SCHEDULE_EVENT:
+        logger.info(f"Итерации по новым кредитам: порог {credit_fraction*100:.1f}% кредита за {max_latency:.0f} с "
+                    f"при недавней скорости, не реже {max_latency:.0f} с, не чаще {min_interval:.0f} с")
+    else:
+        logger.info(f"Интервал: {interval} секунд")
     logger.info(f"Сглаживание: {smoothing}")
+    if actuator == ACTUATOR_WEIGHT:
+        logger.info(f"Перезапуски feeder: не чаще {_min_restart_interval} с, не больше {restart_budget} в час")
     if log_file:
         logger.info(f"Логи записываются в: {log_file}")
     if max_iterations:
@@ -242,29 +303,110 @@ def balance_loop(interval=60, smoothing=DEFAULT_SMOOTHING, max_iterations=None,
         logger.info("Бесконечный цикл (Ctrl+C для остановки)")
     logger.info("="*80)
     
+    control = None
+    control_server = None
+    targets_spec = target_model.spec if target_model is not None else None
+    if control_port is not None:
+        control = BalancerControl({"smoothing": smoothing, "interval": interval, "targets": targets_spec})
+        control_server = ControlServer(control, port=control_port)
+        if not control_server.start():
+            return
+        logger.info(f"API управления: http://{control_server.host}:{control_server.port}/status")
+    
+    if not ensure_feeder_mode(actuator):
+        logger.warning(f"⚠ Feeder не переведен в режим актуатора {actuator}")
+    
+    aggregator, rate_sensor = create_credit_sensors(credit_input, rate_window)
+    trigger = None
+    if schedule == SCHEDULE_EVENT:
+        trigger = CompletionTrigger(aggregator, rate_sensor=rate_sensor, credit_fraction=credit_fraction,
+                                    max_latency=max_latency, min_interval=min_interval,
+                                    poll_interval=poll_interval)
+    scheduler = None
+    if actuator == ACTUATOR_WEIGHT:
+        scheduler = RestartScheduler(min_restart_interval=_min_restart_interval,
+                                     min_change_threshold=_min_restart_change_threshold,
+                                     max_restarts_per_hour=restart_budget)
     iteration = 0
+    # Пробуждения по фиксированной сетке: время итерации не сдвигает расписание
+    timer = IterationTimer(interval)
     try:
         while True:
+            if control is not None:
+                settings = control.settings()
+                smoothing = settings["smoothing"]
+                if settings["targets"] != targets_spec:
+                    targets_spec = settings["targets"]
+                    target_model = TargetModel(targets_spec) if targets_spec else None
+                if settings["interval"] != interval:
+                    interval = settings["interval"]
+                    timer.set_interval(interval)
+                if settings["paused"]:
+                    control.publish(state=STATE_PAUSED)
+                    logger.info("\nЦикл приостановлен через API")
+                    while control.settings()["paused"]:
+                        control.wait(DEFAULT_POLL_INTERVAL)
+                    logger.info("Цикл возобновлен через API")
+                    timer.reset()
+                    continue
+            
             iteration += 1
             logger.info(f"\n--- Итерация {iteration} ---")
+            measured = timer.begin()
+            if control is not None:
+                control.publish(state=STATE_RUNNING, iteration=iteration, iteration_started_at=time.time())
             
             success, old_weights, new_weights, stats = balance_once(
-                smoothing=smoothing, verbose=True, min_change_threshold=min_change_threshold
+                smoothing=smoothing, verbose=True, min_change_threshold=min_change_threshold,
+                aggregator=aggregator, rate_sensor=rate_sensor, rate_window=rate_window,
+                actuation=actuation, actuator=actuator, scheduler=scheduler,
+                horizon=measured if measured is not None else (interval if interval > 0 else min_interval),
+                target_model=target_model
             )
+            breakdown = timer.breakdown()
+            logger.info(f"Итерация {breakdown['iteration_seconds']:.2f} с")
+            if control is not None:
+                control.publish(state=STATE_WAITING, iteration=iteration, last_success=success,
+                                snapshot={"current_weights": old_weights, "new_weights": new_weights,
+                                          "credit_stats": stats},
+                                controller={"smoothing": smoothing, "targets": targets_spec,
+                                            "actuation_totals": scheduler.totals() if scheduler else None},
+                                timing=breakdown)
             
             if max_iterations and iteration >= max_iterations:
                 logger.info(f"\n✓ Достигнуто максимальное количество итераций ({max_iterations})")
                 break
             
-            if interval > 0:
-                logger.info(f"\nОжидание {interval} секунд до следующей итерации...")
-                time.sleep(interval)
+            if trigger is not None:
+                logger.info("\nОжидание новых результатов...")
+                trigger_info = trigger.wait(sleep=control.wait_unless_paused if control is not None else None)
+                if trigger_info is None:
+                    logger.info("Ожидание прервано паузой через API")
+                    continue
+                logger.info(describe_trigger(trigger_info))
+            elif interval > 0:
+                delay, missed = timer.next_delay()
+                if missed:
+                    logger.warning(f"⚠ Итерация дольше интервала {interval} с, пропущено точек расписания: {missed}")
+                logger.info(f"\nОжидание {delay:.1f} секунд до следующей итерации...")
+                if control is not None:
+                    control.wait_unless_paused(delay)
+                else:
+                    time.sleep(delay)
     
     except KeyboardInterrupt:
         logger.info("\n\n✓ Цикл балансировки остановлен пользователем")
     except Exception as e:
         logger.error(f"\n✗ Ошибка в цикле балансировки: {e}")
         raise
+    finally:
+        if control_server is not None:
+            control.publish(state=STATE_STOPPED)
+            control_server.stop()
+        if trigger is not None:
+            logger.info(describe_totals(trigger))
+        if scheduler is not None:
+            logger.info(describe_actuation_totals(scheduler))
 
 
 def main():
@@ -278,13 +420,50 @@ def main():
     parser.add_argument("--quiet", action="store_true")
     parser.add_argument("--log-file", type=str, default=None)
     parser.add_argument("--min-change", type=float, default=0.001)
+    parser.add_argument("--credit-input", choices=[CREDIT_INPUT_TOTAL, CREDIT_INPUT_RATE], default=CREDIT_INPUT_TOTAL)
+    parser.add_argument("--rate-window", type=int, default=DEFAULT_RATE_WINDOW)
+    parser.add_argument("--actuation", choices=[FEEDER_ACTUATION_RESTART, FEEDER_ACTUATION_RELOAD],
+                        default=FEEDER_ACTUATION_RESTART)
+    parser.add_argument("--actuator", choices=[ACTUATOR_WEIGHT, ACTUATOR_PRIORITY], default=ACTUATOR_WEIGHT)
+    parser.add_argument("--schedule", choices=[SCHEDULE_INTERVAL, SCHEDULE_EVENT], default=SCHEDULE_INTERVAL)
+    parser.add_argument("--credit-fraction", type=float, default=DEFAULT_CREDIT_FRACTION)
+    parser.add_argument("--max-latency", type=float, default=DEFAULT_MAX_LATENCY)
+    parser.add_argument("--min-interval", type=float, default=DEFAULT_MIN_INTERVAL)
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL)
+    parser.add_argument("--restart-budget", type=int, default=DEFAULT_MAX_RESTARTS_PER_HOUR)
+    parser.add_argument("--serve", action="store_true")
+    parser.add_argument("--targets", type=str, default=None)
+    parser.add_argument("--control-port", type=int, default=DEFAULT_CONTROL_PORT)
     
     args = parser.parse_args()
     
+    if args.rate_window <= 0:
+        print("✗ Ошибка: rate-window должен быть > 0", file=sys.stderr)
+        return 1
+    
+    if args.credit_fraction < 0 or args.max_latency <= 0 or args.min_interval < 0 or args.poll_interval <= 0:
+        print("✗ Ошибка: credit-fraction и min-interval должны быть >= 0, max-latency и poll-interval > 0",
+              file=sys.stderr)
+        return 1
+    
+    if args.restart_budget < 0:
+        print("✗ Ошибка: restart-budget должен быть >= 0", file=sys.stderr)
+        return 1
+    
     if args.smoothing < 0 or args.smoothing > 1:
         print("✗ Ошибка: smoothing должен быть в диапазоне 0.0-1.0", file=sys.stderr)
         return 1
     
+    target_model = None
+    if args.targets:
+        target_model = load_target_model(args.targets)
+        if target_model is None:
+            return 1
+    
+    # Режим сервиса: бесконечный цикл с API управления на localhost
+    if args.serve:
+        args.loop = True
+    
     log_file = args.log_file
     if args.loop and log_file is None:
         from pathlib import Path
@@ -299,11 +478,22 @@ def main():
     if args.loop:
         balance_loop(interval=args.interval, smoothing=args.smoothing, 
                     max_iterations=args.max_iterations, log_file=log_file,
-                    min_change_threshold=args.min_change)
+                    min_change_threshold=args.min_change,
+                    credit_input=args.credit_input, rate_window=args.rate_window,
+                    actuation=args.actuation, actuator=args.actuator,
+                    schedule=args.schedule, credit_fraction=args.credit_fraction,
+                    max_latency=args.max_latency, min_interval=args.min_interval,
+                    poll_interval=args.poll_interval, restart_budget=args.restart_budget,
+                    control_port=args.control_port if args.serve else None, target_model=target_model)
     else:
+        if not ensure_feeder_mode(args.actuator):
+            print(f"⚠ Feeder не переведен в режим актуатора {args.actuator}", file=sys.stderr)
+        aggregator, rate_sensor = create_credit_sensors(args.credit_input, args.rate_window)
         success, old_weights, new_weights, stats = balance_once(
             smoothing=args.smoothing, verbose=not args.quiet,
-            min_change_threshold=args.min_change
+            min_change_threshold=args.min_change,
+            aggregator=aggregator, rate_sensor=rate_sensor, rate_window=args.rate_window,
+            actuation=args.actuation, actuator=args.actuator, target_model=target_model
         )
         return 0 if success else 1
     
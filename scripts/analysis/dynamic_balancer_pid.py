@@ -4,12 +4,84 @@ import sys
 import time
 import json
 import logging
+import numpy as np
 from pathlib import Path
 from datetime import datetime
-from lib.apps import get_current_weights, update_weights
-from lib.statistics import get_credit_statistics
-from lib.boinc_utils import trigger_feeder_update, restart_feeder, ensure_daemons_running
-from scripts.analysis.show_feeder_queue import get_queue_shares_from_shmem, get_queue_counts_from_shmem
+from lib.apps import update_weights, get_current_weights
+from lib.sensors import collect_sensor_snapshot
+from lib.credit_aggregator import IncrementalCreditAggregator
+from lib.credit_rate import CreditRateSensor, DEFAULT_WINDOWS
+from lib.boinc_utils import (
+    trigger_feeder_update,
+    apply_feeder_weights,
+    FEEDER_ACTUATION_RESTART,
+    FEEDER_ACTUATION_RELOAD,
+)
+from lib.feeder_queue import get_feeder_queue_snapshot, feeder_weights_applied
+from lib.queue_sampler import QueueOccupancySampler
+from lib.slot_model import predict_feeder_slots
+from lib.priority_actuator import apply_priorities, ensure_feeder_mode, ACTUATOR_WEIGHT, ACTUATOR_PRIORITY
+from lib.actuation_scheduler import (
+    RestartScheduler,
+    describe_decision,
+    describe_actuation_totals,
+    DEFAULT_MAX_RESTARTS_PER_HOUR,
+)
+from lib.targets import TargetModel, load_target_model
+from lib.host_model import (
+    HostThroughputModel,
+    correct_weights,
+    flow_shares_array,
+    describe_hosts,
+    DEFAULT_HOST_WINDOW,
+)
+from lib.checkpoint import (
+    CHECKPOINT_VERSION,
+    DEFAULT_CHECKPOINT_MAX_AGE,
+    default_checkpoint_path,
+    save_checkpoint,
+    load_checkpoint,
+    check_checkpoint,
+    checkpoint_age,
+)
+from lib.control_api import (
+    BalancerControl,
+    ControlServer,
+    DEFAULT_CONTROL_PORT,
+    STATE_RUNNING,
+    STATE_WAITING,
+    STATE_PAUSED,
+    STATE_STOPPED,
+)
+from lib.iteration_timer import (
+    IterationTimer,
+    describe_breakdown,
+    PHASE_SENSE,
+    PHASE_COMPUTE,
+    PHASE_ACTUATE,
+    PHASE_VERIFY,
+)
+from lib.event_trigger import (
+    CompletionTrigger,
+    describe_trigger,
+    describe_totals,
+    SCHEDULE_INTERVAL,
+    SCHEDULE_EVENT,
+    DEFAULT_CREDIT_FRACTION,
+    DEFAULT_MAX_LATENCY,
+    DEFAULT_MIN_INTERVAL,
+    DEFAULT_POLL_INTERVAL,
+)
+from lib.controller_core import (
+    app_arrays,
+    aligned,
+    total_credits,
+    effective_avg_credit,
+    credit_status,
+    pid_step,
+    STATUS_OK,
+    CREDIT_STATUS_WARNINGS,
+)
 
 MIN_WEIGHT = 0.001
 MAX_WEIGHT = 1000.0
@@ -21,25 +93,51 @@ DEFAULT_KD = 0.3
 MAX_STEP_CHANGE = 1
 INTEGRAL_LIMIT = 1.0
 QUEUE_SATURATION_THRESHOLD = 0.99
+# Доля времени интервала, начиная с которой состояние очереди по сэмплеру считается устойчивым
+QUEUE_TIME_FRACTION = 0.5
+
+# Вход контроллера: накопленные кредиты (completed + ожидаемые) или скорость за окно
+CREDIT_INPUT_TOTAL = "total"
+CREDIT_INPUT_RATE = "rate"
+DEFAULT_RATE_WINDOW = 300
+
+# Параметры, которые можно задать файлом --config (его пишет scripts.analysis.tune_pid)
+PID_CONFIG_KEYS = ("kp", "ki", "kd", "max_step_change", "integral_limit", "interval")
 
-_last_feeder_restart_time = 0
 _min_restart_interval = 30
 _min_restart_change_threshold = 0.1
 
+CHECKPOINT_CONTROLLER = "pid"
 
-def init_snapshot_file(kp, ki, kd):
+
+def load_pid_config(path):
+    """{параметр: значение} из JSON-файла настроек PID; неизвестные ключи отбрасываются."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"✗ Ошибка чтения конфигурации PID {path}: {e}", file=sys.stderr)
+        return None
+    params = data.get("params", data)
+    return {key: params[key] for key in PID_CONFIG_KEYS if key in params}
+
+
+def init_snapshot_file(kp, ki, kd, max_step_change=MAX_STEP_CHANGE, integral_limit=INTEGRAL_LIMIT, targets=None,
+                       prefix="pid_weights"):
     base_dir = Path(__file__).parent.parent.parent.absolute()
     snapshots_dir = base_dir / "data" / "weights_snapshots"
     snapshots_dir.mkdir(parents=True, exist_ok=True)
 
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    snapshot_path = snapshots_dir / f"pid_weights_{ts}.json"
+    snapshot_path = snapshots_dir / f"{prefix}_{ts}.json"
     header = {
         "created_at": datetime.now().isoformat(),
         "kp": kp,
         "ki": ki,
         "kd": kd,
-        "max_step_change": MAX_STEP_CHANGE,
+        "max_step_change": max_step_change,
+        "integral_limit": integral_limit,
+        "targets": targets,
         "states": []
     }
     with snapshot_path.open("w", encoding="utf-8") as f:
@@ -61,7 +159,7 @@ def append_snapshot(snapshot_path, state):
                 "kp": state.get("kp"),
                 "ki": state.get("ki"),
                 "kd": state.get("kd"),
-                "max_step_change": MAX_STEP_CHANGE,
+                "max_step_change": state.get("max_step_change", MAX_STEP_CHANGE),
                 "states": []
             }
         data.setdefault("states", []).append(state)
@@ -72,175 +170,137 @@ def append_snapshot(snapshot_path, state):
         logger.warning(f"  ⚠ Не удалось сохранить снимок весов: {e}")
 
 
-def calculate_total_credits(credit_stats):
-    total_completed_credit = sum(stats.get('completed_credit', 0) for stats in credit_stats.values())
-    total_completed_count = sum(stats.get('completed_count', 0) for stats in credit_stats.values())
-    global_avg_credit = total_completed_credit / total_completed_count if total_completed_count > 0 else 0
-
-    app_total_credits = {}
-    for app_name, app_stats in credit_stats.items():
-        completed_credit = app_stats.get('completed_credit', 0)
-        completed_count = app_stats.get('completed_count', 0)
-        avg_credit = app_stats.get('avg_credit', 0)
-        in_progress_count = app_stats.get('in_progress_count', 0)
-        unsent_count = app_stats.get('unsent_count', 0)
+def create_pid_state(snapshot_path, credit_input=CREDIT_INPUT_TOTAL, rate_window=DEFAULT_RATE_WINDOW,
+                     actuation=FEEDER_ACTUATION_RESTART, actuator=ACTUATOR_WEIGHT,
+                     restart_budget=DEFAULT_MAX_RESTARTS_PER_HOUR, target_model=None, host_model=None):
+    pid_state = {
+        "integral_error": {},
+        "prev_error": {},
+        "snapshot_path": str(snapshot_path),
+        "credit_input": credit_input,
+        "rate_window": rate_window,
+        "actuation": actuation,
+        "actuator": actuator,
+        "target_model": target_model,
+        "host_model": host_model,
+        # Для чекпоинта: веса в БД и в shared memory feeder после итерации, {app: UNIX-время применения}
+        "db_weights": None,
+        "feeder_weights": None,
+        "last_actuation": {},
+    }
+    if credit_input == CREDIT_INPUT_RATE:
+        rate_sensor = CreditRateSensor(windows=set(DEFAULT_WINDOWS) | {rate_window})
+        pid_state["rate_sensor"] = rate_sensor
+        pid_state["credit_aggregator"] = IncrementalCreditAggregator(history_seconds=rate_sensor.max_window)
+    else:
+        pid_state["credit_aggregator"] = IncrementalCreditAggregator()
+    if actuator == ACTUATOR_WEIGHT:
+        pid_state["restart_scheduler"] = RestartScheduler(min_restart_interval=_min_restart_interval,
+                                                          min_change_threshold=_min_restart_change_threshold,
+                                                          max_restarts_per_hour=restart_budget)
+    return pid_state
 
-        if avg_credit == 0 and completed_count > 0 and completed_credit > 0:
-            avg_credit = completed_credit / completed_count
-        elif avg_credit == 0:
-            avg_credit = global_avg_credit
 
-        expected_credit_from_in_progress = avg_credit * in_progress_count
-        total_credit = completed_credit + expected_credit_from_in_progress
-        app_total_credits[app_name] = total_credit
+def calculate_total_credits(credit_stats):
+    return dict(zip(credit_stats, total_credits(app_arrays(credit_stats)).tolist()))
 
-    return app_total_credits
 
+def pid_calculate_weights(credit_stats, current_weights, dt, pid_state, kp, ki, kd, queue_state=None,
+                          app_credits=None, queue_stats=None, max_step_change=MAX_STEP_CHANGE,
+                          integral_limit=INTEGRAL_LIMIT):
+    """PID-расчет новых весов (обертка над lib.controller_core.pid_step).
 
-def pid_calculate_weights(credit_stats, current_weights, dt, pid_state, kp, ki, kd):
+    queue_state - (доли, количества, всего слотов) очереди feeder из снимка сенсоров;
+    если не передан, очередь читается из shared memory.
+    app_credits - {app: величина} для расчета долей вместо calculate_total_credits
+    (например, скорость кредитов за окно).
+    queue_stats - сводка QueueOccupancySampler.aggregate за интервал; если передана,
+    заморозки решаются по доле времени в состоянии, а не по одному чтению очереди.
+    """
     logger = logging.getLogger()
 
     all_apps = set(credit_stats.keys()) | set(current_weights.keys())
     if not all_apps:
         return current_weights, pid_state, {}
 
-    all_apps_have_nonzero_credit = all(
-        credit_stats.get(app, {}).get('completed_credit', 0) > 0 for app in all_apps
-    )
-    any_app_has_nonzero_credit = any(
-        credit_stats.get(app, {}).get('completed_credit', 0) > 0 for app in all_apps
-    )
-    if not any_app_has_nonzero_credit:
-        logger.warning("  ⚠ Нет завершенных задач с ненулевым кредитом ни у одного приложения, веса не изменяются")
-        return current_weights, pid_state, {}
-    if not all_apps_have_nonzero_credit:
-        logger.warning("  ⚠ Не у всех приложений есть завершенные задачи с ненулевым кредитом, веса не изменяются")
-        return current_weights, pid_state, {}
-
-    app_total_credits = calculate_total_credits(credit_stats)
-
-    total_completed_credit = sum(stats.get('completed_credit', 0) for stats in credit_stats.values())
-    total_completed_count = sum(stats.get('completed_count', 0) for stats in credit_stats.values())
-    global_avg_credit = total_completed_credit / total_completed_count if total_completed_count > 0 else 0
-
-    per_app_scale = {}
-    for app_name in all_apps:
-        stats = credit_stats.get(app_name, {})
-        completed_credit = stats.get('completed_credit', 0)
-        completed_count = stats.get('completed_count', 0)
-        avg_credit = stats.get('avg_credit', 0)
-        if avg_credit == 0 and completed_count > 0 and completed_credit > 0:
-            avg_credit = completed_credit / completed_count
-        elif avg_credit == 0:
-            avg_credit = global_avg_credit
-        if global_avg_credit > 0 and avg_credit > 0:
-            scale = avg_credit / global_avg_credit
-        else:
-            scale = 1.0
-        scale = max(0.5, min(4.0, scale))
-        per_app_scale[app_name] = scale
-
-    for app_name in all_apps:
-        if app_name not in app_total_credits:
-            app_total_credits[app_name] = 0
+    apps = list(all_apps)
+    arrays = app_arrays(credit_stats, apps)
+    if app_credits is not None:
+        credits, credit_order = aligned(app_credits, apps)
+    else:
+        credits, credit_order = total_credits(arrays), arrays.stats_order
 
-    total_credit = sum(app_total_credits.values())
-    if total_credit == 0:
-        logger.warning("  ⚠ Нет данных о кредитах, веса не изменяются")
+    status, _ = credit_status(arrays.completed_credit, credits, credit_order)
+    if status != STATUS_OK:
+        logger.warning(CREDIT_STATUS_WARNINGS[status])
         return current_weights, pid_state, {}
 
-    shmem_queue_shares = get_queue_shares_from_shmem()
-    shmem_queue_counts, total_slots = get_queue_counts_from_shmem()
-    queue_shares = {}
+    if queue_state is None:
+        queue_snapshot = get_feeder_queue_snapshot()
+        if queue_snapshot is not None:
+            shmem_queue_shares = queue_snapshot.shares
+            shmem_queue_counts, total_slots = dict(queue_snapshot.counts), queue_snapshot.total_slots
+        else:
+            shmem_queue_shares, shmem_queue_counts, total_slots = {}, {}, 0
+    else:
+        shmem_queue_shares, shmem_queue_counts, total_slots = queue_state
     saturated_apps = set()
-    if shmem_queue_shares:
-        for app_name in all_apps:
-            share = shmem_queue_shares.get(app_name, 0.0)
-            queue_shares[app_name] = share
-            if share >= QUEUE_SATURATION_THRESHOLD:
+    starved_apps = set()
+    full_apps = set()
+    if queue_stats and queue_stats.get("apps"):
+        sampled = queue_stats["apps"]
+        for app_name in apps:
+            app_queue = sampled.get(app_name, {})
+            if app_queue.get("saturated_fraction", 0.0) >= QUEUE_TIME_FRACTION:
                 saturated_apps.add(app_name)
+            if app_queue.get("starved_fraction", 1.0) >= QUEUE_TIME_FRACTION:
+                starved_apps.add(app_name)
+            if app_queue.get("full_fraction", 0.0) >= QUEUE_TIME_FRACTION:
+                full_apps.add(app_name)
     else:
-        for app_name in all_apps:
-            queue_shares[app_name] = 0.0
-    any_saturated = bool(saturated_apps)
-
-    target_share = 1.0 / len(all_apps)
+        for app_name in apps:
+            if shmem_queue_shares.get(app_name, 0.0) >= QUEUE_SATURATION_THRESHOLD:
+                saturated_apps.add(app_name)
+            queue_count = shmem_queue_counts.get(app_name, 0)
+            if queue_count <= 1:
+                starved_apps.add(app_name)
+            if total_slots > 0 and queue_count >= total_slots - 1:
+                full_apps.add(app_name)
 
     integral_error = pid_state.get("integral_error", {})
     prev_error = pid_state.get("prev_error", {})
+    weights, weight_order = aligned(current_weights, apps, default=1.0)
+    # Без модели долей - поровну (1 / число приложений), как в pid_step по умолчанию
+    target_model = pid_state.get("target_model")
+    target_share = target_model.share_array(apps) if target_model is not None else None
+    pid_state["target_shares"] = dict(zip(apps, target_share.tolist())) if target_share is not None else \
+        {app_name: 1.0 / len(apps) for app_name in apps}
+
+    step = pid_step(
+        credits, weights, aligned(integral_error, apps)[0], aligned(prev_error, apps)[0],
+        arrays.completed_credit, dt, kp, ki, kd,
+        saturated=np.array([app in saturated_apps for app in apps]),
+        starved=np.array([app in starved_apps for app in apps]),
+        full=np.array([app in full_apps for app in apps]),
+        credit_order=credit_order, weight_order=weight_order,
+        min_weight=MIN_WEIGHT, max_weight=MAX_WEIGHT,
+        max_step_change=max_step_change, integral_limit=integral_limit,
+        target_share=target_share,
+    )
 
-    raw_weights = {}
+    new_weights = {}
     frozen_weights = {}
     freeze_flags = {}
-
-    for app_name in all_apps:
-        current_weight = current_weights.get(app_name, 1.0)
-        current_credit = app_total_credits.get(app_name, 0)
-        current_share = current_credit / total_credit if total_credit > 0 else 0
-        queue_share = queue_shares.get(app_name, 0.0)
-        queue_count = shmem_queue_counts.get(app_name, 0)
-
-        error = target_share - current_share
-
-        ie = integral_error.get(app_name, 0.0) + error * dt
-        ie = max(-INTEGRAL_LIMIT, min(INTEGRAL_LIMIT, ie))
+    for app_name, w, ie, error, frozen in zip(apps, step.weights.tolist(), step.integral_error.tolist(),
+                                              step.prev_error.tolist(), step.frozen.tolist()):
         integral_error[app_name] = ie
-
-        prev_e = prev_error.get(app_name, 0.0)
-        de = (error - prev_e) / dt if dt > 0 else 0.0
         prev_error[app_name] = error
-
-        output = kp * error + ki * ie + kd * de
-        scale = per_app_scale.get(app_name, 1.0)
-
-        factor = 1.0 + output
-
-        frozen = False
-
-        if queue_share >= QUEUE_SATURATION_THRESHOLD and factor > 1.0:
-            factor = 1.0
-            frozen = True
-
-        if any_saturated and app_name not in saturated_apps and factor < 1.0:
-            factor = 1.0
-            frozen = True
-
-        if queue_count <= 1 and factor < 1.0:
-            factor = 1.0
-            frozen = True
-
-        if total_slots > 0 and queue_count >= total_slots - 1 and factor > 1.0:
-            factor = 1.0
-            frozen = True
-
-        factor = max(1.0 - MAX_STEP_CHANGE, min(1.0 + MAX_STEP_CHANGE, factor))
-
+        freeze_flags[app_name] = frozen
         if frozen:
-            frozen_weights[app_name] = current_weight
+            frozen_weights[app_name] = w
         else:
-            raw_w = current_weight * factor
-            raw_w = max(MIN_WEIGHT, min(MAX_WEIGHT, raw_w))
-            raw_weights[app_name] = raw_w
-
-        freeze_flags[app_name] = frozen
-
-    total_raw = sum(raw_weights.values())
-    total_current = sum(current_weights.values()) if current_weights else 1.0
-    frozen_sum = sum(frozen_weights.values())
-
-    new_weights = {}
-
-    if total_raw > 0 and total_current > frozen_sum:
-        target_sum_for_raw = total_current - frozen_sum
-        for app_name, rw in raw_weights.items():
-            w = rw / total_raw * target_sum_for_raw
-            new_weights[app_name] = max(MIN_WEIGHT, min(MAX_WEIGHT, w))
-    else:
-        for app_name, rw in raw_weights.items():
-            new_weights[app_name] = rw
-
-    for app_name, fw in frozen_weights.items():
-        new_weights[app_name] = fw
+            new_weights[app_name] = w
+    new_weights.update(frozen_weights)
 
     pid_state["integral_error"] = integral_error
     pid_state["prev_error"] = prev_error
@@ -248,21 +308,65 @@ def pid_calculate_weights(credit_stats, current_weights, dt, pid_state, kp, ki,
     return new_weights, pid_state, freeze_flags
 
 
+def host_model_correction(host_model, current_weights, target_weights, freeze_flags, avg_credits=None,
+                          max_step_change=MAX_STEP_CHANGE):
+    """Поправка весов PID на неоднородность хостов (lib.host_model.correct_weights).
+
+    Приложения без завершений за окно и замороженные сохраняют веса PID.
+    Возвращает (веса, сводка для снимка или None, если данных по хостам мало).
+    """
+    arrays = host_model.arrays(list(target_weights), avg_credit=avg_credits)
+    if arrays is None:
+        return target_weights, None
+    apps = arrays.apps
+    current = np.array([current_weights.get(app_name, 1.0) for app_name in apps])
+    proposed = np.array([target_weights[app_name] for app_name in apps])
+    fixed = np.array([bool(freeze_flags.get(app_name)) for app_name in apps])
+    lower = np.maximum(current * (1.0 - max_step_change), MIN_WEIGHT)
+    upper = np.minimum(current * (1.0 + max_step_change), MAX_WEIGHT)
+    corrected, info = correct_weights(arrays, current, proposed, fixed=fixed, lower=lower, upper=upper)
+    if not fixed.any():
+        # Доли от масштаба не зависят; сумма весов остается как у PID, но шаг не шире ограничения PID
+        corrected = np.clip(corrected * proposed.sum() / corrected.sum(), lower, upper)
+        info["corrected_shares"] = dict(zip(apps, flow_shares_array(arrays, corrected).tolist()))
+    new_weights = dict(target_weights)
+    new_weights.update(zip(apps, corrected.tolist()))
+    info["hosts"] = len(arrays.host_ids)
+    info["concurrency"] = float(arrays.capacity.sum())
+    return new_weights, info
+
+
 def balance_once(pid_state, kp=DEFAULT_KP, ki=DEFAULT_KI, kd=DEFAULT_KD, verbose=True,
-                 min_change_threshold=0.001, dt=60):
+                 min_change_threshold=0.001, dt=60, max_step_change=MAX_STEP_CHANGE,
+                 integral_limit=INTEGRAL_LIMIT, timer=None):
+    """Одна итерация PID; timer (IterationTimer) уже начат циклом, иначе замер начинается здесь."""
     logger = logging.getLogger()
+    if timer is None:
+        timer = IterationTimer(dt)
+        timer.begin()
+
+    with timer.phase(PHASE_SENSE):
+        snapshot, success = collect_sensor_snapshot(
+            aggregator=pid_state.get("credit_aggregator"),
+            rate_sensor=pid_state.get("rate_sensor"),
+        )
+    if not success:
+        logger.error("  ✗ Не удалось получить снимок сенсоров")
+        return False, {}, {}, {}, pid_state
 
-    current_weights = get_current_weights()
+    current_weights = dict(snapshot.weights)
     if not current_weights:
         logger.error("  ✗ Не удалось получить текущие веса")
         return False, {}, {}, {}, pid_state
 
-    credit_stats = get_credit_statistics()
+    credit_stats = {app_name: dict(stats) for app_name, stats in snapshot.credit_stats.items()}
     if not credit_stats:
         logger.warning("  ⚠ Нет статистики по кредитам")
         return False, current_weights, current_weights, {}, pid_state
 
-    app_total_credits = calculate_total_credits(credit_stats)
+    arrays = app_arrays(credit_stats)
+    app_total_credits = dict(zip(arrays.apps, total_credits(arrays).tolist()))
+    avg_credits = dict(zip(arrays.apps, effective_avg_credit(arrays).tolist()))
     total_credit_sum = sum(app_total_credits.values())
     completed_credits_by_app = {name: stats.get("completed_credit", 0) for name, stats in credit_stats.items()}
     completed_credit_sum = sum(completed_credits_by_app.values())
@@ -280,14 +384,7 @@ def balance_once(pid_state, kp=DEFAULT_KP, ki=DEFAULT_KI, kd=DEFAULT_KD, verbose
             in_progress_count = stats.get('in_progress_count', 0)
             unsent_count = stats.get('unsent_count', 0)
 
-            avg_credit = stats.get('avg_credit', 0)
-            if avg_credit == 0 and completed_count > 0 and completed_credit > 0:
-                avg_credit = completed_credit / completed_count
-            elif avg_credit == 0:
-                total_completed_credit = sum(s.get('completed_credit', 0) for s in credit_stats.values())
-                total_completed_count = sum(s.get('completed_count', 0) for s in credit_stats.values())
-                avg_credit = total_completed_credit / total_completed_count if total_completed_count > 0 else 0
-
+            avg_credit = avg_credits[app_name]
             expected_credit = avg_credit * in_progress_count
 
             logger.info(f"  {app_name}:")
@@ -298,14 +395,76 @@ def balance_once(pid_state, kp=DEFAULT_KP, ki=DEFAULT_KI, kd=DEFAULT_KD, verbose
                 logger.info(f"      - В очереди: {unsent_count} (не учитываются в расчете)")
             logger.info(f"      - Средний кредит: {avg_credit:.4f}")
 
-    target_weights, pid_state, freeze_flags = pid_calculate_weights(
-        credit_stats, current_weights, dt, pid_state, kp, ki, kd
-    )
+    credit_input = pid_state.get("credit_input", CREDIT_INPUT_TOTAL)
+    app_credits = None
+    if credit_input == CREDIT_INPUT_RATE:
+        rate_window = pid_state.get("rate_window", DEFAULT_RATE_WINDOW)
+        window_rates = snapshot.credit_rates.get(rate_window, {})
+        app_credits = {app_name: window_rates.get(app_name, 0.0) for app_name in credit_stats}
+        if verbose:
+            total_rate = sum(app_credits.values())
+            logger.info(f"\nСкорость кредитов за {rate_window} с (вход контроллера):")
+            for app_name in sorted(app_credits):
+                rate = app_credits[app_name]
+                share = (rate / total_rate * 100) if total_rate > 0 else 0
+                logger.info(f"  {app_name}: {rate:.4f} кредит/с ({share:.1f}%)")
+
+    host_model = pid_state.get("host_model")
+    if host_model is not None:
+        with timer.phase(PHASE_SENSE):
+            _, host_success = host_model.refresh()
+        if not host_success:
+            logger.warning("  ⚠ Не удалось обновить модель хостов")
+        elif verbose:
+            logger.info("\n" + describe_hosts(host_model.host_estimates()))
+
+    queue_state = (dict(snapshot.queue_shares), dict(snapshot.queue_counts), snapshot.total_slots)
+    queue_stats = None
+    queue_sampler = pid_state.get("queue_sampler")
+    if queue_sampler is not None:
+        with timer.phase(PHASE_SENSE):
+            queue_stats = queue_sampler.aggregate(window=dt)
+        if verbose and queue_stats:
+            logger.info(f"\nОчередь feeder за {queue_stats['duration']:.0f} с ({queue_stats['samples']} сэмплов):")
+            for app_name in sorted(queue_stats["apps"]):
+                q = queue_stats["apps"][app_name]
+                logger.info(f"  {app_name}: доля {q['mean_share']*100:.1f}%, слотов {q['min_count']}-{q['max_count']}, "
+                            f"насыщение {q['saturated_fraction']*100:.0f}%, голодание {q['starved_fraction']*100:.0f}%")
+    scheduler = pid_state.get("restart_scheduler")
+    queue = None
+    # Шаг считается от весов, с которыми работает feeder: отложенные до перезапуска шаги не складываются
+    reference_weights = current_weights
+    if scheduler is not None:
+        with timer.phase(PHASE_SENSE):
+            queue = get_feeder_queue_snapshot()
+        if queue is not None and queue.weights:
+            pid_state["feeder_weights"] = dict(queue.weights)
+        reference_weights = scheduler.effective_weights(current_weights, pid_state.get("feeder_weights"))
+    with timer.phase(PHASE_COMPUTE):
+        target_weights, pid_state, freeze_flags = pid_calculate_weights(
+            credit_stats, reference_weights, dt, pid_state, kp, ki, kd, queue_state=queue_state,
+            app_credits=app_credits, queue_stats=queue_stats,
+            max_step_change=max_step_change, integral_limit=integral_limit,
+        )
+        host_correction = None
+        if host_model is not None:
+            target_weights, host_correction = host_model_correction(
+                host_model, reference_weights, target_weights, freeze_flags, avg_credits=avg_credits,
+                max_step_change=max_step_change,
+            )
+
+    if verbose and host_correction is not None:
+        logger.info(f"\nПрогноз долей потока кредита по {host_correction['hosts']} хостам "
+                    f"(сейчас → PID → с поправкой):")
+        for app_name in sorted(host_correction["corrected_shares"]):
+            logger.info(f"  {app_name}: {host_correction['current_shares'][app_name]*100:.1f}% → "
+                        f"{host_correction['proposed_shares'][app_name]*100:.1f}% → "
+                        f"{host_correction['corrected_shares'][app_name]*100:.1f}%")
 
     if verbose:
         logger.info("\nНовые веса (после PID):")
         for app_name in sorted(target_weights.keys()):
-            old_w = current_weights.get(app_name, 1.0)
+            old_w = reference_weights.get(app_name, 1.0)
             new_w = target_weights[app_name]
             change_pct = ((new_w - old_w) / old_w * 100) if old_w > 0 else 0
             freeze_suffix = " freeze" if freeze_flags.get(app_name) else ""
@@ -314,14 +473,31 @@ def balance_once(pid_state, kp=DEFAULT_KP, ki=DEFAULT_KI, kd=DEFAULT_KD, verbose
     weights_changed = False
     changes_detail = []
     for app_name in target_weights:
-        old_w = current_weights.get(app_name, 1.0)
+        old_w = reference_weights.get(app_name, 1.0)
         new_w = target_weights[app_name]
         change_pct = ((new_w - old_w) / old_w) if old_w > 0 else 0.0
         changes_detail.append((app_name, old_w, new_w, change_pct))
-        if abs(change_pct) > min_change_threshold:
+        db_w = current_weights.get(app_name, 1.0)
+        db_change = ((new_w - db_w) / db_w) if db_w > 0 else 0.0
+        if abs(change_pct) > min_change_threshold or abs(db_change) > min_change_threshold:
             weights_changed = True
 
     if not weights_changed:
+        pid_state["db_weights"] = current_weights
+        # Статус API показывает и итерации без изменения весов
+        pid_state["last_snapshot"] = {
+            "timestamp": datetime.now().isoformat(),
+            "sensor_timestamp": snapshot.timestamp,
+            "weights_changed": False,
+            "current_weights": current_weights,
+            "feeder_reference_weights": reference_weights,
+            "new_weights": target_weights,
+            "target_shares": pid_state.get("target_shares"),
+            "host_model": host_correction,
+            "queue_stats": queue_stats,
+            "trigger": pid_state.get("trigger"),
+            "timing": dict(timer.breakdown(), dt=dt, nominal_dt=timer.interval),
+        }
         if verbose:
             logger.info(f"\n  ⚠ Веса не обновляются: все относительные изменения ≤ {min_change_threshold*100:.1f}%")
             logger.info("  Детали изменений:")
@@ -329,37 +505,128 @@ def balance_once(pid_state, kp=DEFAULT_KP, ki=DEFAULT_KI, kd=DEFAULT_KD, verbose
                 logger.info(f"    {app_name}: {old_w:.6f} → {new_w:.6f} (изменение {change_pct*100:+.4f}%)")
         return True, current_weights, target_weights, credit_stats, pid_state
 
-    success = update_weights(target_weights)
+    actuator = pid_state.get("actuator", ACTUATOR_WEIGHT)
+    slot_prediction = None
+    restart_decision = None
+    restart_needed = False
+    if actuator == ACTUATOR_WEIGHT:
+        with timer.phase(PHASE_COMPUTE):
+            unsent_counts = {name: stats.get("unsent_count", 0) for name, stats in credit_stats.items()}
+            if queue is None:
+                queue = get_feeder_queue_snapshot()
+            slot_prediction = predict_feeder_slots(target_weights, unsent_counts, queue)
+            if scheduler is not None:
+                # Выигрыш перезапуска считается за время до следующей итерации (~ текущий dt)
+                restart_decision = scheduler.decide(target_weights, dt, slot_prediction,
+                                                    applied_weights=queue.weights if queue is not None else None)
+        if restart_decision is not None:
+            restart_needed = restart_decision["restart"]
+        else:
+            restart_needed = slot_prediction is None or not slot_prediction["unchanged"]
+
+    with timer.phase(PHASE_ACTUATE):
+        success = update_weights(target_weights)
     if not success:
         logger.error("  ✗ Ошибка при обновлении весов")
         return False, current_weights, target_weights, credit_stats, pid_state
+    pid_state["db_weights"] = dict(target_weights)
+
+    priority_update = None
+    if actuator == ACTUATOR_PRIORITY:
+        # Веса в БД остаются состоянием контроллера, выдачу задают приоритеты
+        with timer.phase(PHASE_ACTUATE):
+            priority_update, success = apply_priorities(target_weights)
+        if verbose and priority_update:
+            logger.info(f"\nПриоритеты обновлены: {priority_update['rows']} неотправленных результатов "
+                        f"за {priority_update['seconds']:.2f} с")
+        if not success:
+            logger.error("  ✗ Ошибка при обновлении приоритетов")
+        else:
+            changed_apps = [app_name for app_name, _, _, change_pct in changes_detail if change_pct != 0]
+            pid_state["last_actuation"].update(dict.fromkeys(changed_apps, time.time()))
+    if verbose and slot_prediction is not None:
+        logger.info("\nСлоты feeder по модели weighted_interleave (сейчас → с новыми весами, ожидаемо занято):")
+        for app_name in sorted(slot_prediction["new_slots"]):
+            logger.info(f"  {app_name}: {slot_prediction['current_slots'].get(app_name, 0)} → "
+                        f"{slot_prediction['new_slots'][app_name]} ({slot_prediction['predicted_filled'][app_name]})")
+
+    feeder_restart = None
+    weights_verified = None
+    if verbose and restart_decision is not None:
+        logger.info("\n" + describe_decision(restart_decision))
+    if restart_needed:
+        if verbose:
+            logger.info("\nПерезапуск feeder для применения новых весов...")
+        with timer.phase(PHASE_ACTUATE):
+            feeder_restart, restart_success = apply_feeder_weights(pid_state.get("actuation", FEEDER_ACTUATION_RESTART))
+        with timer.phase(PHASE_VERIFY):
+            weights_verified = restart_success and feeder_weights_applied(target_weights)
+        if scheduler is not None:
+            # Без подтвержденных весов планировщик не считает изменение примененным и повторит его
+            feeder_restart["queue_empty_seconds"] = scheduler.record_restart(target_weights, feeder_restart,
+                                                                             success=weights_verified)
+        if verbose:
+            fill_seconds = feeder_restart.get("first_fill_seconds")
+            fill_text = f"{fill_seconds:.2f} с" if fill_seconds is not None else "нет"
+            logger.info(f"Feeder перезапущен ({feeder_restart['actuation']}) за {feeder_restart['wall_seconds']:.2f} с, "
+                        f"первый заполненный слот: {fill_text}")
+        if weights_verified:
+            # Перезапуск применяет и изменения, накопленные в БД за отложенные итерации
+            applied_before = pid_state.get("feeder_weights") or {}
+            actuated_apps = [app_name for app_name, w in target_weights.items() if applied_before.get(app_name) != w]
+            pid_state["feeder_weights"] = dict(target_weights)
+            pid_state["last_actuation"].update(dict.fromkeys(actuated_apps, time.time()))
+        else:
+            # Фактические веса feeder неизвестны, при перезапуске проверка по ним пропускается
+            pid_state["feeder_weights"] = None
+            logger.warning("  ⚠ Веса в shared memory feeder не совпадают с записанными")
+    elif verbose and actuator == ACTUATOR_WEIGHT:
+        logger.info("\nПерезапуск feeder отложен (веса в БД обновлены)")
+
+    timing = timer.breakdown()
+    timing["dt"] = dt
+    timing["nominal_dt"] = timer.interval
+    if verbose:
+        logger.info(describe_breakdown(timing))
 
     snapshot_state = {
         "timestamp": datetime.now().isoformat(),
+        "sensor_timestamp": snapshot.timestamp,
         "kp": kp,
         "ki": ki,
         "kd": kd,
-        "max_step_change": MAX_STEP_CHANGE,
+        "max_step_change": max_step_change,
+        "integral_limit": integral_limit,
         "min_restart_change_threshold": _min_restart_change_threshold,
         "max_change_pct": 0,
         "current_weights": current_weights,
+        "feeder_reference_weights": reference_weights,
         "new_weights": target_weights,
         "total_credits_by_app": app_total_credits,
         "total_credit_sum": total_credit_sum,
         "completed_credits_by_app": completed_credits_by_app,
         "completed_credit_sum": completed_credit_sum,
+        "credit_input": credit_input,
+        "target_shares": pid_state.get("target_shares"),
+        "host_model": host_correction,
+        "credit_rates": {str(window): dict(rates) for window, rates in snapshot.credit_rates.items()},
+        "queue_stats": queue_stats,
+        "actuation": pid_state.get("actuation", FEEDER_ACTUATION_RESTART),
+        "actuator": actuator,
+        "slot_prediction": slot_prediction,
+        "restart_skipped": actuator == ACTUATOR_WEIGHT and not restart_needed,
+        "priority_update": priority_update,
+        "feeder_restart": feeder_restart,
+        "restart_decision": restart_decision,
+        "actuation_totals": scheduler.totals() if scheduler is not None else None,
+        "weights_verified": weights_verified,
+        "trigger": pid_state.get("trigger"),
+        "timing": timing,
     }
     append_snapshot(pid_state.get("snapshot_path"), snapshot_state)
+    pid_state["last_snapshot"] = snapshot_state
 
-    if verbose:
-        logger.info("\nПерезапуск feeder для применения новых весов (без проверки порога изменений)...")
-    restart_feeder()
-    time.sleep(3)
-    if verbose:
-        logger.info("Проверка валидаторов и ассимиляторов...")
-    ensure_daemons_running()
-
-    return True, current_weights, target_weights, credit_stats, pid_state
+    return success, current_weights, target_weights, credit_stats, pid_state
 
 
 def setup_logging(log_file=None):
@@ -385,50 +652,268 @@ def setup_logging(log_file=None):
     return root_logger
 
 
+def controller_status(pid_state):
+    """Состояние PID для API: ошибки, целевые доли и итоги перезапусков (без объектов сенсоров)."""
+    scheduler = pid_state.get("restart_scheduler")
+    return {
+        "integral_error": pid_state.get("integral_error", {}),
+        "prev_error": pid_state.get("prev_error", {}),
+        "target_shares": pid_state.get("target_shares"),
+        "credit_input": pid_state.get("credit_input"),
+        "actuator": pid_state.get("actuator"),
+        "last_actuation": pid_state.get("last_actuation", {}),
+        "actuation_totals": scheduler.totals() if scheduler is not None else None,
+    }
+
+
+def checkpoint_data(pid_state, kp, ki, kd):
+    """Чекпоинт PID по состоянию после итерации; None, если веса в БД еще не известны."""
+    db_weights = pid_state.get("db_weights")
+    if not db_weights:
+        return None
+    integral_error = pid_state.get("integral_error", {})
+    prev_error = pid_state.get("prev_error", {})
+    feeder_weights = pid_state.get("feeder_weights") or {}
+    last_actuation = pid_state.get("last_actuation", {})
+    target_model = pid_state.get("target_model")
+    scheduler = pid_state.get("restart_scheduler")
+    return {
+        "version": CHECKPOINT_VERSION,
+        "controller": CHECKPOINT_CONTROLLER,
+        "saved_at": time.time(),
+        "kp": kp,
+        "ki": ki,
+        "kd": kd,
+        "credit_input": pid_state.get("credit_input"),
+        "actuator": pid_state.get("actuator"),
+        "targets": target_model.spec if target_model is not None else None,
+        "apps": {
+            app_name: {
+                "integral_error": integral_error.get(app_name, 0.0),
+                "prev_error": prev_error.get(app_name, 0.0),
+                "weight": weight,
+                "feeder_weight": feeder_weights.get(app_name),
+                "last_actuation": last_actuation.get(app_name),
+            }
+            for app_name, weight in db_weights.items()
+        },
+        "restart_scheduler": scheduler.to_checkpoint() if scheduler is not None else None,
+    }
+
+
+def restore_pid_state(pid_state, checkpoint_path, max_age=DEFAULT_CHECKPOINT_MAX_AGE):
+    """Теплый старт из чекпоинта. Возвращает (восстановлено, причина отказа)."""
+    logger = logging.getLogger()
+    data, reason = load_checkpoint(checkpoint_path)
+    if data is None:
+        return False, reason
+
+    db_weights = get_current_weights()
+    if not db_weights:
+        return False, "не удалось прочитать веса из БД"
+    feeder_weights = None
+    if pid_state.get("actuator", ACTUATOR_WEIGHT) == ACTUATOR_WEIGHT:
+        queue = get_feeder_queue_snapshot(max_age=0)
+        if queue is not None and queue.weights:
+            feeder_weights = dict(queue.weights)
+        else:
+            logger.warning("⚠ Shared memory feeder недоступна, веса feeder с чекпоинтом не сверяются")
+    reason = check_checkpoint(data, CHECKPOINT_CONTROLLER, db_weights, feeder_weights, max_age=max_age)
+    if reason is not None:
+        return False, reason
+
+    apps = data["apps"]
+    pid_state["integral_error"] = {app_name: app["integral_error"] for app_name, app in apps.items()}
+    pid_state["prev_error"] = {app_name: app["prev_error"] for app_name, app in apps.items()}
+    pid_state["last_actuation"] = {app_name: app["last_actuation"] for app_name, app in apps.items()
+                                   if app.get("last_actuation") is not None}
+    pid_state["db_weights"] = db_weights
+    pid_state["feeder_weights"] = feeder_weights
+    scheduler = pid_state.get("restart_scheduler")
+    if scheduler is not None and data.get("restart_scheduler"):
+        scheduler.restore(data["restart_scheduler"])
+    logger.info(f"Теплый старт: состояние PID из {checkpoint_path} (возраст {checkpoint_age(data):.0f} с, "
+                f"приложений {len(apps)})")
+    return True, None
+
+
+def prepare_checkpoint(pid_state, checkpoint_path, warm_start=True, max_age=DEFAULT_CHECKPOINT_MAX_AGE):
+    """Восстановить состояние при запуске (если warm_start) и записать причину холодного старта в лог."""
+    if checkpoint_path is None:
+        return False
+    logger = logging.getLogger()
+    if not warm_start:
+        logger.info("Холодный старт: чекпоинт не используется (--cold-start)")
+        return False
+    restored, reason = restore_pid_state(pid_state, checkpoint_path, max_age=max_age)
+    if not restored:
+        logger.info(f"Холодный старт: {reason}")
+    return restored
+
+
+def store_checkpoint(pid_state, checkpoint_path, kp, ki, kd):
+    """Сохранить чекпоинт после успешной итерации."""
+    if checkpoint_path is None:
+        return False
+    data = checkpoint_data(pid_state, kp, ki, kd)
+    return data is not None and save_checkpoint(checkpoint_path, data)
+
+
 def balance_loop(interval=60, kp=DEFAULT_KP, ki=DEFAULT_KI, kd=DEFAULT_KD,
-                 max_iterations=None, log_file=None, min_change_threshold=0.001):
+                 max_iterations=None, log_file=None, min_change_threshold=0.001,
+                 credit_input=CREDIT_INPUT_TOTAL, rate_window=DEFAULT_RATE_WINDOW,
+                 actuation=FEEDER_ACTUATION_RESTART, actuator=ACTUATOR_WEIGHT,
+                 max_step_change=MAX_STEP_CHANGE, integral_limit=INTEGRAL_LIMIT,
+                 schedule=SCHEDULE_INTERVAL, credit_fraction=DEFAULT_CREDIT_FRACTION,
+                 max_latency=DEFAULT_MAX_LATENCY, min_interval=DEFAULT_MIN_INTERVAL,
+                 poll_interval=DEFAULT_POLL_INTERVAL, restart_budget=DEFAULT_MAX_RESTARTS_PER_HOUR,
+                 control_port=None, target_model=None, checkpoint_path=None, warm_start=True,
+                 checkpoint_max_age=DEFAULT_CHECKPOINT_MAX_AGE, host_window=None):
+    """Цикл PID; control_port - порт локального API управления (режим --serve), target_model - TargetModel.
+
+    checkpoint_path - файл чекпоинта состояния PID (None - без чекпоинтов).
+    host_window - окно модели хостов, с (None - без поправки на хосты).
+    """
     logger = setup_logging(log_file)
 
     logger.info("="*80)
     logger.info("ЗАПУСК PID-БАЛАНСИРОВКИ")
     logger.info("="*80)
-    logger.info(f"Интервал: {interval} секунд")
-    logger.info(f"Kp={kp}, Ki={ki}, Kd={kd}")
+    if schedule == SCHEDULE_EVENT:
+        logger.info(f"Итерации по новым кредитам: порог {credit_fraction*100:.1f}% кредита за {max_latency:.0f} с "
+                    f"при недавней скорости, не реже {max_latency:.0f} с, не чаще {min_interval:.0f} с")
+    else:
+        logger.info(f"Интервал: {interval} секунд")
+    logger.info(f"Kp={kp}, Ki={ki}, Kd={kd}, шаг ±{max_step_change}, предел интеграла {integral_limit}")
+    if credit_input == CREDIT_INPUT_RATE:
+        logger.info(f"Вход контроллера: скорость кредитов за {rate_window} с")
+    if actuator == ACTUATOR_PRIORITY:
+        logger.info("Актуатор: приоритеты неотправленных результатов (feeder без --allapps)")
+    else:
+        if actuation == FEEDER_ACTUATION_RELOAD:
+            logger.info("Применение весов: перезапуск feeder супервизором")
+        logger.info(f"Перезапуски feeder: не чаще {_min_restart_interval} с, не больше {restart_budget} в час")
     if log_file:
         logger.info(f"Логи: {log_file}")
+    if checkpoint_path:
+        logger.info(f"Чекпоинт: {checkpoint_path}")
+    if host_window:
+        logger.info(f"Поправка на хосты: модель по завершениям за {host_window} с")
     if max_iterations:
         logger.info(f"Максимум итераций: {max_iterations}")
     else:
         logger.info("Бесконечный цикл (Ctrl+C для остановки)")
     logger.info("="*80)
 
-    snapshot_path = init_snapshot_file(kp, ki, kd)
-    pid_state = {"integral_error": {}, "prev_error": {}, "snapshot_path": str(snapshot_path)}
+    control = None
+    control_server = None
+    targets_spec = target_model.spec if target_model is not None else None
+    if control_port is not None:
+        control = BalancerControl({"kp": kp, "ki": ki, "kd": kd, "interval": interval, "targets": targets_spec})
+        control_server = ControlServer(control, port=control_port)
+        if not control_server.start():
+            return
+        logger.info(f"API управления: http://{control_server.host}:{control_server.port}/status")
+
+    if not ensure_feeder_mode(actuator):
+        logger.warning(f"⚠ Feeder не переведен в режим актуатора {actuator}")
+
+    snapshot_path = init_snapshot_file(kp, ki, kd, max_step_change=max_step_change, integral_limit=integral_limit,
+                                       targets=targets_spec)
+    pid_state = create_pid_state(snapshot_path, credit_input=credit_input, rate_window=rate_window,
+                                 actuation=actuation, actuator=actuator, restart_budget=restart_budget,
+                                 target_model=target_model,
+                                 host_model=HostThroughputModel(window=host_window) if host_window else None)
+    prepare_checkpoint(pid_state, checkpoint_path, warm_start=warm_start, max_age=checkpoint_max_age)
+    queue_sampler = QueueOccupancySampler()
+    if not queue_sampler.start():
+        logger.info("Сэмплер очереди не запущен: shared memory feeder не читается напрямую")
+    pid_state["queue_sampler"] = queue_sampler
+    trigger = None
+    if schedule == SCHEDULE_EVENT:
+        trigger = CompletionTrigger(pid_state["credit_aggregator"], rate_sensor=pid_state.get("rate_sensor"),
+                                    credit_fraction=credit_fraction, max_latency=max_latency,
+                                    min_interval=min_interval, poll_interval=poll_interval)
     iteration = 0
+    # dt контроллера - измеренное время между началами итераций, а не номинальный interval
+    timer = IterationTimer(interval)
     try:
         while True:
+            if control is not None:
+                settings = control.settings()
+                kp, ki, kd = settings["kp"], settings["ki"], settings["kd"]
+                if settings["targets"] != targets_spec:
+                    # Спецификация уже проверена API; null - равные доли
+                    targets_spec = settings["targets"]
+                    pid_state["target_model"] = TargetModel(targets_spec) if targets_spec else None
+                if settings["interval"] != interval:
+                    interval = settings["interval"]
+                    timer.set_interval(interval)
+                if settings["paused"]:
+                    control.publish(state=STATE_PAUSED)
+                    logger.info("\nЦикл приостановлен через API")
+                    while control.settings()["paused"]:
+                        control.wait(DEFAULT_POLL_INTERVAL)
+                    logger.info("Цикл возобновлен через API")
+                    # Пауза не должна попасть в dt и в пропущенные точки расписания
+                    timer.reset()
+                    continue
+
             iteration += 1
             logger.info(f"\n--- Итерация {iteration} ---")
+            measured = timer.begin()
+            dt = measured if measured is not None else (interval if interval > 0 else 1)
+            if control is not None:
+                control.publish(state=STATE_RUNNING, iteration=iteration, iteration_started_at=time.time())
 
-            dt = interval if interval > 0 else 1
             success, old_weights, new_weights, stats, pid_state = balance_once(
                 pid_state=pid_state, kp=kp, ki=ki, kd=kd,
-                verbose=True, min_change_threshold=min_change_threshold, dt=dt
+                verbose=True, min_change_threshold=min_change_threshold, dt=dt,
+                max_step_change=max_step_change, integral_limit=integral_limit, timer=timer,
             )
+            if success:
+                store_checkpoint(pid_state, checkpoint_path, kp, ki, kd)
+            if control is not None:
+                control.publish(state=STATE_WAITING, iteration=iteration, last_success=success,
+                                snapshot=pid_state.get("last_snapshot"), controller=controller_status(pid_state),
+                                timing=dict(timer.breakdown(), dt=dt))
 
             if max_iterations and iteration >= max_iterations:
                 logger.info(f"\n✓ Достигнуто максимальное количество итераций ({max_iterations})")
                 break
 
-            if interval > 0:
-                logger.info(f"\nОжидание {interval} секунд до следующей итерации...")
-                time.sleep(interval)
+            if trigger is not None:
+                logger.info("\nОжидание новых результатов...")
+                trigger_info = trigger.wait(sleep=control.wait_unless_paused if control is not None else None)
+                if trigger_info is None:
+                    logger.info("Ожидание прервано паузой через API")
+                    continue
+                pid_state["trigger"] = trigger_info
+                logger.info(describe_trigger(trigger_info))
+            elif interval > 0:
+                delay, missed = timer.next_delay()
+                if missed:
+                    logger.warning(f"⚠ Итерация дольше интервала {interval} с, пропущено точек расписания: {missed}")
+                logger.info(f"\nОжидание {delay:.1f} секунд до следующей итерации...")
+                if control is not None:
+                    control.wait_unless_paused(delay)
+                else:
+                    time.sleep(delay)
 
     except KeyboardInterrupt:
         logger.info("\n\n✓ Цикл PID-балансировки остановлен пользователем")
     except Exception as e:
         logger.error(f"\n✗ Ошибка в цикле PID-балансировки: {e}")
         raise
+    finally:
+        queue_sampler.stop()
+        if control_server is not None:
+            control.publish(state=STATE_STOPPED)
+            control_server.stop()
+        if trigger is not None:
+            logger.info(describe_totals(trigger))
+        if pid_state.get("restart_scheduler") is not None:
+            logger.info(describe_actuation_totals(pid_state["restart_scheduler"]))
 
 
 def main():
@@ -444,6 +929,39 @@ def main():
     parser.add_argument("--quiet", action="store_true")
     parser.add_argument("--log-file", type=str, default=None)
     parser.add_argument("--min-change", type=float, default=0.001)
+    parser.add_argument("--credit-input", choices=[CREDIT_INPUT_TOTAL, CREDIT_INPUT_RATE], default=CREDIT_INPUT_TOTAL)
+    parser.add_argument("--rate-window", type=int, default=DEFAULT_RATE_WINDOW)
+    parser.add_argument("--actuation", choices=[FEEDER_ACTUATION_RESTART, FEEDER_ACTUATION_RELOAD],
+                        default=FEEDER_ACTUATION_RESTART)
+    parser.add_argument("--actuator", choices=[ACTUATOR_WEIGHT, ACTUATOR_PRIORITY], default=ACTUATOR_WEIGHT)
+    parser.add_argument("--max-step-change", type=float, default=MAX_STEP_CHANGE)
+    parser.add_argument("--integral-limit", type=float, default=INTEGRAL_LIMIT)
+    parser.add_argument("--config", type=str, default=None)
+    parser.add_argument("--schedule", choices=[SCHEDULE_INTERVAL, SCHEDULE_EVENT], default=SCHEDULE_INTERVAL)
+    parser.add_argument("--credit-fraction", type=float, default=DEFAULT_CREDIT_FRACTION)
+    parser.add_argument("--max-latency", type=float, default=DEFAULT_MAX_LATENCY)
+    parser.add_argument("--min-interval", type=float, default=DEFAULT_MIN_INTERVAL)
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL)
+    parser.add_argument("--restart-budget", type=int, default=DEFAULT_MAX_RESTARTS_PER_HOUR)
+    parser.add_argument("--serve", action="store_true")
+    parser.add_argument("--targets", type=str, default=None)
+    parser.add_argument("--control-port", type=int, default=DEFAULT_CONTROL_PORT)
+    parser.add_argument("--checkpoint", type=str, default=str(default_checkpoint_path("dynamic_balancer_pid")))
+    parser.add_argument("--no-checkpoint", action="store_true")
+    parser.add_argument("--cold-start", action="store_true")
+    parser.add_argument("--checkpoint-max-age", type=float, default=DEFAULT_CHECKPOINT_MAX_AGE)
+    parser.add_argument("--host-model", action="store_true")
+    parser.add_argument("--host-window", type=int, default=DEFAULT_HOST_WINDOW)
+
+    # Значения из --config становятся умолчаниями, явные аргументы их перекрывают
+    config_path = parser.parse_known_args()[0].config
+    if config_path:
+        config = load_pid_config(config_path)
+        if config is None:
+            return 1
+        if "interval" in config:
+            config["interval"] = int(config["interval"])
+        parser.set_defaults(**config)
 
     args = parser.parse_args()
 
@@ -451,6 +969,43 @@ def main():
         print("✗ Ошибка: interval должен быть >= 0", file=sys.stderr)
         return 1
 
+    if args.rate_window <= 0:
+        print("✗ Ошибка: rate-window должен быть > 0", file=sys.stderr)
+        return 1
+
+    if args.credit_fraction < 0 or args.max_latency <= 0 or args.min_interval < 0 or args.poll_interval <= 0:
+        print("✗ Ошибка: credit-fraction и min-interval должны быть >= 0, max-latency и poll-interval > 0",
+              file=sys.stderr)
+        return 1
+
+    if args.restart_budget < 0:
+        print("✗ Ошибка: restart-budget должен быть >= 0", file=sys.stderr)
+        return 1
+
+    if args.max_step_change <= 0 or args.integral_limit < 0:
+        print("✗ Ошибка: max-step-change должен быть > 0, integral-limit >= 0", file=sys.stderr)
+        return 1
+
+    if args.checkpoint_max_age <= 0:
+        print("✗ Ошибка: checkpoint-max-age должен быть > 0", file=sys.stderr)
+        return 1
+    checkpoint_path = None if args.no_checkpoint else args.checkpoint
+
+    if args.host_window <= 0:
+        print("✗ Ошибка: host-window должен быть > 0", file=sys.stderr)
+        return 1
+    host_window = args.host_window if args.host_model else None
+
+    target_model = None
+    if args.targets:
+        target_model = load_target_model(args.targets)
+        if target_model is None:
+            return 1
+
+    # Режим сервиса: бесконечный цикл с API управления на localhost
+    if args.serve:
+        args.loop = True
+
     if args.log_file is None and args.loop:
         from pathlib import Path
         script_dir = Path(__file__).parent.parent.parent.absolute()
@@ -466,13 +1021,40 @@ def main():
             max_iterations=args.max_iterations,
             log_file=args.log_file,
             min_change_threshold=args.min_change,
+            credit_input=args.credit_input,
+            rate_window=args.rate_window,
+            actuation=args.actuation,
+            actuator=args.actuator,
+            max_step_change=args.max_step_change,
+            integral_limit=args.integral_limit,
+            schedule=args.schedule,
+            credit_fraction=args.credit_fraction,
+            max_latency=args.max_latency,
+            min_interval=args.min_interval,
+            poll_interval=args.poll_interval,
+            restart_budget=args.restart_budget,
+            control_port=args.control_port if args.serve else None,
+            target_model=target_model,
+            checkpoint_path=checkpoint_path,
+            warm_start=not args.cold_start,
+            checkpoint_max_age=args.checkpoint_max_age,
+            host_window=host_window,
         )
     else:
         setup_logging(None)
         dt = args.interval if args.interval > 0 else 1
-        snapshot_path = init_snapshot_file(args.kp, args.ki, args.kd)
-        pid_state = {"integral_error": {}, "prev_error": {}, "snapshot_path": str(snapshot_path)}
-        success, _, _, _, _ = balance_once(
+        snapshot_path = init_snapshot_file(args.kp, args.ki, args.kd, max_step_change=args.max_step_change,
+                                           integral_limit=args.integral_limit,
+                                           targets=target_model.spec if target_model is not None else None)
+        if not ensure_feeder_mode(args.actuator):
+            print(f"⚠ Feeder не переведен в режим актуатора {args.actuator}", file=sys.stderr)
+        pid_state = create_pid_state(snapshot_path, credit_input=args.credit_input, rate_window=args.rate_window,
+                                     actuation=args.actuation, actuator=args.actuator,
+                                     restart_budget=args.restart_budget, target_model=target_model,
+                                     host_model=HostThroughputModel(window=host_window) if host_window else None)
+        prepare_checkpoint(pid_state, checkpoint_path, warm_start=not args.cold_start,
+                           max_age=args.checkpoint_max_age)
+        success, _, _, _, pid_state = balance_once(
             pid_state=pid_state,
             kp=args.kp,
             ki=args.ki,
@@ -480,7 +1062,11 @@ def main():
             verbose=not args.quiet,
             min_change_threshold=args.min_change,
             dt=dt,
+            max_step_change=args.max_step_change,
+            integral_limit=args.integral_limit,
         )
+        if success:
+            store_checkpoint(pid_state, checkpoint_path, args.kp, args.ki, args.kd)
         return 0 if success else 1
 
     return 0
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Замер времени "нет работы" у планировщика при применении весов feeder.
+
+Пока выполняется несколько циклов apply_feeder_weights, отдельный поток часто
+читает очередь feeder (без кэша) и считает время, когда shared memory нет
+(feeder не запущен) или в ней нет ни одного задания. Параллельно по приросту
+scheduler.log считаются запросы клиентов и ответы без работы за тот же интервал.
+Веса не меняются: измеряется только цена самого применения.
+
+До/после: запуск с --actuation restart без супервизора, затем
+scripts.setup.feeder_supervisor --install и запуск с --actuation reload;
+сравнение двух отчетов: --compare before.json after.json.
+"""
+import re
+import sys
+import json
+import time
+import threading
+from pathlib import Path
+from datetime import datetime
+
+from lib.utils import run_command, PROJECT_HOME
+from lib.feeder_queue import read_feeder_queue
+from lib.feeder_supervisor import feeder_supervisor_running
+from lib.boinc_utils import apply_feeder_weights, FEEDER_ACTUATION_RESTART, FEEDER_ACTUATION_RELOAD
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+SERVER_DIR = SCRIPT_DIR.parent.parent
+
+DEFAULT_CYCLES = 5
+DEFAULT_PAUSE = 20
+SAMPLE_INTERVAL = 0.05
+SCHEDULER_LOG_GLOB = "log_*/scheduler.log"
+SCHEDULER_REQUEST_PATTERN = r"Request: \[USER#"
+SCHEDULER_NO_WORK_PATTERN = r"feeder not running|Can.t attach shmem|No tasks sent|no work available"
+
+QUEUE_OK = "ok"
+QUEUE_EMPTY = "empty"
+QUEUE_DOWN = "down"
+
+
+class QueueStateSampler:
+    """Поток, который как можно чаще снимает состояние очереди: ok / empty / down."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            snapshot = read_feeder_queue()
+            if snapshot is None:
+                state = QUEUE_DOWN
+            elif snapshot.occupied_slots == 0:
+                state = QUEUE_EMPTY
+            else:
+                state = QUEUE_OK
+            self.samples.append((time.time(), state))
+            self._stop.wait(max(self.interval - (time.monotonic() - started), 0.0))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="no-work-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+
+    def durations(self, since, until):
+        """{состояние: секунд} на [since, until]; сэмпл длится до следующего."""
+        result = {QUEUE_OK: 0.0, QUEUE_EMPTY: 0.0, QUEUE_DOWN: 0.0}
+        samples = [s for s in self.samples if since <= s[0] <= until]
+        for k, (ts, state) in enumerate(samples):
+            next_ts = samples[k + 1][0] if k + 1 < len(samples) else until
+            result[state] += max(next_ts - ts, 0.0)
+        return result
+
+
+def scheduler_log_path():
+    stdout, success = run_command(f"cd {PROJECT_HOME} && ls -1t {SCHEDULER_LOG_GLOB} 2>/dev/null | head -1",
+                                  check=False, capture_output=True)
+    return stdout.strip() if success and stdout.strip() else None
+
+
+def scheduler_log_size(path):
+    stdout, success = run_command(f"stat -c %s {PROJECT_HOME}/{path}", check=False, capture_output=True)
+    if not success or not stdout.strip().isdigit():
+        return None
+    return int(stdout.strip())
+
+
+def count_scheduler_lines(path, offset, request_pattern, no_work_pattern):
+    """(запросов, ответов без работы) в scheduler.log после offset байт."""
+    stdout, success = run_command(f"tail -c +{offset + 1} {PROJECT_HOME}/{path}", check=False, capture_output=True)
+    if not success:
+        return None, None
+    request_re = re.compile(request_pattern)
+    no_work_re = re.compile(no_work_pattern, re.IGNORECASE)
+    requests = 0
+    no_work = 0
+    for line in stdout.splitlines():
+        if request_re.search(line):
+            requests += 1
+        if no_work_re.search(line):
+            no_work += 1
+    return requests, no_work
+
+
+def run_measurement(actuation, cycles=DEFAULT_CYCLES, pause=DEFAULT_PAUSE, sample_interval=SAMPLE_INTERVAL,
+                    request_pattern=SCHEDULER_REQUEST_PATTERN, no_work_pattern=SCHEDULER_NO_WORK_PATTERN):
+    log_path = scheduler_log_path()
+    log_offset = scheduler_log_size(log_path) if log_path else None
+    if log_offset is None:
+        print("⚠ scheduler.log не найден, считается только состояние очереди", file=sys.stderr)
+
+    sampler = QueueStateSampler(sample_interval)
+    sampler.start()
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "actuation": actuation,
+        "cycles": [],
+        "pause": pause,
+        "sample_interval": sample_interval,
+    }
+    started = time.time()
+    try:
+        time.sleep(pause)
+        for cycle in range(cycles):
+            cycle_start = time.time()
+            timings, success = apply_feeder_weights(actuation)
+            time.sleep(pause)
+            cycle_end = time.time()
+            durations = sampler.durations(cycle_start, cycle_end)
+            report["cycles"].append({
+                "success": success,
+                "timings": timings,
+                "queue_seconds": durations,
+            })
+            print(f"  цикл {cycle + 1}: применение {timings.get('wall_seconds', 0):.2f} с, "
+                  f"feeder не доступен {durations[QUEUE_DOWN]:.2f} с, очередь пуста {durations[QUEUE_EMPTY]:.2f} с")
+    finally:
+        sampler.stop()
+    finished = time.time()
+
+    total = sampler.durations(started, finished)
+    report["observed_seconds"] = finished - started
+    report["samples"] = len(sampler.samples)
+    report["queue_seconds"] = total
+    report["no_work_seconds"] = total[QUEUE_DOWN] + total[QUEUE_EMPTY]
+
+    if log_offset is not None:
+        requests, no_work = count_scheduler_lines(log_path, log_offset, request_pattern, no_work_pattern)
+        report["scheduler"] = {"log": log_path, "requests": requests, "no_work": no_work}
+    return report
+
+
+def save_report(report):
+    out_dir = SERVER_DIR / "data" / "no_work_measurements"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = out_dir / f"no_work_{report['actuation']}_{ts}.json"
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def summarize(report):
+    cycles = max(len(report["cycles"]), 1)
+    walls = [c["timings"].get("wall_seconds", 0.0) for c in report["cycles"]]
+    scheduler = report.get("scheduler") or {}
+    return {
+        "actuation": report["actuation"],
+        "cycles": len(report["cycles"]),
+        "apply_seconds": sum(walls) / cycles,
+        "down_per_cycle": report["queue_seconds"][QUEUE_DOWN] / cycles,
+        "empty_per_cycle": report["queue_seconds"][QUEUE_EMPTY] / cycles,
+        "no_work_fraction": report["no_work_seconds"] / report["observed_seconds"] if report["observed_seconds"] else 0.0,
+        "requests": scheduler.get("requests"),
+        "no_work_replies": scheduler.get("no_work"),
+    }
+
+
+def print_summary(reports):
+    print("\n" + "=" * 80)
+    print(f"{'режим':<10} {'циклов':>6} {'примен., с':>11} {'down/цикл':>10} {'empty/цикл':>11} "
+          f"{'доля':>7} {'запросов':>9} {'без работы':>11}")
+    print("=" * 80)
+    for report in reports:
+        s = summarize(report)
+        requests = "-" if s["requests"] is None else s["requests"]
+        no_work = "-" if s["no_work_replies"] is None else s["no_work_replies"]
+        print(f"{s['actuation']:<10} {s['cycles']:>6} {s['apply_seconds']:>11.2f} {s['down_per_cycle']:>10.2f} "
+              f"{s['empty_per_cycle']:>11.2f} {s['no_work_fraction'] * 100:>6.1f}% {requests:>9} {no_work:>11}")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--actuation", choices=[FEEDER_ACTUATION_RESTART, FEEDER_ACTUATION_RELOAD], default=None)
+    parser.add_argument("--cycles", type=int, default=DEFAULT_CYCLES)
+    parser.add_argument("--pause", type=float, default=DEFAULT_PAUSE)
+    parser.add_argument("--sample-interval", type=float, default=SAMPLE_INTERVAL)
+    parser.add_argument("--no-work-pattern", type=str, default=SCHEDULER_NO_WORK_PATTERN)
+    parser.add_argument("--compare", type=str, nargs="+", default=None)
+
+    args = parser.parse_args()
+
+    if args.compare:
+        reports = []
+        for path in args.compare:
+            with open(path, "r", encoding="utf-8") as f:
+                reports.append(json.load(f))
+        print_summary(reports)
+        return 0
+
+    if args.actuation is None:
+        print("✗ Ошибка: нужен --actuation или --compare", file=sys.stderr)
+        return 1
+    if args.cycles <= 0 or args.pause < 0 or args.sample_interval <= 0:
+        print("✗ Ошибка: cycles и sample-interval должны быть > 0, pause >= 0", file=sys.stderr)
+        return 1
+
+    supervised = feeder_supervisor_running()
+    if args.actuation == FEEDER_ACTUATION_RESTART and supervised:
+        print("✗ Ошибка: под супервизором restart_feeder делегирует ему перезапуск; "
+              "для замера 'до' снимите его: python -m scripts.setup.feeder_supervisor --remove", file=sys.stderr)
+        return 1
+    if args.actuation == FEEDER_ACTUATION_RELOAD and not supervised:
+        print("✗ Ошибка: супервизор feeder не запущен: python -m scripts.setup.feeder_supervisor --install",
+              file=sys.stderr)
+        return 1
+
+    print(f"Замер '{args.actuation}': {args.cycles} циклов, пауза {args.pause} с")
+    report = run_measurement(args.actuation, cycles=args.cycles, pause=args.pause,
+                             sample_interval=args.sample_interval, no_work_pattern=args.no_work_pattern)
+    path = save_report(report)
+    print_summary([report])
+    print(f"\n✓ Результаты сохранены: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
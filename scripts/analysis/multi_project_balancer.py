@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+PID-балансировка нескольких проектов BOINC одним процессом.
+
+Проекты и их настройки читаются из файла lib.projects (--projects). Циклы
+sense / compute / actuate всех проектов идут одновременно на одном цикле
+asyncio: у каждого проекта своя задача со своим IterationTimer, состоянием PID,
+сэмплером очереди и чекпоинтом. Блокирующие шаги (запросы к БД, docker exec,
+перезапуск feeder) выполняются в потоках через asyncio.to_thread в контексте
+проекта (lib.utils.use_project), поэтому долгий перезапуск feeder одного
+проекта не задерживает итерации других. Ошибка итерации проекта пишется в лог
+и не останавливает ни его цикл, ни остальные проекты.
+
+    python -m scripts.analysis.multi_project_balancer --projects projects.json
+
+Настройки контроллера (defaults / controller в файле проектов): kp, ki, kd,
+interval, max_step_change, integral_limit, min_change, credit_input,
+rate_window, actuation, actuator, restart_budget, targets, checkpoint, host_window.
+Снимки пишутся в data/weights_snapshots/pid_weights_<проект>_*.json.
+"""
+import sys
+import asyncio
+import logging
+from pathlib import Path
+
+from lib.utils import use_project, project_key
+from lib.projects import load_projects
+from lib.boinc_utils import FEEDER_ACTUATION_RESTART, FEEDER_ACTUATION_RELOAD
+from lib.priority_actuator import ensure_feeder_mode, ACTUATOR_WEIGHT, ACTUATOR_PRIORITY
+from lib.queue_sampler import QueueOccupancySampler
+from lib.iteration_timer import IterationTimer
+from lib.targets import TargetModel
+from lib.checkpoint import default_checkpoint_path
+from lib.host_model import HostThroughputModel
+from lib.actuation_scheduler import describe_actuation_totals, DEFAULT_MAX_RESTARTS_PER_HOUR
+from scripts.analysis.dynamic_balancer_pid import (
+    balance_once,
+    create_pid_state,
+    init_snapshot_file,
+    prepare_checkpoint,
+    store_checkpoint,
+    setup_logging,
+    DEFAULT_KP,
+    DEFAULT_KI,
+    DEFAULT_KD,
+    MAX_STEP_CHANGE,
+    INTEGRAL_LIMIT,
+    CREDIT_INPUT_TOTAL,
+    CREDIT_INPUT_RATE,
+    DEFAULT_RATE_WINDOW,
+)
+
+CONTROLLER_DEFAULTS = {
+    "kp": DEFAULT_KP,
+    "ki": DEFAULT_KI,
+    "kd": DEFAULT_KD,
+    "interval": 60,
+    "max_step_change": MAX_STEP_CHANGE,
+    "integral_limit": INTEGRAL_LIMIT,
+    "min_change": 0.001,
+    "credit_input": CREDIT_INPUT_TOTAL,
+    "rate_window": DEFAULT_RATE_WINDOW,
+    "actuation": FEEDER_ACTUATION_RESTART,
+    "actuator": ACTUATOR_WEIGHT,
+    "restart_budget": DEFAULT_MAX_RESTARTS_PER_HOUR,
+    "targets": None,
+    "checkpoint": None,
+    # Окно модели хостов, с (null - без поправки на хосты)
+    "host_window": None,
+}
+CONTROLLER_CHOICES = {
+    "credit_input": (CREDIT_INPUT_TOTAL, CREDIT_INPUT_RATE),
+    "actuation": (FEEDER_ACTUATION_RESTART, FEEDER_ACTUATION_RELOAD),
+    "actuator": (ACTUATOR_WEIGHT, ACTUATOR_PRIORITY),
+}
+
+
+class ProjectLogFilter(logging.Filter):
+    """Префикс [проект] у сообщений, записанных в контексте проекта (lib.utils.use_project)."""
+
+    def filter(self, record):
+        name = project_key()
+        if name is not None:
+            message = str(record.msg)
+            body = message.lstrip("\n")
+            record.msg = f"{message[:len(message) - len(body)]}[{name}] {body}"
+        return True
+
+
+def controller_settings(project):
+    """Настройки контроллера проекта поверх CONTROLLER_DEFAULTS; ValueError при ошибке."""
+    where = f"projects.{project.name}.controller"
+    unknown = set(project.controller) - set(CONTROLLER_DEFAULTS)
+    if unknown:
+        raise ValueError(f"{where}: неизвестные настройки {', '.join(sorted(unknown))}")
+    settings = dict(CONTROLLER_DEFAULTS, **project.controller)
+    for key, choices in CONTROLLER_CHOICES.items():
+        if settings[key] not in choices:
+            raise ValueError(f"{where}.{key}: допустимо {', '.join(choices)}")
+    for key in ("kp", "ki", "kd", "min_change", "integral_limit", "max_step_change"):
+        value = settings[key]
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            raise ValueError(f"{where}.{key}: ожидается число >= 0")
+    for key in ("interval", "rate_window", "restart_budget"):
+        value = settings[key]
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            raise ValueError(f"{where}.{key}: ожидается целое число >= 0")
+    host_window = settings["host_window"]
+    if host_window is not None and (isinstance(host_window, bool) or not isinstance(host_window, int)
+                                    or host_window <= 0):
+        raise ValueError(f"{where}.host_window: ожидается целое число > 0 или null")
+    if settings["rate_window"] <= 0 or settings["max_step_change"] <= 0:
+        raise ValueError(f"{where}: rate_window и max_step_change должны быть > 0")
+    settings["target_model"] = TargetModel(settings["targets"]) if settings["targets"] else None
+    settings["checkpoint"] = settings["checkpoint"] or str(
+        default_checkpoint_path(f"dynamic_balancer_pid_{project.name}"))
+    return settings
+
+
+def _start_project(project, settings, warm_start):
+    """Блокирующая подготовка проекта: режим feeder, файл снимков, состояние PID и сэмплер очереди."""
+    logger = logging.getLogger()
+    if not ensure_feeder_mode(settings["actuator"]):
+        logger.warning(f"⚠ Feeder не переведен в режим актуатора {settings['actuator']}")
+    target_model = settings["target_model"]
+    snapshot_path = init_snapshot_file(settings["kp"], settings["ki"], settings["kd"],
+                                       max_step_change=settings["max_step_change"],
+                                       integral_limit=settings["integral_limit"],
+                                       targets=target_model.spec if target_model is not None else None,
+                                       prefix=f"pid_weights_{project.name}")
+    pid_state = create_pid_state(snapshot_path, credit_input=settings["credit_input"],
+                                 rate_window=settings["rate_window"], actuation=settings["actuation"],
+                                 actuator=settings["actuator"], restart_budget=settings["restart_budget"],
+                                 target_model=target_model,
+                                 host_model=HostThroughputModel(window=settings["host_window"])
+                                 if settings["host_window"] else None)
+    prepare_checkpoint(pid_state, settings["checkpoint"], warm_start=warm_start)
+    queue_sampler = QueueOccupancySampler()
+    if not queue_sampler.start():
+        logger.info("Сэмплер очереди не запущен: shared memory feeder не читается напрямую")
+    pid_state["queue_sampler"] = queue_sampler
+    return pid_state
+
+
+async def run_project(project, settings, max_iterations=None, warm_start=True, verbose=True):
+    """Цикл PID одного проекта. Возвращает итоги: итерации, неудачи, исключения, время итераций."""
+    totals = {"iterations": 0, "failures": 0, "errors": 0, "busy_seconds": 0.0, "overruns": 0}
+    with use_project(project):
+        logger = logging.getLogger()
+        interval = settings["interval"]
+        logger.info(f"Контейнер {project.container}, БД {project.db.get('database', 'по умолчанию')}, "
+                    f"интервал {interval} с, Kp={settings['kp']}, Ki={settings['ki']}, Kd={settings['kd']}")
+        pid_state = await asyncio.to_thread(_start_project, project, settings, warm_start)
+        timer = IterationTimer(interval)
+        try:
+            while True:
+                totals["iterations"] += 1
+                logger.info(f"\n--- Итерация {totals['iterations']} ---")
+                measured = timer.begin()
+                dt = measured if measured is not None else (interval if interval > 0 else 1)
+                try:
+                    success, _, _, _, pid_state = await asyncio.to_thread(
+                        balance_once, pid_state, kp=settings["kp"], ki=settings["ki"], kd=settings["kd"],
+                        verbose=verbose, min_change_threshold=settings["min_change"], dt=dt,
+                        max_step_change=settings["max_step_change"], integral_limit=settings["integral_limit"],
+                        timer=timer,
+                    )
+                    if success:
+                        await asyncio.to_thread(store_checkpoint, pid_state, settings["checkpoint"],
+                                                settings["kp"], settings["ki"], settings["kd"])
+                    else:
+                        totals["failures"] += 1
+                except Exception as e:
+                    # Ошибка остается внутри проекта: следующая итерация по расписанию
+                    totals["errors"] += 1
+                    logger.error(f"✗ Ошибка итерации: {e!r}")
+                totals["busy_seconds"] += timer.breakdown()["iteration_seconds"]
+
+                if max_iterations and totals["iterations"] >= max_iterations:
+                    break
+                if interval <= 0:
+                    # Без интервала итерации идут подряд, но отдают цикл другим проектам
+                    await asyncio.sleep(0)
+                    continue
+                delay, missed = timer.next_delay()
+                if missed:
+                    logger.warning(f"⚠ Итерация дольше интервала {interval} с, пропущено точек расписания: {missed}")
+                await asyncio.sleep(delay)
+        finally:
+            totals["overruns"] = timer.overruns
+            pid_state["queue_sampler"].stop()
+            if pid_state.get("restart_scheduler") is not None:
+                logger.info(describe_actuation_totals(pid_state["restart_scheduler"]))
+    return totals
+
+
+def describe_project_totals(name, totals):
+    """Строка итога по проекту."""
+    if isinstance(totals, BaseException):
+        return f"  {name}: остановлен с ошибкой {totals!r}"
+    iterations = totals["iterations"]
+    mean = totals["busy_seconds"] / iterations if iterations else 0.0
+    return (f"  {name}: итераций {iterations}, неудачных {totals['failures']}, с исключением {totals['errors']}, "
+            f"среднее время итерации {mean:.2f} с, пропущено точек расписания {totals['overruns']}")
+
+
+async def balance_projects(projects, settings, max_iterations=None, warm_start=True, verbose=True):
+    """Запустить циклы всех проектов; падение одного проекта не останавливает остальные."""
+    results = await asyncio.gather(
+        *(run_project(project, settings[project.name], max_iterations=max_iterations,
+                      warm_start=warm_start, verbose=verbose) for project in projects),
+        return_exceptions=True,
+    )
+    return dict(zip((project.name for project in projects), results))
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--projects", type=str, required=True)
+    parser.add_argument("--max-iterations", type=int, default=None)
+    parser.add_argument("--log-file", type=str, default=None)
+    parser.add_argument("--cold-start", action="store_true")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+
+    projects = load_projects(args.projects)
+    if projects is None:
+        return 1
+    settings = {}
+    for project in projects:
+        try:
+            settings[project.name] = controller_settings(project)
+        except ValueError as e:
+            print(f"✗ Ошибка настроек проекта {project.name}: {e}", file=sys.stderr)
+            return 1
+
+    if args.log_file is None:
+        script_dir = Path(__file__).parent.parent.parent.absolute()
+        args.log_file = str(script_dir / "multi_project_balancer.log")
+    logger = setup_logging(args.log_file)
+    logger.addFilter(ProjectLogFilter())
+
+    logger.info("=" * 80)
+    logger.info(f"ЗАПУСК PID-БАЛАНСИРОВКИ ПРОЕКТОВ: {', '.join(project.name for project in projects)}")
+    logger.info("=" * 80)
+
+    results = {}
+    try:
+        results = asyncio.run(balance_projects(projects, settings, max_iterations=args.max_iterations,
+                                               warm_start=not args.cold_start, verbose=not args.quiet))
+    except KeyboardInterrupt:
+        logger.info("\n\n✓ Балансировка проектов остановлена пользователем")
+    if results:
+        logger.info("\nИтоги по проектам:")
+        for name, totals in results.items():
+            logger.info(describe_project_totals(name, totals))
+    failed = [name for name, totals in results.items() if isinstance(totals, BaseException)]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
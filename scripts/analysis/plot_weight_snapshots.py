@@ -5,8 +5,6 @@ import os
 import math
 from pathlib import Path
 
-import matplotlib.pyplot as plt
-
 SERVER_DIR = Path(__file__).resolve().parent.parent.parent
 SNAPSHOT_DIR = SERVER_DIR / "data" / "weights_snapshots"
 
@@ -56,13 +54,42 @@ def compute_credit_shares(states, use_completed=False):
     return sorted_apps, shares_by_app
 
 
-def calculate_error_metrics(shares_by_app, max_iter=20, target_share=25.0):
+def compute_target_shares(states, sorted_apps, use_completed=False):
+    """Целевые доли, %, по тем же снимкам, что compute_credit_shares (target_shares снимка или поровну)."""
+    targets_by_app = {name: [] for name in sorted_apps}
+    equal_share = 100.0 / len(sorted_apps) if sorted_apps else 0.0
+    for st in states:
+        if use_completed:
+            tc, total_sum = st.get("completed_credits_by_app") or {}, st.get("completed_credit_sum")
+        else:
+            tc, total_sum = st.get("total_credits_by_app") or {}, st.get("total_credit_sum")
+        if not tc or not total_sum or total_sum == 0:
+            continue
+        targets = st.get("target_shares")
+        for name in sorted_apps:
+            share = float(targets.get(name, 0.0)) * 100.0 if targets else equal_share
+            targets_by_app[name].append(share)
+    return targets_by_app
+
+
+def calculate_error_metrics(shares_by_app, max_iter=20, target_share=None, targets_by_app=None):
+    """RMSE/MAE/макс. ошибка долей, % за последние max_iter итераций.
+
+    targets_by_app - целевые доли по итерациям (compute_target_shares), иначе
+    одна доля target_share для всех (по умолчанию поровну).
+    """
     if not shares_by_app:
         return None
+    if target_share is None:
+        target_share = 100.0 / len(shares_by_app)
     
     last_shares = {}
+    last_targets = {}
     for app_name, shares in shares_by_app.items():
         last_shares[app_name] = shares[-max_iter:] if len(shares) >= max_iter else shares
+        if targets_by_app is not None:
+            targets = targets_by_app.get(app_name, [])
+            last_targets[app_name] = targets[-len(last_shares[app_name]):] if last_shares[app_name] else []
     
     if not last_shares:
         return None
@@ -77,7 +104,8 @@ def calculate_error_metrics(shares_by_app, max_iter=20, target_share=25.0):
         for app_name in sorted(last_shares.keys()):
             shares = last_shares[app_name]
             if i < len(shares):
-                error = abs(shares[i] - target_share)
+                target = last_targets[app_name][i] if targets_by_app is not None else target_share
+                error = abs(shares[i] - target)
                 iteration_errors.append(error)
         
         if iteration_errors:
@@ -105,11 +133,30 @@ def calculate_error_metrics(shares_by_app, max_iter=20, target_share=25.0):
     }
 
 
-def plot_shares(sorted_apps, shares_by_app, title_suffix=""):
+def calculate_restart_metrics(states):
+    """Перезапуски feeder и секунды пустой очереди по снимкам прогона."""
+    restarts = 0
+    queue_empty_seconds = 0.0
+    for st in states:
+        if "feeder_restart" in st:
+            restart = st["feeder_restart"]
+            if restart is None:
+                continue
+            queue_empty_seconds += restart.get("queue_empty_seconds") or restart.get("wall_seconds") or 0.0
+        elif st.get("restart_skipped", False):
+            continue
+        restarts += 1
+    return {"restarts": restarts, "queue_empty_seconds": queue_empty_seconds}
+
+
+def plot_shares(sorted_apps, shares_by_app, title_suffix="", targets_by_app=None):
     if not sorted_apps:
         print("Нет данных для построения графиков (нет total_credits_by_app в снапшотах).")
         return
 
+    # Метрики модуля используются подбором коэффициентов без графики
+    import matplotlib.pyplot as plt
+
     num_apps = len(sorted_apps)
     cols = 2
     rows = (num_apps + cols - 1) // cols
@@ -128,16 +175,20 @@ def plot_shares(sorted_apps, shares_by_app, title_suffix=""):
             ax.set_xlabel("Итерация (номер снапшота)")
             ax.set_ylabel("Доля кредита, %")
             ax.set_ylim(0, 60)
-            ax.axhline(25, linestyle="--", color="gray", linewidth=1)
+            ax.axhline(100.0 / num_apps, linestyle="--", color="gray", linewidth=1)
             continue
         x = list(range(1, len(series) + 1))
         ax.plot(x, series, marker="o")
+        targets = (targets_by_app or {}).get(app_name)
+        if targets:
+            ax.step(x, targets, where="post", linestyle="--", color="gray", linewidth=1)
+        else:
+            ax.axhline(100.0 / num_apps, linestyle="--", color="gray", linewidth=1)
         ax.set_title(app_name)
         ax.set_xlabel("Итерация (перезапуск feeder)")
         ax.set_ylabel("Доля кредита, %")
         ax.grid(True, alpha=0.3)
         ax.set_ylim(0, 60)
-        ax.axhline(25, linestyle="--", color="gray", linewidth=1)
 
     for idx in range(len(sorted_apps), rows * cols):
         r = idx // cols
@@ -177,7 +228,8 @@ def main():
     else:
         title_suffix = f"(total, {snapshot_path.name})"
     
-    metrics = calculate_error_metrics(shares_by_app, max_iter=20, target_share=25.0)
+    targets_by_app = compute_target_shares(states, apps, use_completed=args.completed)
+    metrics = calculate_error_metrics(shares_by_app, max_iter=20, targets_by_app=targets_by_app)
     if metrics:
         print("\n" + "="*80)
         print("МЕТРИКИ ОШИБКИ (последние 20 итераций)")
@@ -185,9 +237,12 @@ def main():
         print(f"Средний RMSE: {metrics['avg_rmse']:.2f}")
         print(f"Средний MAE:   {metrics['avg_mae']:.2f}")
         print(f"Средняя максимальная ошибка: {metrics['avg_max_err']:.2f}")
+        restart_metrics = calculate_restart_metrics(states)
+        print(f"Перезапусков feeder: {restart_metrics['restarts']}, "
+              f"очередь пуста: {restart_metrics['queue_empty_seconds']:.1f} с")
         print("="*80 + "\n")
     
-    plot_shares(apps, shares_by_app, title_suffix=title_suffix)
+    plot_shares(apps, shares_by_app, title_suffix=title_suffix, targets_by_app=targets_by_app)
 
     return 0
 
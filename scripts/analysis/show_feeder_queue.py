@@ -1,127 +1,39 @@
 #!/usr/bin/env python3
 import sys
-import re
-from collections import defaultdict
-from lib.utils import run_command, PROJECT_HOME
+from lib.feeder_queue import get_feeder_queue_snapshot
 
 
-def get_queue_shares_from_shmem():
-    cmd = f"cd {PROJECT_HOME} && bin/show_shmem"
-    stdout, success = run_command(cmd, check=False, capture_output=True)
-    if not success or not stdout:
+def get_queue_shares_from_shmem(max_age=None):
+    snapshot = get_feeder_queue_snapshot(max_age)
+    if snapshot is None:
         return {}
-
-    app_counts = defaultdict(int)
-    total_occupied = 0
-    lines = stdout.split('\n')
-    in_jobs_section = False
-
-    for line in lines:
-        if 'slot' in line.lower() and 'app' in line.lower() and 'wu id' in line.lower():
-            in_jobs_section = True
-            continue
-        if not in_jobs_section:
-            continue
-        if 'slot' in line.lower() and 'app' in line.lower() and 'wu id' in line.lower():
-            continue
-        if line.strip().startswith('-'):
-            continue
-        if not line.strip():
-            continue
-        parts = line.split()
-        if len(parts) < 2:
-            continue
-        if parts[0].endswith(':') and parts[1] == '---':
-            continue
-        match = re.match(r'\s*\d+\s+(\w+)\s+\d+', line)
-        if match:
-            app_name = match.group(1)
-            if app_name != '---':
-                app_counts[app_name] += 1
-                total_occupied += 1
-
-    if total_occupied == 0:
-        return {}
-
-    return {name: count / float(total_occupied) for name, count in app_counts.items()}
+    return snapshot.shares
 
 
-def get_queue_counts_from_shmem():
-    cmd = f"cd {PROJECT_HOME} && bin/show_shmem"
-    stdout, success = run_command(cmd, check=False, capture_output=True)
-    if not success or not stdout:
+def get_queue_counts_from_shmem(max_age=None):
+    snapshot = get_feeder_queue_snapshot(max_age)
+    if snapshot is None:
         return {}, 0
+    return dict(snapshot.counts), snapshot.total_slots
 
-    app_counts = defaultdict(int)
-    lines = stdout.split('\n')
-    in_jobs_section = False
-    total_slots = 0
-
-    for line in lines:
-        if 'slot' in line.lower() and 'app' in line.lower() and 'wu id' in line.lower():
-            in_jobs_section = True
-            continue
-        if not in_jobs_section:
-            continue
-        if 'slot' in line.lower() and 'app' in line.lower() and 'wu id' in line.lower():
-            continue
-        if line.strip().startswith('-'):
-            continue
-        if not line.strip():
-            continue
-        parts = line.split()
-        if len(parts) < 2:
-            continue
-        if parts[0].endswith(':') and parts[1] == '---':
-            total_slots += 1
-            continue
-        match = re.match(r'\s*\d+\s+(\w+)\s+\d+', line)
-        if match:
-            app_name = match.group(1)
-            if app_name != '---':
-                app_counts[app_name] += 1
-                total_slots += 1
-
-    return dict(app_counts), total_slots
-
-def get_weights_from_shmem():
-    """Получить веса приложений из shared memory через show_shmem."""
-    cmd = f"cd {PROJECT_HOME} && bin/show_shmem | grep '^id:'"
-    stdout, success = run_command(cmd, check=False, capture_output=True)
-    
-    if not success or not stdout:
+
+def get_weights_from_shmem(max_age=None):
+    """Получить веса приложений из shared memory (max_age=0 - без кэша)."""
+    snapshot = get_feeder_queue_snapshot(max_age)
+    if snapshot is None:
         return {}
-    
-    weights = {}
-    target_apps = {'fast_task', 'medium_task', 'long_task', 'random_task'}
-    
-    for line in stdout.strip().split('\n'):
-        if 'name:' not in line or 'weight:' not in line:
-            continue
-        
-        parts = line.split()
-        try:
-            name_idx = parts.index('name:')
-            weight_idx = parts.index('weight:')
-            
-            if name_idx + 1 < len(parts) and weight_idx + 1 < len(parts):
-                app_name = parts[name_idx + 1]
-                if app_name in target_apps:
-                    weight_str = parts[weight_idx + 1]
-                    weight = float(weight_str)
-                    weights[app_name] = weight
-        except (ValueError, IndexError):
-            continue
-    
-    return weights
+    return dict(snapshot.weights)
+
 
 def show_feeder_queue_count():
     """Показать количество задач каждого типа в очереди feeder."""
+    snapshot = get_feeder_queue_snapshot(max_age=0)
+
     print("=" * 80)
     print("ВЕСА ПРИЛОЖЕНИЙ В FEEDER (SHARED MEMORY)")
     print("=" * 80)
-    
-    shmem_weights = get_weights_from_shmem()
+
+    shmem_weights = snapshot.weights if snapshot is not None else {}
     if shmem_weights:
         print(f"\n{'Приложение':<20} {'Вес':<15}")
         print("-" * 35)
@@ -129,63 +41,29 @@ def show_feeder_queue_count():
             print(f"{app_name:<20} {shmem_weights[app_name]:<15.2f}")
     else:
         print("\n⚠ Не удалось получить веса из shared memory")
-    
+
     print("\n" + "=" * 80)
     print("КОЛИЧЕСТВО ЗАДАЧ В ОЧЕРЕДИ FEEDER (SHARED MEMORY)")
     print("=" * 80)
-    
-    cmd = f"cd {PROJECT_HOME} && bin/show_shmem"
-    stdout, success = run_command(cmd, check=False, capture_output=True)
-    
-    if not success:
-        print("✗ Ошибка при выполнении show_shmem", file=sys.stderr)
+
+    if snapshot is None:
+        print("✗ Ошибка при чтении shared memory", file=sys.stderr)
         print("Возможно, feeder не запущен или shared memory не создана", file=sys.stderr)
         return False
-    
-    if not stdout:
-        print("Нет вывода от show_shmem")
-        return False
-    
-    app_counts = defaultdict(int)
-    total_slots = 0
-    empty_slots = 0
-    
-    lines = stdout.split('\n')
-    in_jobs_section = False
-    
-    for line in lines:
-        if 'slot' in line.lower() and 'app' in line.lower() and 'WU ID' in line:
-            in_jobs_section = True
-            continue
-        
-        if not in_jobs_section:
-            continue
-        
-        if 'slot' in line.lower() and 'app' in line.lower() and 'WU ID' in line:
-            continue
-        
-        if line.strip().startswith('-'):
-            continue
-        
-        if re.match(r'\s*\d+:\s+---', line):
-            empty_slots += 1
-            total_slots += 1
-            continue
-        
-        match = re.match(r'\s*\d+\s+(\w+)\s+\d+', line)
-        if match:
-            app_name = match.group(1)
-            app_counts[app_name] += 1
-            total_slots += 1
-    
-    if not app_counts and empty_slots == 0:
+
+    if not snapshot.counts and snapshot.total_slots == 0:
         print("Не удалось распарсить вывод show_shmem")
         return False
-    
+
+    print_queue_counts(snapshot.counts, snapshot.total_slots, snapshot.empty_slots)
+    return True
+
+
+def print_queue_counts(app_counts, total_slots, empty_slots):
     print(f"\nВсего слотов: {total_slots}")
     print(f"Занято: {total_slots - empty_slots}")
     print(f"Пусто: {empty_slots}")
-    
+
     if app_counts:
         print(f"\n{'Приложение':<20} {'Количество':<15} {'% от занятых':<15}")
         print("-" * 50)
@@ -196,10 +74,7 @@ def show_feeder_queue_count():
             print(f"{app_name:<20} {count:<15} {percentage:<15.1f}%")
     else:
         print("\nНет задач в очереди")
-    
-    return True
 
 
 if __name__ == "__main__":
     show_feeder_queue_count()
-
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Офлайн-прогон балансировщика на дискретно-событийной модели выдачи (lib.dispatch_sim).
+
+Вместо run_full_pipeline и 40 минут ожидания (collect_baseline_stats.py) контроллер
+PID или пропорциональный вызывается на модели клиентов, слотов feeder и четырех
+приложений; прогон занимает секунды. Снимки пишутся в формате append_snapshot
+в data/weights_snapshots/pid_weights_sim_*.json и открываются plot_weight_snapshots.py.
+
+Запуск: python -m scripts.analysis.simulate_balancer --duration 2400 --kp 1 --ki 0.1 --kd 0.3
+"""
+import sys
+import json
+import logging
+from pathlib import Path
+from datetime import datetime, timedelta
+
+from lib.apps import APPS
+from lib.dispatch_sim import (
+    DispatchSimulator,
+    DEFAULT_CLIENTS,
+    MAX_WUS_IN_PROGRESS,
+    PROJECT_MAX_CONCURRENT,
+    FEEDER_SLOTS,
+    RESTART_SECONDS,
+)
+from lib.slot_model import predict_slot_counts, slot_counts
+from lib.actuation_scheduler import RestartScheduler
+from lib.targets import TargetModel, load_target_model
+from lib.priority_actuator import ACTUATOR_WEIGHT
+from lib.boinc_utils import FEEDER_ACTUATION_RESTART
+from scripts.analysis import dynamic_balancer, dynamic_balancer_pid
+from scripts.analysis.dynamic_balancer_pid import (
+    DEFAULT_KP,
+    DEFAULT_KI,
+    DEFAULT_KD,
+    MAX_STEP_CHANGE,
+    INTEGRAL_LIMIT,
+    CREDIT_INPUT_TOTAL,
+    calculate_total_credits,
+    pid_calculate_weights,
+)
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+SERVER_DIR = SCRIPT_DIR.parent.parent
+
+CONTROLLER_PID = "pid"
+CONTROLLER_RATIO = "ratio"
+
+DEFAULT_DURATION = 2400
+DEFAULT_INTERVAL = 60
+
+
+def make_controller(kind, started_at, kp=DEFAULT_KP, ki=DEFAULT_KI, kd=DEFAULT_KD,
+                    smoothing=dynamic_balancer.DEFAULT_SMOOTHING, min_change_threshold=0.001,
+                    max_step_change=MAX_STEP_CHANGE, integral_limit=INTEGRAL_LIMIT, scheduler=None,
+                    target_model=None):
+    """controller(sim, dt) для DispatchSimulator.run: шаг balance_once на модели.
+
+    Как и balance_once, возвращает состояние снимка только если веса изменились.
+    scheduler (RestartScheduler на часах модели) решает, перезапускать ли feeder,
+    target_model (TargetModel на часах модели) задает целевые доли.
+    """
+    pid_state = {"integral_error": {}, "prev_error": {}, "target_model": target_model}
+
+    def controller(sim, dt):
+        credit_stats = sim.credit_stats()
+        current_weights = dict(sim.weights)
+        queue_state = sim.queue_state()
+        if kind == CONTROLLER_PID:
+            target_weights, _, _ = pid_calculate_weights(credit_stats, current_weights, dt, pid_state,
+                                                         kp, ki, kd, queue_state=queue_state,
+                                                         max_step_change=max_step_change,
+                                                         integral_limit=integral_limit)
+        else:
+            target_weights = dynamic_balancer.calculate_target_weights(credit_stats, current_weights, smoothing,
+                                                                       target_model=target_model)
+            apps = list(target_weights)
+            pid_state["target_shares"] = target_model.shares(apps) if target_model is not None else \
+                {app: 1.0 / len(apps) for app in apps}
+
+        changed = any(
+            abs((new_w - current_weights.get(app, 1.0)) / current_weights.get(app, 1.0)) > min_change_threshold
+            for app, new_w in target_weights.items() if current_weights.get(app, 1.0) > 0
+        )
+        if not changed:
+            return None
+
+        app_total_credits = calculate_total_credits(credit_stats)
+        completed_credits_by_app = {name: stats["completed_credit"] for name, stats in credit_stats.items()}
+        unsent_counts = {name: stats["unsent_count"] for name, stats in credit_stats.items()}
+        current_slots = dict(sim.allotted)
+        decision = None
+        if scheduler is not None:
+            new_slots = slot_counts(dict(current_weights, **target_weights), sim.feeder_slots)
+            prediction = {"current_slots": current_slots, "new_slots": new_slots,
+                          "unchanged": new_slots == current_slots}
+            decision = scheduler.decide(target_weights, dt, prediction)
+        restarted = sim.apply_weights(target_weights, restart=decision is None or decision["restart"])
+        feeder_restart = None
+        if restarted:
+            feeder_restart = {"wall_seconds": sim.restart_seconds, "queue_empty_seconds": sim.restart_seconds}
+            if scheduler is not None:
+                scheduler.record_restart(target_weights, feeder_restart)
+        timestamp = (started_at + timedelta(seconds=sim.now)).isoformat()
+        return {
+            "timestamp": timestamp,
+            "sensor_timestamp": timestamp,
+            "sim_time": sim.now,
+            "kp": kp,
+            "ki": ki,
+            "kd": kd,
+            "max_step_change": max_step_change,
+            "integral_limit": integral_limit,
+            "min_restart_change_threshold": dynamic_balancer_pid._min_restart_change_threshold,
+            "max_change_pct": 0,
+            "current_weights": current_weights,
+            "new_weights": target_weights,
+            "total_credits_by_app": app_total_credits,
+            "total_credit_sum": sum(app_total_credits.values()),
+            "completed_credits_by_app": completed_credits_by_app,
+            "completed_credit_sum": sum(completed_credits_by_app.values()),
+            "credit_input": CREDIT_INPUT_TOTAL,
+            "target_shares": pid_state.get("target_shares"),
+            "credit_rates": {},
+            "queue_stats": None,
+            "actuation": FEEDER_ACTUATION_RESTART,
+            "actuator": ACTUATOR_WEIGHT,
+            "slot_prediction": {
+                "current_slots": current_slots,
+                "new_slots": dict(sim.allotted),
+                "predicted_filled": predict_slot_counts(sim.weights, unsent_counts, sim.feeder_slots),
+                "unchanged": not restarted,
+            },
+            "restart_skipped": not restarted,
+            "priority_update": None,
+            "feeder_restart": feeder_restart,
+            "restart_decision": decision,
+            "actuation_totals": scheduler.totals() if scheduler is not None else None,
+        }
+
+    return controller
+
+
+def run_simulation(kind=CONTROLLER_PID, duration=DEFAULT_DURATION, interval=DEFAULT_INTERVAL, kp=DEFAULT_KP,
+                   ki=DEFAULT_KI, kd=DEFAULT_KD, smoothing=dynamic_balancer.DEFAULT_SMOOTHING,
+                   min_change_threshold=0.001, max_step_change=MAX_STEP_CHANGE, integral_limit=INTEGRAL_LIMIT,
+                   seed=None, restart_budget=None, targets=None, **sim_params):
+    """Прогон модели; возвращает (данные снимка в формате pid_weights_*.json, симулятор).
+
+    restart_budget (перезапусков в час) включает RestartScheduler, None - перезапуск при любой смене слотов.
+    targets - спецификация lib.targets; окна расписания считаются по времени модели от момента запуска.
+    """
+    started_at = datetime.now()
+    sim = DispatchSimulator({app["name"]: app["weight"] for app in APPS}, seed=seed, **sim_params)
+    scheduler = None
+    if restart_budget is not None:
+        scheduler = RestartScheduler(min_restart_interval=dynamic_balancer_pid._min_restart_interval,
+                                     min_change_threshold=dynamic_balancer_pid._min_restart_change_threshold,
+                                     max_restarts_per_hour=restart_budget, downtime=sim.restart_seconds,
+                                     clock=lambda: sim.now)
+        scheduler.applied_weights = dict(sim.weights)
+    target_model = None
+    if targets:
+        target_model = TargetModel(targets, clock=lambda: started_at.timestamp() + sim.now)
+    controller = make_controller(kind, started_at, kp=kp, ki=ki, kd=kd, smoothing=smoothing,
+                                 min_change_threshold=min_change_threshold, max_step_change=max_step_change,
+                                 integral_limit=integral_limit, scheduler=scheduler, target_model=target_model)
+    states = sim.run(controller, duration, interval)
+    data = {
+        "created_at": started_at.isoformat(),
+        "mode": "simulation",
+        "controller": kind,
+        "kp": kp,
+        "ki": ki,
+        "kd": kd,
+        "max_step_change": max_step_change,
+        "integral_limit": integral_limit,
+        "targets": target_model.spec if target_model is not None else None,
+        "simulation": {
+            "duration": duration,
+            "interval": interval,
+            "seed": seed,
+            "clients": sim.clients,
+            "client_limit": sim.client_limit,
+            "feeder_slots": sim.feeder_slots,
+            "restart_seconds": sim.restart_seconds,
+            "restarts": sim.restarts,
+            "queue_empty_seconds": sim.restarts * sim.restart_seconds,
+            "restart_budget": restart_budget,
+        },
+        "states": states,
+    }
+    return data, sim
+
+
+def save_snapshot(data):
+    snapshots_dir = SERVER_DIR / "data" / "weights_snapshots"
+    snapshots_dir.mkdir(parents=True, exist_ok=True)
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = snapshots_dir / f"pid_weights_sim_{ts}.json"
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def print_summary(sim):
+    stats = sim.credit_stats()
+    credits = calculate_total_credits(stats)
+    total = sum(credits.values())
+    print(f"\n{'Приложение':<15} {'Вес':>10} {'Завершено':>10} {'Кредит':>12} {'Доля':>7}")
+    print("-" * 58)
+    for app_name in sorted(stats):
+        share = credits[app_name] / total * 100 if total > 0 else 0.0
+        print(f"{app_name:<15} {sim.weights[app_name]:>10.4f} {stats[app_name]['completed_count']:>10} "
+              f"{credits[app_name]:>12.1f} {share:>6.1f}%")
+    print(f"\nПерезапусков feeder: {sim.restarts}, очередь пуста: {sim.restarts * sim.restart_seconds:.1f} с")
+
+
+def main():
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--controller", choices=[CONTROLLER_PID, CONTROLLER_RATIO], default=CONTROLLER_PID)
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION)
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL)
+    parser.add_argument("--kp", type=float, default=DEFAULT_KP)
+    parser.add_argument("--ki", type=float, default=DEFAULT_KI)
+    parser.add_argument("--kd", type=float, default=DEFAULT_KD)
+    parser.add_argument("--smoothing", type=float, default=dynamic_balancer.DEFAULT_SMOOTHING)
+    parser.add_argument("--min-change", type=float, default=0.001)
+    parser.add_argument("--max-step-change", type=float, default=MAX_STEP_CHANGE)
+    parser.add_argument("--integral-limit", type=float, default=INTEGRAL_LIMIT)
+    parser.add_argument("--clients", type=int, default=DEFAULT_CLIENTS)
+    parser.add_argument("--max-wus-in-progress", type=int, default=MAX_WUS_IN_PROGRESS)
+    parser.add_argument("--project-max-concurrent", type=int, default=PROJECT_MAX_CONCURRENT)
+    parser.add_argument("--slots", type=int, default=FEEDER_SLOTS)
+    parser.add_argument("--restart-seconds", type=float, default=RESTART_SECONDS)
+    parser.add_argument("--seed", type=int, default=None)
+    # Без --restart-budget feeder перезапускается при любой смене слотов
+    parser.add_argument("--restart-budget", type=int, default=None)
+    parser.add_argument("--targets", type=str, default=None)
+
+    args = parser.parse_args()
+
+    if args.duration <= 0 or args.interval <= 0:
+        print("✗ Ошибка: duration и interval должны быть > 0", file=sys.stderr)
+        return 1
+    if min(args.clients, args.max_wus_in_progress, args.project_max_concurrent, args.slots) <= 0:
+        print("✗ Ошибка: clients, max-wus-in-progress, project-max-concurrent и slots должны быть > 0",
+              file=sys.stderr)
+        return 1
+    if args.restart_budget is not None and args.restart_budget < 0:
+        print("✗ Ошибка: restart-budget должен быть >= 0", file=sys.stderr)
+        return 1
+
+    targets = None
+    if args.targets:
+        target_model = load_target_model(args.targets)
+        if target_model is None:
+            return 1
+        targets = target_model.spec
+
+    # Предупреждения контроллера о неполной статистике в начале прогона не нужны
+    logging.getLogger().setLevel(logging.ERROR)
+    started = time.perf_counter()
+    data, sim = run_simulation(
+        args.controller, duration=args.duration, interval=args.interval, kp=args.kp, ki=args.ki, kd=args.kd,
+        smoothing=args.smoothing, min_change_threshold=args.min_change, max_step_change=args.max_step_change,
+        integral_limit=args.integral_limit, seed=args.seed, restart_budget=args.restart_budget, targets=targets,
+        clients=args.clients, max_wus_in_progress=args.max_wus_in_progress,
+        project_max_concurrent=args.project_max_concurrent, feeder_slots=args.slots,
+        restart_seconds=args.restart_seconds,
+    )
+    print(f"Смоделировано {args.duration:.0f} с за {time.perf_counter() - started:.2f} с, "
+          f"снимков: {len(data['states'])}")
+    print_summary(sim)
+    path = save_snapshot(data)
+    print(f"\n✓ Снимки сохранены: {path}")
+    print(f"  График: python -m scripts.analysis.plot_weight_snapshots --file {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
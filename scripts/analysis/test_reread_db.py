@@ -8,39 +8,7 @@ import time
 from lib.utils import run_command, PROJECT_HOME
 from lib.apps import get_current_weights, update_weights
 from lib.boinc_utils import trigger_feeder_update
-
-def get_weights_from_shmem():
-    """Получить веса приложений из shared memory через show_shmem."""
-    cmd = f"cd {PROJECT_HOME} && bin/show_shmem | grep '^id:'"
-    stdout, success = run_command(cmd, check=False, capture_output=True)
-    
-    if not success or not stdout:
-        return {}
-    
-    weights = {}
-    target_apps = {'fast_task', 'medium_task', 'long_task', 'random_task'}
-    
-    for line in stdout.strip().split('\n'):
-        # Формат: "id: 2 name: fast_task hr: 0 weight: 1.00 ..."
-        if 'name:' not in line or 'weight:' not in line:
-            continue
-        
-        parts = line.split()
-        try:
-            # Ищем индекс 'name:' и 'weight:'
-            name_idx = parts.index('name:')
-            weight_idx = parts.index('weight:')
-            
-            if name_idx + 1 < len(parts) and weight_idx + 1 < len(parts):
-                app_name = parts[name_idx + 1]
-                if app_name in target_apps:
-                    weight_str = parts[weight_idx + 1]
-                    weight = float(weight_str)
-                    weights[app_name] = weight
-        except (ValueError, IndexError):
-            continue
-    
-    return weights
+from scripts.analysis.show_feeder_queue import get_weights_from_shmem
 
 
 def test_reread_db():
@@ -57,7 +25,7 @@ def test_reread_db():
     
     # 2. Получаем текущие веса из shared memory
     print("\n2. Текущие веса в shared memory:")
-    shmem_weights = get_weights_from_shmem()
+    shmem_weights = get_weights_from_shmem(max_age=0)
     if not shmem_weights:
         print("   ⚠ Не удалось получить веса из shared memory")
         return False
@@ -113,7 +81,7 @@ def test_reread_db():
     
     # 6. Проверяем, что веса в shared memory еще старые
     print("\n6. Проверяем веса в shared memory (должны быть старые):")
-    shmem_weights_before = get_weights_from_shmem()
+    shmem_weights_before = get_weights_from_shmem(max_age=0)
     for app_name, weight in sorted(shmem_weights_before.items()):
         print(f"   {app_name}: {weight}")
     
@@ -157,7 +125,7 @@ def test_reread_db():
     # 9. Проверяем веса в shared memory после обработки
     print("\n9. Проверяем веса в shared memory после обработки:")
     time.sleep(1)  # Даем время на обновление
-    shmem_weights_after = get_weights_from_shmem()
+    shmem_weights_after = get_weights_from_shmem(max_age=0)
     
     if not shmem_weights_after:
         print("   ✗ Не удалось получить веса из shared memory")
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Подбор коэффициентов PID-балансировщика на модели выдачи (simulate_balancer).
+
+Кандидаты - сетка или случайная выборка по kp, ki, kd, max_step_change,
+integral_limit и интервалу, с уточнением вокруг лучших. Каждый кандидат
+прогоняется на нескольких seed в пуле процессов и оценивается метриками
+plot_weight_snapshots.calculate_error_metrics (RMSE/MAE/максимальная ошибка
+долей кредита) и числом перезапусков feeder. Живые прогоны (pid_weights_*.json)
+можно оценить теми же метриками через --score для сравнения.
+
+Результат - ранжированный отчет в data/tuning/ и файл настроек, который
+принимает dynamic_balancer_pid --config.
+
+Запуск: python -m scripts.analysis.tune_pid --search random --samples 200 --refine 2
+"""
+import sys
+import json
+import random
+import logging
+import itertools
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from lib.targets import load_target_model
+from scripts.analysis.plot_weight_snapshots import (
+    compute_credit_shares,
+    compute_target_shares,
+    calculate_error_metrics,
+    calculate_restart_metrics,
+)
+from scripts.analysis.simulate_balancer import run_simulation, DEFAULT_DURATION, CONTROLLER_PID
+from scripts.analysis.dynamic_balancer_pid import PID_CONFIG_KEYS
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+SERVER_DIR = SCRIPT_DIR.parent.parent
+
+SEARCH_GRID = "grid"
+SEARCH_RANDOM = "random"
+
+DEFAULT_GRID = {
+    "kp": [0.5, 1.0, 2.0],
+    "ki": [0.0, 0.05, 0.1, 0.2],
+    "kd": [0.0, 0.3],
+    "max_step_change": [0.25, 0.5, 1.0],
+    "integral_limit": [0.5, 1.0],
+    "interval": [30, 60],
+}
+# (мин, макс) для случайного поиска; interval - целые секунды
+DEFAULT_RANGES = {
+    "kp": (0.1, 4.0),
+    "ki": (0.0, 0.5),
+    "kd": (0.0, 1.0),
+    "max_step_change": (0.1, 1.0),
+    "integral_limit": (0.1, 2.0),
+    "interval": (20, 120),
+}
+DEFAULT_SEEDS = [1, 2, 3]
+# Метрики по последним итерациям, как в plot_weight_snapshots
+METRIC_ITERATIONS = 20
+# Штраф к RMSE (п.п. доли) за перезапуск feeder в час
+DEFAULT_RESTART_WEIGHT = 0.05
+TOP_TO_REFINE = 5
+
+
+def score_states(states, restart_weight=DEFAULT_RESTART_WEIGHT, duration=None):
+    """Метрики одного прогона: RMSE/MAE/max по долям кредита, перезапуски и итоговая оценка."""
+    apps, shares_by_app = compute_credit_shares(states)
+    metrics = calculate_error_metrics(shares_by_app, max_iter=METRIC_ITERATIONS,
+                                      targets_by_app=compute_target_shares(states, apps))
+    restart_metrics = calculate_restart_metrics(states)
+    restarts = restart_metrics["restarts"]
+    if duration is None and states and "sim_time" in states[-1]:
+        duration = states[-1]["sim_time"]
+    hours = duration / 3600.0 if duration else 1.0
+    if metrics is None:
+        return {"score": float("inf"), "avg_rmse": None, "avg_mae": None, "avg_max_err": None,
+                "restarts": restarts, "queue_empty_seconds": restart_metrics["queue_empty_seconds"]}
+    return {
+        "score": metrics["avg_rmse"] + restart_weight * restarts / hours,
+        "avg_rmse": metrics["avg_rmse"],
+        "avg_mae": metrics["avg_mae"],
+        "avg_max_err": metrics["avg_max_err"],
+        "restarts": restarts,
+        "queue_empty_seconds": restart_metrics["queue_empty_seconds"],
+    }
+
+
+def evaluate_candidate(params, seeds, duration, restart_weight, sim_params):
+    """Прогон кандидата на всех seed (в процессе пула); оценки усредняются."""
+    logging.getLogger().setLevel(logging.ERROR)
+    runs = []
+    for seed in seeds:
+        data, _ = run_simulation(CONTROLLER_PID, duration=duration, seed=seed, **params, **sim_params)
+        runs.append(score_states(data["states"], restart_weight, duration))
+    result = {"params": params, "runs": runs}
+    for key in ("score", "avg_rmse", "avg_mae", "avg_max_err", "restarts", "queue_empty_seconds"):
+        values = [run[key] for run in runs]
+        result[key] = float("inf") if None in values else sum(values) / len(values)
+    return result
+
+
+def grid_candidates(grid):
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+
+def _sample(key, low, high, rng):
+    if key == "interval":
+        return rng.randint(int(low), int(high))
+    return round(rng.uniform(low, high), 4)
+
+
+def random_candidates(ranges, count, rng):
+    return [{key: _sample(key, low, high, rng) for key, (low, high) in ranges.items()} for _ in range(count)]
+
+
+def refine_candidates(best, ranges, count, spread, rng):
+    """Случайные соседи лучших кандидатов: каждый параметр сдвигается на ±spread диапазона."""
+    candidates = []
+    for k in range(count):
+        center = best[k % len(best)]["params"]
+        params = {}
+        for key, (low, high) in ranges.items():
+            delta = (high - low) * spread
+            value = center.get(key, (low + high) / 2)
+            params[key] = _sample(key, max(low, value - delta), min(high, value + delta), rng)
+        candidates.append(params)
+    return candidates
+
+
+def evaluate_all(candidates, seeds, duration, restart_weight, sim_params, workers=None):
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(evaluate_candidate, params, seeds, duration, restart_weight, sim_params)
+                   for params in candidates]
+        results = [future.result() for future in futures]
+    return sorted(results, key=lambda r: r["score"])
+
+
+def run_tuning(search=SEARCH_RANDOM, samples=100, refine=0, seeds=DEFAULT_SEEDS, duration=DEFAULT_DURATION,
+               restart_weight=DEFAULT_RESTART_WEIGHT, grid=DEFAULT_GRID, ranges=DEFAULT_RANGES,
+               sim_params=None, workers=None, seed=0):
+    rng = random.Random(seed)
+    sim_params = sim_params or {}
+    if search == SEARCH_GRID:
+        candidates = grid_candidates(grid)
+    else:
+        candidates = random_candidates(ranges, samples, rng)
+
+    print(f"Раунд 1: {len(candidates)} кандидатов × {len(seeds)} seed")
+    results = evaluate_all(candidates, seeds, duration, restart_weight, sim_params, workers)
+    spread = 0.25
+    for round_no in range(refine):
+        best = results[:TOP_TO_REFINE]
+        candidates = refine_candidates(best, ranges, max(samples // 2, TOP_TO_REFINE), spread, rng)
+        print(f"Раунд {round_no + 2}: уточнение вокруг {len(best)} лучших, {len(candidates)} кандидатов")
+        results = sorted(results + evaluate_all(candidates, seeds, duration, restart_weight, sim_params, workers),
+                         key=lambda r: r["score"])
+        spread /= 2
+
+    return {
+        "created_at": datetime.now().isoformat(),
+        "search": search,
+        "seeds": list(seeds),
+        "duration": duration,
+        "restart_weight": restart_weight,
+        "sim_params": sim_params,
+        "ranked": results,
+    }
+
+
+def score_snapshot_files(paths, restart_weight=DEFAULT_RESTART_WEIGHT):
+    """Оценки записанных прогонов (живых или симуляции) теми же метриками."""
+    scored = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        states = data.get("states", [])
+        duration = None
+        if len(states) >= 2:
+            started = datetime.fromisoformat(states[0]["timestamp"])
+            duration = (datetime.fromisoformat(states[-1]["timestamp"]) - started).total_seconds()
+        result = score_states(states, restart_weight, duration)
+        result["file"] = str(path)
+        result["params"] = {key: data.get(key) for key in PID_CONFIG_KEYS if key in data}
+        scored.append(result)
+    return scored
+
+
+def save_results(report):
+    out_dir = SERVER_DIR / "data" / "tuning"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    report_path = out_dir / f"tuning_{ts}.json"
+    with report_path.open("w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    config_path = None
+    if report.get("ranked"):
+        best = report["ranked"][0]
+        config_path = out_dir / f"pid_config_{ts}.json"
+        config = {
+            "created_at": report["created_at"],
+            "report": str(report_path),
+            "score": best["score"],
+            "avg_rmse": best["avg_rmse"],
+            "restarts": best["restarts"],
+            "params": best["params"],
+        }
+        with config_path.open("w", encoding="utf-8") as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+    return report_path, config_path
+
+
+def _fmt(value, spec):
+    return "-" if value is None or value == float("inf") else format(value, spec)
+
+
+def print_ranking(results, limit=10):
+    print("\n" + "=" * 114)
+    print(f"{'#':>3} {'оценка':>8} {'RMSE':>7} {'MAE':>7} {'max':>7} {'рестартов':>9} {'простой,с':>9}  параметры")
+    print("=" * 114)
+    for k, r in enumerate(results[:limit], 1):
+        params = ", ".join(f"{key}={value}" for key, value in r["params"].items())
+        label = r.get("file") or params
+        print(f"{k:>3} {_fmt(r['score'], '8.3f')} {_fmt(r['avg_rmse'], '7.3f')} {_fmt(r['avg_mae'], '7.3f')} "
+              f"{_fmt(r['avg_max_err'], '7.3f')} {_fmt(r['restarts'], '9.1f')} "
+              f"{_fmt(r.get('queue_empty_seconds'), '9.1f')}  {label}")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--search", choices=[SEARCH_GRID, SEARCH_RANDOM], default=SEARCH_RANDOM)
+    parser.add_argument("--samples", type=int, default=100)
+    parser.add_argument("--refine", type=int, default=1)
+    parser.add_argument("--seeds", type=int, nargs="+", default=DEFAULT_SEEDS)
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION)
+    parser.add_argument("--restart-weight", type=float, default=DEFAULT_RESTART_WEIGHT)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--clients", type=int, default=None)
+    parser.add_argument("--slots", type=int, default=None)
+    parser.add_argument("--restart-budget", type=int, default=None)
+    parser.add_argument("--targets", type=str, default=None)
+    parser.add_argument("--score", type=str, nargs="+", default=None)
+
+    args = parser.parse_args()
+
+    if args.score:
+        print_ranking(sorted(score_snapshot_files(args.score, args.restart_weight), key=lambda r: r["score"]),
+                      limit=len(args.score))
+        return 0
+
+    if args.samples <= 0 or args.refine < 0 or args.duration <= 0:
+        print("✗ Ошибка: samples и duration должны быть > 0, refine >= 0", file=sys.stderr)
+        return 1
+
+    sim_params = {}
+    if args.clients is not None:
+        sim_params["clients"] = args.clients
+    if args.slots is not None:
+        sim_params["feeder_slots"] = args.slots
+    if args.restart_budget is not None:
+        sim_params["restart_budget"] = args.restart_budget
+    if args.targets:
+        target_model = load_target_model(args.targets)
+        if target_model is None:
+            return 1
+        sim_params["targets"] = target_model.spec
+
+    report = run_tuning(search=args.search, samples=args.samples, refine=args.refine, seeds=args.seeds,
+                        duration=args.duration, restart_weight=args.restart_weight,
+                        sim_params=sim_params, workers=args.workers)
+    print_ranking(report["ranked"])
+    report_path, config_path = save_results(report)
+    print(f"\n✓ Отчет: {report_path}")
+    if config_path:
+        print(f"✓ Рекомендуемые настройки: {config_path}")
+        print(f"  Применение: python -m scripts.analysis.dynamic_balancer_pid --loop --config {config_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,6 +11,7 @@ from tqdm import tqdm
 import sys
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 from lib.utils import run_command as run_cmd, check_file_exists, run_local_command, PROJECT_HOME, CONTAINER_NAME, SCRIPT_DIR
+from lib.db import query_result, query_value, execute_transaction
 
 def run_command(cmd, check=True, capture_output=False):
     return run_cmd(f"cd {PROJECT_HOME} && {cmd}", check=check, capture_output=capture_output)
@@ -230,17 +231,16 @@ def get_app_version_id(app_name, version_num):
     else:
         version_num_int = version_num
     
-    query = (
+    sql = (
         "SELECT av.id FROM app_version av "
         "JOIN app a ON av.appid = a.id "
-        "WHERE a.name = '{}' AND av.version_num = {} AND av.deprecated = 0 "
+        "WHERE a.name = %s AND av.version_num = %s AND av.deprecated = 0 "
         "LIMIT 1"
-    ).format(app_name, version_num_int)
+    )
     
-    cmd = "mysql -u root -ppassword boincserver -N -e \"{}\"".format(query)
-    output, success = run_command(cmd, capture_output=True)
-    if output and isinstance(output, str) and output.strip().isdigit():
-        return int(output.strip())
+    app_version_id = query_value(sql, (app_name, version_num_int))
+    if app_version_id is not None:
+        return int(app_version_id)
     return None
 
 
@@ -315,7 +315,7 @@ def get_active_hosts():
     Returns:
         list: список словарей с информацией о хостах [{'id': int, 'domain_name': str, 'task_count': int}, ...]
     """
-    query = """
+    sql = """
     SELECT 
         h.id as host_id,
         h.domain_name,
@@ -327,31 +327,14 @@ def get_active_hosts():
     ORDER BY h.id;
     """
     
-    cmd = "mysql -u root -ppassword boincserver -N -e \"{}\"".format(query)
-    output = run_command(cmd, capture_output=True)
-    
-    if not output:
+    result, success = query_result(sql)
+    if not success or not result:
         return []
     
-    hosts = []
-    for line in output.strip().split('\n'):
-        if not line.strip():
-            continue
-        parts = line.split('\t')
-        if len(parts) >= 3:
-            try:
-                host_id = int(parts[0].strip())
-                domain_name = parts[1].strip()
-                task_count = int(parts[2].strip())
-                hosts.append({
-                    'id': host_id,
-                    'domain_name': domain_name,
-                    'task_count': task_count
-                })
-            except (ValueError, IndexError):
-                continue
-    
-    return hosts
+    return [
+        {'id': host_id, 'domain_name': domain_name, 'task_count': task_count}
+        for host_id, domain_name, task_count in result
+    ]
 
 
 def create_batch_of_tasks(batch_num, apps_config, target_nresults, app_templates, hosts=None):
@@ -425,15 +408,14 @@ def update_app_version_ids_batch(all_created_tasks):
             continue
         
         app_version_id = app_version_map[app_name]
-        wu_names_str = "', '".join(wu_names)
-        update_statements.append(
+        placeholders = ", ".join(["%s"] * len(wu_names))
+        update_statements.append((
             "UPDATE workunit w "
             "JOIN app a ON w.appid = a.id "
-            "SET w.app_version_id = {} "
-            "WHERE a.name = '{}' AND w.name IN ('{}') AND w.app_version_id = 0;".format(
-                app_version_id, app_name, wu_names_str
-            )
-        )
+            "SET w.app_version_id = %s "
+            "WHERE a.name = %s AND w.name IN ({}) AND w.app_version_id = 0".format(placeholders),
+            [app_version_id, app_name] + wu_names
+        ))
     
     if not update_statements:
         print("  ⚠ Нет задач для обновления app_version_id", file=sys.stderr)
@@ -441,55 +423,22 @@ def update_app_version_ids_batch(all_created_tasks):
     
     print("\nОбновление app_version_id для всех созданных задач...")
     
-    sql_lines = ["START TRANSACTION;"] + update_statements + ["COMMIT;"]
-    sql_content = "\n".join(sql_lines)
-    try:
-        result = run_local_command(
-            ["docker", "exec", "-i", CONTAINER_NAME,
-                "bash", "-c", "cd {} && mysql -u root -ppassword boincserver".format(PROJECT_HOME)],
-            input=sql_content,
-            capture_output=True,
-            check=False
-        )
-        stdout = result.stdout if result.stdout else ""
-        stderr = result.stderr if result.stderr else ""
-        
-        result = proc.returncode == 0
-        if stderr and not result:
-            print(f"⚠ SQL ошибка: {stderr[:200]}", file=sys.stderr)
-    except Exception as e:
-        print(f"⚠ Ошибка при выполнении SQL: {e}", file=sys.stderr)
-        result = False
+    _, result = execute_transaction(update_statements)
     
     if result:
-        total_updated = sum(len(wu_names) for wu_names in tasks_by_app.values())
-        
         for app_name, wu_names in tasks_by_app.items():
             if app_name not in app_version_map:
                 continue
             app_version_id = app_version_map[app_name]
-            wu_names_str = "', '".join(wu_names)
-            wu_names_escaped = wu_names_str.replace("'", "\\'")
+            placeholders = ", ".join(["%s"] * len(wu_names))
             check_sql = (
                 "SELECT COUNT(*) FROM workunit w "
                 "JOIN app a ON w.appid = a.id "
-                "WHERE a.name = '{}' AND w.name IN ('{}') AND w.app_version_id = {};"
-            ).format(app_name, wu_names_escaped, app_version_id)
-            try:
-                result = run_local_command(
-                    ["docker", "exec", "-i", CONTAINER_NAME,
-                        "bash", "-c", "cd {} && mysql -u root -ppassword boincserver -N".format(PROJECT_HOME)],
-                    input=check_sql,
-                    capture_output=True,
-                    check=False
-                )
-                check_output = result.stdout if result.stdout else ""
-            except Exception:
-                check_output = None
-            if check_output and check_output.strip().isdigit():
-                count = int(check_output.strip())
-                if count != len(wu_names):
-                    print(f"⚠ {app_name}: только {count} из {len(wu_names)} задач имеют app_version_id = {app_version_id}", file=sys.stderr)
+                "WHERE a.name = %s AND w.name IN ({}) AND w.app_version_id = %s"
+            ).format(placeholders)
+            count = query_value(check_sql, [app_name] + wu_names + [app_version_id])
+            if count is not None and count != len(wu_names):
+                print(f"⚠ {app_name}: только {count} из {len(wu_names)} задач имеют app_version_id = {app_version_id}", file=sys.stderr)
     else:
         print("⚠ Ошибка при обновлении app_version_id", file=sys.stderr)
 
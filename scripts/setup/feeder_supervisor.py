@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+import sys
+from lib.feeder_supervisor import install_feeder_supervisor, feeder_supervisor_running
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--install", action="store_true")
+    group.add_argument("--remove", action="store_true")
+    group.add_argument("--status", action="store_true")
+
+    args = parser.parse_args()
+
+    if args.status:
+        running = feeder_supervisor_running()
+        print("✓ Супервизор feeder запущен" if running else "Супервизор feeder не запущен")
+        return 0 if running else 1
+
+    if not install_feeder_supervisor(enable=args.install):
+        return 1
+    print("✓ Супервизор feeder установлен" if args.install else "✓ Feeder снова запускается напрямую из config.xml")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())